@@ -0,0 +1,215 @@
+"""
+Benchmark the stages of the linesman pipeline on synthetic tracks.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.run --sizes 1e3 1e5 --output results.json
+    python -m benchmarks.run --compare results.json --output new.json
+
+Every stage is timed (best of --repeat runs, wall and CPU time) and profiled
+for peak memory with tracemalloc in a separate run, so the profiling overhead
+does not affect the timings.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pyproj
+
+from linesman import __version__
+from linesman.geo import azimuth, mercator_project_arrays, \
+    mercator_transformer
+from linesman.measure import available_measures, calculate_measures
+from linesman.gpx import gpx_extract_points, gpx_file, gpx_read_track
+
+from .synthetic import synthetic_track, write_gpx
+
+CLI = 'import sys; from linesman import run; sys.argv[0] = "linesman"; run()'
+
+
+def measure_stage(func, repeat):
+    """
+    :return: dict with the best wall and cpu time of `repeat` calls and the
+    peak memory allocated by one more call
+    """
+    wall = cpu = float('inf')
+    for _ in range(repeat):
+        w, c = time.perf_counter(), time.process_time()
+        func()
+        wall = min(wall, time.perf_counter() - w)
+        cpu = min(cpu, time.process_time() - c)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'wall_s': wall, 'cpu_s': cpu, 'peak_bytes': peak}
+
+
+def parse_stages(path, n, gpxpy_limit):
+    """:return: dict of stage name to benchmarked function for gpx parsing"""
+    stages = {'parse.gpx_read_track': lambda: gpx_read_track(path)}
+    if n <= gpxpy_limit:
+        gpx_obj = gpx_file(path)
+        stages['parse.gpx_file'] = lambda: gpx_file(path)
+        stages['parse.gpx_extract_points'] = lambda: gpx_extract_points(gpx_obj)
+    return stages
+
+
+def evaluation_stages(track, line):
+    """:return: dict of stage name to benchmarked function for evaluation"""
+    start, end = line.point(0), line.point(1)
+    azi = azimuth(start, end)
+
+    stages = {
+        'geo.mercator_transformer': lambda: mercator_transformer(start, azi),
+        'geo.mercator_project_arrays': lambda: mercator_project_arrays(
+            start, azi, track.lon, track.lat),
+    }
+    for name, Measure in available_measures.items():
+        m = Measure(track, line)
+        stages[f'measure.{Measure.__name__}'] = m.calculate
+    stages['measure.calculate_measures'] = lambda: calculate_measures(
+        track, line, available_measures.values())
+    return stages
+
+
+def cli_stage(path, repeat):
+    """:return: wall time of the end-to-end command line run (best of repeat)"""
+    wall = float('inf')
+    for _ in range(repeat):
+        w = time.perf_counter()
+        subprocess.run([sys.executable, '-c', CLI, path, 'ALL'], check=True,
+                       stdout=subprocess.DEVNULL)
+        wall = min(wall, time.perf_counter() - w)
+    return {'wall_s': wall, 'cpu_s': None, 'peak_bytes': None}
+
+
+def run_benchmarks(sizes, latitudes, lengths, repeat=3, gpxpy_limit=10**5,
+                   cli=True, log=None):
+    """
+    :return: list of result dicts with stage, points, latitude, line_km and
+    the values from measure_stage()
+    """
+    results = []
+
+    def record(stage, n, lat, line_km, values):
+        row = {'stage': stage, 'points': n, 'latitude': lat,
+               'line_km': line_km}
+        row.update(values)
+        results.append(row)
+        if log:
+            log(f"{stage:<32} n={n:<9} lat={str(lat):<5} "
+                f"line={str(line_km):<6}km {values['wall_s']:.4f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            # parsing does not depend on the geometry of the track
+            track, line = synthetic_track(n, latitudes[0], lengths[0])
+            path = os.path.join(tmp, f'{n}.gpx')
+            write_gpx(track, path)
+            for stage, func in parse_stages(path, n, gpxpy_limit).items():
+                record(stage, n, None, None, measure_stage(func, repeat))
+            if cli:
+                record('cli', n, latitudes[0], lengths[0],
+                       cli_stage(path, repeat))
+            os.remove(path)
+
+            for lat in latitudes:
+                for line_km in lengths:
+                    track, line = synthetic_track(n, lat, line_km)
+                    for stage, func in evaluation_stages(track, line).items():
+                        record(stage, n, lat, line_km,
+                               measure_stage(func, repeat))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    :return: list of (result, baseline result, ratio) with a wall time
+    exceeding the baseline by more than `threshold` (e.g. 0.2 for 20%)
+    """
+    def key(row):
+        return row['stage'], row['points'], row['latitude'], row['line_km']
+
+    previous = {key(row): row for row in baseline['results']}
+    slower = []
+    for row in results:
+        old = previous.get(key(row))
+        if old and old['wall_s'] > 0:
+            ratio = row['wall_s']/old['wall_s']
+            if ratio > 1 + threshold:
+                slower.append((row, old, ratio))
+    return slower
+
+
+def _argparser():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run',
+        description='Benchmark linesman on synthetic tracks.'
+    )
+    parser.add_argument('--sizes', nargs='+', type=float,
+                        default=[1e3, 1e4, 1e5, 1e6],
+                        help='Track sizes in points, up to 1e7.')
+    parser.add_argument('--latitudes', nargs='+', type=float,
+                        default=[0, 45, 70])
+    parser.add_argument('--lengths', nargs='+', type=float, default=[10, 1000],
+                        help='Reference line lengths in km.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--gpxpy-limit', type=float, default=1e5,
+                        help='Skip gpxpy stages for bigger tracks.')
+    parser.add_argument('--no-cli', dest='cli', action='store_false',
+                        help='Skip the end-to-end command line runs.')
+    parser.add_argument('--output', help='JSON file results are written to.')
+    parser.add_argument('--compare', help='JSON results of a previous run.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative slowdown reported as regression.')
+    return parser
+
+
+def main(argv=None):
+    args = _argparser().parse_args(argv)
+    results = run_benchmarks(
+        [int(n) for n in args.sizes], args.latitudes, args.lengths,
+        args.repeat, args.gpxpy_limit, args.cli,
+        log=lambda msg: print(msg, file=sys.stderr)
+    )
+    report = {
+        'linesman': __version__,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pyproj': pyproj.__version__,
+        'proj': pyproj.proj_version_str,
+        'machine': platform.machine(),
+        'created': time.time(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(results, json.load(f), args.threshold)
+        for row, old, ratio in slower:
+            print(f"REGRESSION {row['stage']} n={row['points']} "
+                  f"lat={row['latitude']} line={row['line_km']}km: "
+                  f"{old['wall_s']:.4f}s -> {row['wall_s']:.4f}s "
+                  f"({ratio:.2f}x)", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
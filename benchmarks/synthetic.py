@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+
+import numpy as np
+from pyproj import Geod
+
+from linesman.geometry import Line, Vector
+from linesman.track import Track
+
+# 2021-01-01T00:00:00Z, start of every synthetic recording
+START_TIME = 1609459200.0
+
+
+def synthetic_track(n, lat=45.0, line_km=100.0, azimuth=60.0, seed=0):
+    """
+    Generate a deterministic track of a straight line attempt: points are
+    spread evenly along a geodesic and deviate from it by a few slow waves
+    (tens of meters) plus GPS noise. Noise along the line makes the track
+    move backwards now and then.
+    :param n: number of points
+    :param lat: latitude of the start point, longitude is always 10
+    :param line_km: length of the reference line in km
+    :param azimuth: direction of the reference line in degrees
+    :param seed: random seed, equal arguments yield equal tracks
+    :return: tuple (Track, reference Line)
+    """
+    rng = np.random.default_rng(seed)
+    geod = Geod(ellps='WGS84')
+    length = line_km*1000
+    along = np.linspace(0, length, n) + rng.normal(0, 2, n)
+    phase = rng.uniform(0, 2*np.pi, 3)
+    across = (40*np.sin(2*np.pi*3*along/length + phase[0])
+              + 15*np.sin(2*np.pi*17*along/length + phase[1])
+              + 5*np.sin(2*np.pi*101*along/length + phase[2])
+              + rng.normal(0, 3, n))
+
+    lon0, lat0 = np.full(n, 10.0), np.full(n, lat)
+    lon, lat_, back = geod.fwd(lon0, lat0, np.full(n, azimuth), along)
+    lon, lat_, _ = geod.fwd(lon, lat_, back + 180 + 90, across)
+    end_lon, end_lat, _ = geod.fwd(10.0, lat, azimuth, length)
+
+    track = Track(lon, lat_, ele=500 + rng.normal(0, 5, n),
+                  time=START_TIME + np.arange(n, dtype=np.float64))
+    line = Line(Vector(10.0, lat), Vector(end_lon, end_lat))
+    return track, line
+
+
+def write_gpx(track, path):
+    """Write a Track with elevation and time columns as gpx 1.1 file."""
+    times = [datetime.fromtimestamp(t, timezone.utc).strftime(
+                 '%Y-%m-%dT%H:%M:%SZ') for t in track.time.tolist()]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gpx version="1.1" creator="linesman benchmarks" '
+                'xmlns="http://www.topografix.com/GPX/1/1">\n'
+                '<trk><trkseg>\n')
+        for lon, lat, ele, time in zip(track.lon.tolist(), track.lat.tolist(),
+                                       track.ele.tolist(), times):
+            f.write(f'<trkpt lat="{lat:.8f}" lon="{lon:.8f}">'
+                    f'<ele>{ele:.1f}</ele><time>{time}</time></trkpt>\n')
+        f.write('</trkseg></trk>\n</gpx>\n')
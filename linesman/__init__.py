@@ -1,40 +1,101 @@
 import argparse
+import importlib
+import os
+import sys
+import time
 
+# Only lightweight modules are imported here. numpy, pyproj, geographiclib and
+# gpxpy are imported by the stages needing them, so --help, --version and
+# argument errors don't pay for loading them.
+from . import timing
 from .geometry import Line
-from .measure import MaxDeviation, AvgDeviation, SquareDeviationAvg
 from .output import abort
-from .parse import latlon_pair_str, gpx_file, gpx_extract_points
+from .parse import latlon_pair_str, readable_file
+from .resample import DEFAULT_SPACING
 
-try:                         # python ^3.8
-    import importlib.metadata as importlib_metadata
-except ModuleNotFoundError:  # python <3.8
-    import importlib_metadata
+# names of measure.available_measures, known without importing the measures
+MEASURE_NAMES = ('MAX', 'AVG', 'SQ-AVG', 'P50', 'P90', 'P95', 'P99')
 
-__version__ = importlib_metadata.version('gpx-linesman')
+# names of engine.engines
+ENGINE_NAMES = ('exact', 'fast')
 
-
-available_measures = {
-    'MAX': MaxDeviation,
-    'AVG': AvgDeviation,
-    'SQ-AVG': SquareDeviationAvg
+# subcommands given as first command line argument instead of a gpx file,
+# mapped to the module providing their run(argv) function
+commands = {
+    'batch': 'batch',
+    'live': 'live',
+    'convert': 'trackfile',
+    'profile': 'profile',
+    'corridor': 'corridor',
+    'serve': 'serve',
+    'results': 'results',
 }
 
 
+def _version():
+    """:return: version of the installed linesman package"""
+    try:                         # python ^3.8
+        import importlib.metadata as importlib_metadata
+    except ModuleNotFoundError:  # python <3.8
+        import importlib_metadata
+    return importlib_metadata.version('gpx-linesman')
+
+
+def __getattr__(name):
+    """Resolve the version, the measures and evaluate() on first access."""
+    if name == '__version__':
+        return _version()
+    if name == 'evaluate':
+        from .api import evaluate
+        return evaluate
+    if name == 'available_measures':
+        from .measure import available_measures
+        return available_measures
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+class _VersionAction(argparse.Action):
+    """Like argparse's version action, but looks up the version when used."""
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, help=None):
+        super().__init__(option_strings, dest=dest, default=default, nargs=0,
+                         help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(_version())
+        parser.exit()
+
+
 def _argparser():
     """:return: argument parser defining the command line interface"""
     parser = argparse.ArgumentParser(
         description='Measure the deviation of a '
-                    'gpx track from a completely straight line.'
+                    'gpx track from a completely straight line.',
+        epilog="Run 'linesman batch --help' for evaluating many gpx files "
+               "at once, 'linesman live --help' for following a track that "
+               "is still being recorded, 'linesman profile --help' for "
+               "sliding window statistics along the line, 'linesman corridor "
+               "--help' for the intervals outside of a corridor, 'linesman "
+               "convert --help' for converting gpx files to a fast binary "
+               "format, "
+               "'linesman serve --help' for running an evaluation server and "
+               "'linesman results --help' for inspecting a result store."
     )
     parser.add_argument(
-        'gpxfile', type=gpx_file,
-        help='gpx file containing a GPS record to be compared to a straight line'
+        'gpxfile', type=readable_file,
+        help='gpx file containing a GPS record to be compared to a straight '
+             'line. FIT, NMEA and GeoJSON files, gzip, bzip2 and xz '
+             "compressed files and files converted with 'linesman convert' "
+             'are supported.'
     )
     parser.add_argument(
-        'measure', choices=available_measures.keys(),
-        help="Quality measure to use. Available are maximum deviation in meters "
-             "('MAX'), average deviation in meters ('AVG') and squared average "
-             "deviation ('SQ-AVG')."
+        'measure', nargs='+', choices=MEASURE_NAMES + ('ALL',),
+        help="Quality measures to use. Available are maximum deviation in meters "
+             "('MAX'), average deviation in meters ('AVG'), squared average "
+             "deviation ('SQ-AVG') and the median, 90th, 95th and 99th "
+             "percentile of the deviation in meters ('P50', 'P90', 'P95', "
+             "'P99'). Several measures are calculated together, 'ALL' selects "
+             "all of them."
     )
     parser.add_argument(
         '--line', type=latlon_pair_str,
@@ -42,24 +103,156 @@ def _argparser():
              "Default: Line defined by first and last point of the gpx track."
     )
     parser.add_argument(
-        '-V', '--version', action='version', version=__version__,
+        '--spacing', type=float, default=DEFAULT_SPACING,
+        help='Distance in meters between the equidistant points on the '
+             'reference line the track is resampled at. Default: '
+             f'{DEFAULT_SPACING:g}.'
+    )
+    parser.add_argument(
+        '--no-resample', dest='resample', action='store_false',
+        help='Compare the recorded points instead of a resampled track. '
+             'Averages are skewed by varying point density then.'
+    )
+    parser.add_argument(
+        '--engine', choices=ENGINE_NAMES, default='exact',
+        help="Transformation of the track into distances from the line: "
+             "'exact' (oblique mercator projection on the ellipsoid, default) "
+             "or 'fast' (spherical approximation, differs by centimeters)."
+    )
+    parser.add_argument(
+        '--simplify', type=float, metavar='METERS',
+        help='Drop track points deviating less than METERS from the '
+             'simplified track before resampling. The maximum deviation is '
+             'unchanged, the average deviation changes by at most METERS. '
+             'The number of dropped points and the time saved are printed '
+             'to stderr.'
+    )
+    parser.add_argument(
+        '--histogram', type=float, metavar='WIDTH',
+        help='Print the number of deviations in bins of WIDTH meters after '
+             'the measures. The result store is not used then.'
+    )
+    parser.add_argument(
+        '--fit', action='store_true',
+        help='Search the reference line minimizing each of the given measures '
+             'and print it together with the minimal value. --line is the '
+             'starting point of the search then.'
+    )
+    parser.add_argument(
+        '--segments', action='store_true',
+        help='Evaluate every track and segment of the gpx file separately, '
+             'concurrently, and print their results besides the results of '
+             'whole tracks and of all tracks together. Gaps between segments '
+             'are not evaluated. The cache is not used.'
+    )
+    parser.add_argument(
+        '-j', '--workers', type=int,
+        help='Number of processes projecting and evaluating chunks of the '
+             'track in parallel, for very large tracks. Results are identical '
+             'to the serial evaluation. With --segments, the number of '
+             'threads evaluating segments. Default: serial evaluation.'
+    )
+    parser.add_argument(
+        '--cache-dir', default=os.environ.get('LINESMAN_CACHE_DIR'),
+        help='Directory caching the points read from gpx files, such that '
+             'evaluating a file again skips parsing it. Default: '
+             '$LINESMAN_CACHE_DIR, no caching if unset.'
+    )
+    parser.add_argument(
+        '--cache-size', type=float, default=1024,
+        help='Size budget of the cache directory in MB, least recently used '
+             'tracks are removed first. Default: 1024.'
+    )
+    parser.add_argument(
+        '--cache-key', choices=('content', 'stat'), default='content',
+        help="Identify cached files by a hash of their contents ('content', "
+             "default) or by path, size and modification time ('stat')."
+    )
+    parser.add_argument(
+        '--result-store', default=os.environ.get('LINESMAN_RESULT_STORE'),
+        metavar='PATH',
+        help='SQLite database storing results by file, reference line, '
+             'measure, settings and linesman version, such that evaluating '
+             'an unchanged file again returns instantly. Files are identified '
+             'according to --cache-key. Not used with --fit and --segments. '
+             'Default: $LINESMAN_RESULT_STORE, no storage if unset.'
+    )
+    parser.add_argument(
+        '--timings', nargs='?', const='text', choices=('text', 'json'),
+        help='Print wall time, CPU time, point count and peak memory '
+             'increase of each pipeline stage to stderr, as table (default) '
+             'or JSON. The peak memory increase is how much the stage raised '
+             'the peak resident memory of the process, 0 if it stayed below '
+             'the peak of an earlier stage.'
+    )
+    parser.add_argument(
+        '-V', '--version', action=_VersionAction,
         help='Print linesman version and exit.'
     )
     return parser
 
 
-def get_evaluation_measure():
-    """
-    :return: Measure instance configured according to the command line
-    parameters
-    """
+def _selected_measures(names):
+    """:return: list of Measure classes selected by the given names"""
+    from .measure import available_measures
+
+    if 'ALL' in names:
+        return list(available_measures.values())
+    measures = []
+    for name in names:
+        if available_measures[name] not in measures:
+            measures.append(available_measures[name])
+    return measures
+
+
+def _parse_args():
+    """:return: parsed command line parameters"""
     parser = _argparser()
     args = parser.parse_args()
+    if args.spacing <= 0:
+        parser.error('--spacing must be positive')
+    if args.fit and args.segments:
+        parser.error('--fit and --segments cannot be combined')
+    if args.fit and args.engine != 'exact':
+        parser.error('--fit requires the exact engine')
+    if args.simplify is not None:
+        if args.simplify < 0:
+            parser.error('--simplify must not be negative')
+        if not args.resample:
+            parser.error('--simplify requires resampling')
+        if args.fit or args.segments or args.workers:
+            parser.error('--simplify cannot be combined with --fit, '
+                         '--segments or --workers')
+    if args.histogram is not None:
+        if args.histogram <= 0:
+            parser.error('--histogram must be positive')
+        if args.fit or args.segments:
+            parser.error('--histogram cannot be combined with --fit or '
+                         '--segments')
+    if args.workers is not None:
+        if args.workers < 1:
+            parser.error('--workers must be positive')
+        if args.fit:
+            parser.error('--fit cannot be combined with --workers')
+    return args
+
+
+def _evaluation_setup(args):
+    """
+    Read the gpx file given on the command line.
+    :return: tuple of track and reference line
+    """
+    from gpxpy.gpx import GPXException
+    from .parse import read_track
 
-    Measure = available_measures[args.measure]
     try:
-        points = gpx_extract_points(args.gpxfile)
-    except ValueError as e:
+        cache = None
+        if args.cache_dir:
+            from .cache import TrackCache
+            cache = TrackCache(args.cache_dir, int(args.cache_size*2**20),
+                               args.cache_key)
+        points = read_track(args.gpxfile, cache)
+    except (ValueError, GPXException) as e:
         abort(str(e))
 
     # if not explicitly given, let first/last point define the reference line
@@ -68,9 +261,186 @@ def get_evaluation_measure():
             args.line = Line(points[0], points[-1])
         except ValueError as e:  # may happen if both points are equal
             abort(str(e))
-    return Measure(points, args.line, resample=False)
+    return points, args.line
+
+
+def _segments_setup(args):
+    """
+    Read all tracks of the file given on the command line, segment by segment.
+    :return: tuple of the tracks (lists of segments) and the reference line
+    """
+    from gpxpy.gpx import GPXException
+    from .parse import read_segments
+
+    try:
+        tracks = read_segments(args.gpxfile)
+    except (ValueError, GPXException) as e:
+        abort(str(e))
+
+    segments = [s for track in tracks for s in track if len(s)]
+    if not args.line:
+        if not segments:
+            abort('gpx file must have at least two points!')
+        try:
+            args.line = Line(segments[0][0], segments[-1][-1])
+        except ValueError as e:
+            abort(str(e))
+    return tracks, args.line
+
+
+def _print_results(results, indent=''):
+    for measure, result in results.items():
+        print(f'{indent}{measure.desc}: {result}')
+
+
+def _print_histogram(distribution, width):
+    """Print the non-empty bins of a QuantileSketch's histogram."""
+    edges, counts = distribution.histogram(width)
+    total = counts.sum()
+    print('Deviation histogram:')
+    for edge, count in zip(edges, counts):
+        print(f'  {edge:g}-{edge + width:g} m: {count} '
+              f'({100*count/total:.1f}%)')
+
+
+def _run_segments(args, measures):
+    """Evaluate and print all tracks and segments of the given file."""
+    from .measure import evaluate_segments
+
+    tracks, line = _segments_setup(args)
+    results = evaluate_segments(tracks, line, measures, args.resample,
+                                args.spacing, args.workers, args.engine)
+    for i, track in enumerate(results.segments):
+        for j, segment in enumerate(track):
+            print(f'Track {i + 1}, segment {j + 1}:')
+            _print_results(segment, '  ')
+        print(f'Track {i + 1}:')
+        _print_results(results.tracks[i], '  ')
+    print('All tracks:')
+    _print_results(results.total, '  ')
+
+
+def _run_fit(args, measures):
+    """Fit and print the best reference line for each of the measures."""
+    from .fit import fit_line, plane_fits
+    from .measure import available_measures
+
+    names = {measure: name for name, measure in available_measures.items()}
+    if 'ALL' in args.measure:
+        measures = [measure for measure in measures if measure in plane_fits]
+    unsupported = [names[m] for m in measures if m not in plane_fits]
+    if unsupported:
+        abort(f"--fit is not supported for {', '.join(unsupported)}!")
+    points, line = _evaluation_setup(args)
+    for measure in measures:
+        result = fit_line(points, measure, line, args.resample, args.spacing)
+        a, b = result.line.point(0), result.line.point(1)
+        print(f'Fitted line for {names[measure]}: '
+              f'{a.y:.7f},{a.x:.7f};{b.y:.7f},{b.x:.7f}')
+        print(f'{measure.desc}: {result.value}')
+
+
+def _run_measures(args, measures):
+    """Evaluate and print the measures for the file given on the command
+    line, using the result store if given."""
+    if args.histogram:
+        from .measure import DeviationDistribution
+
+        results = _calculate_measures(args,
+                                      measures + [DeviationDistribution])
+        distribution = results.pop(DeviationDistribution)
+        _print_results(results)
+        _print_histogram(distribution, args.histogram)
+        return
+    if not args.result_store:
+        _print_results(_calculate_measures(args, measures))
+        return
+
+    import sqlite3
+    from .measure import available_measures
+    from .results import ResultStore
+
+    names = {measure: name for name, measure in available_measures.items()}
+    store = ResultStore(args.result_store, args.cache_key)
+    try:
+        results = store.evaluate(
+            args.gpxfile, args.line, [names[m] for m in measures],
+            lambda: {names[measure]: value for measure, value
+                     in _calculate_measures(args, measures).items()},
+            args.resample, args.spacing, args.engine, args.simplify
+        )
+    except sqlite3.Error as e:
+        abort(f'Result store: {e}')
+    finally:
+        store.close()
+    _print_results({available_measures[name]: value
+                    for name, value in results.items()})
+
+
+def _calculate_measures(args, measures):
+    """
+    Evaluate the measures for the file given on the command line. If the
+    track is simplified, the savings are printed to stderr.
+    :return: dict of Measure class to result
+    """
+    from .measure import Measure, required_accumulators
+
+    points, line = _evaluation_setup(args)
+    if args.workers:
+        from .parallel import parallel_measures
+        return parallel_measures(points, line, measures, args.resample,
+                                 args.spacing, args.engine, args.workers)
+    grid = Measure(points, line, args.resample, args.spacing, args.engine,
+                   args.simplify)
+    start = time.perf_counter()
+    acc = grid.accumulate(required_accumulators(measures))
+    seconds = time.perf_counter() - start
+
+    stats = grid.simplified
+    if stats is not None:
+        dropped = stats.points - stats.kept
+        # time for the dropped points, at the cost per remaining point
+        saved = seconds*dropped/max(stats.kept, 1) - stats.seconds
+        print(f'Simplification dropped {dropped} of {stats.points} points '
+              f'in {stats.seconds:.3f} s, estimated net time saved: '
+              f'{saved:.3f} s', file=sys.stderr)
+    return {measure: measure.from_accumulators(acc) for measure in measures}
+
+
+def get_evaluation_measure():
+    """
+    :return: Measure instance configured according to the command line
+    parameters. If several measures are given, the first one is used.
+    """
+    args = _parse_args()
+    points, line = _evaluation_setup(args)
+    Measure = _selected_measures(args.measure)[0]
+    return Measure(points, line, args.resample, args.spacing, args.engine,
+                   args.simplify)
 
 
 def run():
-    m = get_evaluation_measure()
-    print(f'{m.desc}: {m.calculate()}')
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        command = importlib.import_module(f'.{commands[sys.argv[1]]}', __name__)
+        raise SystemExit(command.run(sys.argv[2:]))
+    args = _parse_args()
+
+    recorder = timing.Recorder()
+    if args.timings:
+        timing.add_hook(recorder)
+    try:
+        measures = _selected_measures(args.measure)
+        if args.segments:
+            _run_segments(args, measures)
+        elif args.fit:
+            _run_fit(args, measures)
+        else:
+            _run_measures(args, measures)
+    finally:
+        if args.timings:
+            timing.remove_hook(recorder)
+
+    if args.timings == 'json':
+        print(recorder.as_json(), file=sys.stderr)
+    elif args.timings:
+        print(recorder.as_text(), file=sys.stderr)
@@ -0,0 +1,278 @@
+import math
+
+import numpy as np
+
+
+class DeviationBlock:
+    """
+    Block of deviations (y coordinates in the meter grid) passed to
+    Accumulator.update(). Derived arrays are computed at most once per block
+    and shared by all accumulators.
+    """
+    def __init__(self, y):
+        self.y = y
+        self._absolute = None
+        self._squared = None
+
+    def __len__(self):
+        return len(self.y)
+
+    @property
+    def absolute(self):
+        if self._absolute is None:
+            self._absolute = np.abs(self.y)
+        return self._absolute
+
+    @property
+    def squared(self):
+        if self._squared is None:
+            self._squared = np.square(self.y)
+        return self._squared
+
+
+def _add_exact(partials, x):
+    """
+    Add x to a list of non-overlapping partial sums without rounding error
+    (Shewchuk's algorithm, as used by math.fsum).
+    """
+    i = 0
+    for p in partials:
+        if abs(x) < abs(p):
+            x, p = p, x
+        hi = x + p
+        lo = p - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+
+
+class Accumulator:
+    """
+    Abstract base class for a mergeable partial aggregate of deviations.
+    Accumulators of disjoint parts of a track can be merged into the
+    aggregate of the whole track.
+    """
+    # whether the accumulator is updated with the resampled track (if
+    # resampling is enabled) instead of the recorded points
+    sampled = True
+
+    def update(self, block: DeviationBlock):
+        """Add a block of deviations."""
+        raise NotImplementedError()
+
+    def merge(self, other):
+        """Add the deviations aggregated by another accumulator of the same
+        type."""
+        raise NotImplementedError()
+
+    @property
+    def value(self):
+        raise NotImplementedError()
+
+
+class CountAccumulator(Accumulator):
+    """Number of deviations."""
+    def __init__(self):
+        self._count = 0
+
+    def update(self, block):
+        self._count += len(block)
+
+    def merge(self, other):
+        self._count += other._count
+
+    @property
+    def value(self):
+        return self._count
+
+
+class MaxAccumulator(Accumulator):
+    """Maximum absolute deviation, NaN if there are no deviations."""
+    # the maximum of the linearly interpolated track is always attained in a
+    # recorded point, resampling could only miss it
+    sampled = False
+
+    def __init__(self):
+        self._max = -math.inf
+
+    def update(self, block):
+        if len(block):
+            self._max = max(self._max, float(np.max(block.absolute)))
+
+    def merge(self, other):
+        self._max = max(self._max, other._max)
+
+    @property
+    def value(self):
+        return self._max if self._max != -math.inf else math.nan
+
+
+class _ExactSumAccumulator(Accumulator):
+    """
+    Sum of a per-block numpy reduction. Block sums are added without rounding
+    error, so the result does not depend on the order of updates and merges.
+    """
+    def __init__(self):
+        self._partials = []
+
+    def _block_sum(self, block):
+        raise NotImplementedError()
+
+    def update(self, block):
+        if len(block):
+            _add_exact(self._partials, self._block_sum(block))
+
+    def merge(self, other):
+        for p in other._partials:
+            _add_exact(self._partials, p)
+
+    @property
+    def value(self):
+        return math.fsum(self._partials)
+
+
+class SumAccumulator(_ExactSumAccumulator):
+    """Sum of absolute deviations."""
+    def _block_sum(self, block):
+        return float(np.sum(block.absolute))
+
+
+class SquareSumAccumulator(_ExactSumAccumulator):
+    """Sum of squared deviations."""
+    def _block_sum(self, block):
+        return float(np.sum(block.squared))
+
+
+class QuantileSketch(Accumulator):
+    """
+    Mergeable summary of the distribution of absolute deviations, answering
+    quantile and histogram queries with bounded memory. Up to `exact_limit`
+    deviations are kept and answered exactly. Beyond, deviations are counted
+    in logarithmic buckets (DDSketch): estimated quantiles differ from the
+    exact ones by at most `relative_accuracy` relatively, or by less than
+    `min_deviation` meters, and memory is bounded by the number of buckets,
+    log(maximum/min_deviation)/(2*relative_accuracy). Bucket counts are
+    merged exactly, so results don't depend on the order of updates and
+    merges. Subclasses may use other parameters.
+    """
+    relative_accuracy = 0.005
+    exact_limit = 2**20
+    # absolute deviations in meters counted as zero
+    min_deviation = 1e-4
+
+    def __init__(self):
+        self._gamma = (1 + self.relative_accuracy)/(1 - self.relative_accuracy)
+        self._count = 0
+        # deviations (in the first _count entries) while answering exactly,
+        # None once counted in buckets
+        self._exact = np.empty(0)
+        self._zeros = 0
+        self._offset = 0  # key of the first bucket
+        self._buckets = np.zeros(0, dtype=np.int64)
+
+    def update(self, block):
+        if len(block):
+            self._add(block.absolute)
+
+    def _add(self, values):
+        n = self._count + len(values)
+        if self._exact is not None:
+            if n <= self.exact_limit:
+                if n > len(self._exact):  # grow geometrically
+                    exact = np.empty(max(n, 2*len(self._exact)))
+                    exact[:self._count] = self._exact[:self._count]
+                    self._exact = exact
+                self._exact[self._count:n] = values
+                self._count = n
+                return
+            self._count_buckets(self._exact[:self._count])
+            self._exact = None
+        self._count_buckets(values)
+        self._count = n
+
+    def _count_buckets(self, values):
+        small = values <= self.min_deviation
+        self._zeros += int(np.count_nonzero(small))
+        values = values[~small]
+        if not len(values):
+            return
+        keys = np.ceil(np.log(values)/math.log(self._gamma)).astype(np.int64)
+        offset = int(keys.min())
+        self._add_buckets(offset, np.bincount(keys - offset))
+
+    def _add_buckets(self, offset, counts):
+        if not len(self._buckets):
+            self._offset, self._buckets = offset, counts.astype(np.int64)
+            return
+        start = min(self._offset, offset)
+        stop = max(self._offset + len(self._buckets), offset + len(counts))
+        if start != self._offset or stop - start != len(self._buckets):
+            buckets = np.zeros(stop - start, dtype=np.int64)
+            i = self._offset - start
+            buckets[i:i + len(self._buckets)] = self._buckets
+            self._offset, self._buckets = start, buckets
+        i = offset - start
+        self._buckets[i:i + len(counts)] += counts
+
+    def merge(self, other):
+        if other._exact is not None:
+            self._add(other._exact[:other._count])
+            return
+        if self._exact is not None:
+            self._count_buckets(self._exact[:self._count])
+            self._exact = None
+        self._count += other._count
+        self._zeros += other._zeros
+        if len(other._buckets):
+            self._add_buckets(other._offset, other._buckets)
+
+    def _estimates(self, keys):
+        """:return: estimated deviations of the buckets with the given keys"""
+        return 2*self._gamma**keys/(self._gamma + 1)
+
+    def quantile(self, q):
+        """
+        :param q: quantile between 0 and 1, e.g. 0.5 for the median
+        :return: deviation at rank floor(q*(count - 1)) among the sorted
+        absolute deviations, NaN if there are no deviations
+        """
+        if not 0 <= q <= 1:
+            raise ValueError('Quantile must be between 0 and 1!')
+        if not self._count:
+            return math.nan
+        rank = math.floor(q*(self._count - 1))
+        if self._exact is not None:
+            return float(np.partition(self._exact[:self._count], rank)[rank])
+        if rank < self._zeros:
+            return 0.0
+        i = np.searchsorted(np.cumsum(self._buckets), rank - self._zeros,
+                            side='right')
+        return float(self._estimates(self._offset + int(i)))
+
+    def histogram(self, width):
+        """
+        :param width: bin width in meters, bins are [k*width, (k+1)*width)
+        :return: tuple of numpy arrays (lower bin edges, counts) of the
+        non-empty bins. Beyond the exact limit, deviations are binned by
+        their estimates, so deviations close to a bin edge may be counted in
+        the neighbouring bin.
+        """
+        if width <= 0:
+            raise ValueError('Histogram bin width must be positive!')
+        if self._exact is not None:
+            values, weights = self._exact[:self._count], None
+        else:
+            values = np.concatenate(([0.0], self._estimates(
+                self._offset + np.arange(len(self._buckets)))))
+            weights = np.concatenate(([self._zeros], self._buckets))
+            values, weights = values[weights > 0], weights[weights > 0]
+        bins, inverse = np.unique(np.floor(values/width), return_inverse=True)
+        counts = np.bincount(inverse, weights, minlength=len(bins))
+        return bins*width, counts.astype(np.int64)
+
+    @property
+    def value(self):
+        """:return: median absolute deviation"""
+        return self.quantile(0.5)
@@ -0,0 +1,81 @@
+import numpy as np
+
+from .engine import DEFAULT_ENGINE
+from .geometry import Line
+from .measure import available_measures, calculate_measures
+from .parse import latlon_pair_str
+from .resample import DEFAULT_SPACING
+from .track import Track
+
+
+def _measure_classes(measures):
+    """
+    :param measures: iterable of measure names (keys of available_measures,
+    or 'ALL') and Measure classes
+    :return: dict of name to Measure class, in the given order
+    """
+    names = {measure: name for name, measure in available_measures.items()}
+    selected = {}
+    for measure in measures:
+        if measure == 'ALL':
+            selected.update(available_measures)
+        elif measure in available_measures:
+            selected[measure] = available_measures[measure]
+        elif measure in names:
+            selected[names[measure]] = measure
+        else:
+            raise ValueError(f"Unknown measure '{measure}', available are "
+                             f"{', '.join(available_measures)}!")
+    if not selected:
+        raise ValueError('At least one measure must be given!')
+    return selected
+
+
+def _check_coordinates(lon, lat):
+    """
+    :param lon: numpy array of longitudes in degrees
+    :param lat: numpy array of latitudes in degrees
+    :raise ValueError: if a coordinate is not finite or a latitude out of range
+    """
+    if not (np.isfinite(lon).all() and np.isfinite(lat).all()):
+        raise ValueError('Coordinates must be finite numbers!')
+    if (np.abs(lat) > 90).any():
+        raise ValueError('Latitudes must be between -90 and 90 degrees!')
+
+
+def evaluate(lon, lat, line=None, measures=('ALL',), resample=True,
+             spacing=DEFAULT_SPACING, engine=DEFAULT_ENGINE, simplify=None):
+    """
+    Evaluate a track given as coordinate arrays, for using linesman as a
+    library. Contiguous float64 arrays (numpy arrays, array.array('d'),
+    memoryviews or any other buffer) are used without copying. Invalid input
+    raises ValueError. The proj transformers of the exact engine are cached
+    per reference line and thread (see geo.transformer_cache), so evaluating
+    many tracks against the same line projects without setup costs.
+    :param lon: array-like of longitudes in degrees
+    :param lat: array-like of latitudes in degrees, same length as lon
+    :param line: reference line, as Line of (lon, lat) Vector instances or in
+    format 'lat,lon;lat,lon'. Defaults to the line through the first and last
+    point.
+    :param measures: iterable of measure names (see
+    measure.available_measures, 'ALL' selects all of them) or Measure classes
+    :param resample: see measure.Measure
+    :param spacing: see measure.Measure
+    :param engine: see measure.Measure
+    :param simplify: see measure.Measure
+    :return: dict of measure name to result, in the order of `measures`
+    """
+    selected = _measure_classes(measures)
+    points = Track(lon, lat)
+    if len(points) < 2:
+        raise ValueError('The track must have at least two points!')
+    _check_coordinates(points.lon, points.lat)
+    if line is None:
+        line = Line(points[0], points[-1])
+    elif isinstance(line, str):
+        line = latlon_pair_str(line)
+    a, b = line.point(0), line.point(1)
+    _check_coordinates(np.array([a.x, b.x]), np.array([a.y, b.y]))
+    results = calculate_measures(points, line, selected.values(), resample,
+                                 spacing, engine, simplify)
+    return {name: results[measure] for name, measure in selected.items()}
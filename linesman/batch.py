@@ -0,0 +1,188 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import glob
+import os
+import sys
+
+from .cache import TrackCache
+from .engine import DEFAULT_ENGINE, engines
+from .geometry import Line
+from .measure import available_measures, calculate_measures
+from .output import warn, warnings_on_stderr, warnings_to_stderr, \
+    writers
+from .parse import latlon_pair_str, read_track
+from .resample import DEFAULT_SPACING
+from .results import ResultStore
+
+
+def _argparser():
+    """:return: argument parser for the batch subcommand"""
+    parser = argparse.ArgumentParser(
+        prog='linesman batch',
+        description='Evaluate many gpx files in parallel. One result is '
+                    'printed per file as soon as it is finished.'
+    )
+    parser.add_argument(
+        'files', nargs='+',
+        help='track files (gpx, FIT, NMEA or GeoJSON) or glob patterns '
+             '(e.g. "attempts/**/*.gpx")'
+    )
+    parser.add_argument(
+        '-m', '--measure', action='append', choices=available_measures.keys(),
+        help='Quality measure to calculate, may be given multiple times. '
+             'Default: all measures.'
+    )
+    parser.add_argument(
+        '--line', type=latlon_pair_str,
+        help="Reference line shared by all files in format 'lat,lon;lat,lon'. "
+             "Default: Line defined by first and last point of each track."
+    )
+    parser.add_argument(
+        '--spacing', type=float, default=DEFAULT_SPACING,
+        help='Distance in meters between the equidistant points on the '
+             'reference line the tracks are resampled at. Default: '
+             f'{DEFAULT_SPACING:g}.'
+    )
+    parser.add_argument(
+        '--no-resample', dest='resample', action='store_false',
+        help='Compare the recorded points instead of resampled tracks.'
+    )
+    parser.add_argument(
+        '--engine', choices=sorted(engines), default=DEFAULT_ENGINE,
+        help="Transformation of the tracks: 'exact' (default) or 'fast' "
+             "(spherical approximation for screening many files)."
+    )
+    parser.add_argument(
+        '--cache-dir', default=os.environ.get('LINESMAN_CACHE_DIR'),
+        help='Directory caching the points read from gpx files. Default: '
+             '$LINESMAN_CACHE_DIR, no caching if unset.'
+    )
+    parser.add_argument(
+        '--cache-size', type=float, default=1024,
+        help='Size budget of the cache directory in MB. Default: 1024.'
+    )
+    parser.add_argument(
+        '--cache-key', choices=('content', 'stat'), default='content',
+        help="Identify cached files by a hash of their contents ('content', "
+             "default) or by path, size and modification time ('stat')."
+    )
+    parser.add_argument(
+        '--result-store', default=os.environ.get('LINESMAN_RESULT_STORE'),
+        metavar='PATH',
+        help='SQLite database storing results, such that unchanged files are '
+             'not evaluated again. Files are identified according to '
+             '--cache-key. Default: $LINESMAN_RESULT_STORE, no storage if '
+             'unset.'
+    )
+    parser.add_argument(
+        '-j', '--workers', type=int, default=os.cpu_count(),
+        help='Number of worker processes. Default: number of CPUs.'
+    )
+    parser.add_argument(
+        '--format', choices=('csv', 'jsonl'), default='csv',
+        help='Output format: CSV (default) or one JSON object per line.'
+    )
+    return parser
+
+
+def expand_paths(patterns):
+    """
+    :param patterns: file paths or glob patterns
+    :return: list of file paths. Patterns matching no file are kept as they
+    are, such that they are reported as unreadable.
+    """
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        paths.extend(matches if matches else [pattern])
+    return paths
+
+
+def evaluate_file(path, measures, line=None, resample=True,
+                  spacing=DEFAULT_SPACING, cache=None, engine=DEFAULT_ENGINE,
+                  store=None):
+    """
+    :param path: path of a gpx or binary track file
+    :param measures: names of the measures to calculate
+    :param line: reference line, defaults to first/last point of the track
+    :param resample: see measure.Measure
+    :param spacing: see measure.Measure
+    :param cache: TrackCache the points are read from, if given
+    :param engine: see measure.Measure
+    :param store: ResultStore the results are looked up in and stored to, if
+    given
+    :return: dict of measure name to result
+    """
+    if store is not None:
+        return store.evaluate(
+            path, line, measures,
+            lambda: evaluate_file(path, measures, line, resample, spacing,
+                                  cache, engine),
+            resample, spacing, engine
+        )
+    points = read_track(path, cache)
+    if line is None:
+        line = Line(points[0], points[-1])
+    results = calculate_measures(
+        points, line, [available_measures[name] for name in measures],
+        resample, spacing, engine
+    )
+    return {name: results[available_measures[name]] for name in measures}
+
+
+def _evaluate_task(path, measures, line, resample, spacing, cache, engine,
+                   store):
+    """
+    Worker process entry point. Errors are returned instead of raised to
+    report them together with the file they belong to, any error of a
+    single file (e.g. from a dependency) must not stop the batch.
+    :return: tuple (path, results, error message)
+    """
+    try:
+        return path, evaluate_file(path, measures, line, resample,
+                                   spacing, cache, engine, store), None
+    except Exception as e:
+        return path, {}, str(e) or type(e).__name__
+
+
+@warnings_on_stderr()
+def run(argv=None, out=None):
+    """
+    Run the batch subcommand. Warnings are printed to stderr.
+    :param argv: command line arguments, defaults to sys.argv[1:]
+    :param out: text stream results are written to, defaults to sys.stdout
+    :return: exit status, 1 if evaluating at least one file failed
+    """
+    parser = _argparser()
+    args = parser.parse_args(argv)
+    if args.spacing <= 0:
+        parser.error('--spacing must be positive')
+    out = out or sys.stdout
+    measures = args.measure or list(available_measures.keys())
+    paths = expand_paths(args.files)
+    writer = writers[args.format](out, ['file'] + measures + ['error'])
+    cache = None
+    if args.cache_dir:
+        cache = TrackCache(args.cache_dir, int(args.cache_size*2**20),
+                           args.cache_key)
+    store = None
+    if args.result_store:
+        store = ResultStore(args.result_store, args.cache_key)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(args.workers, 1),
+                             initializer=warnings_to_stderr) as pool:
+        tasks = [pool.submit(_evaluate_task, path, measures, args.line,
+                             args.resample, args.spacing, cache,
+                             args.engine, store)
+                 for path in paths]
+        for task in as_completed(tasks):
+            path, results, error = task.result()
+            if error:
+                failed += 1
+            writer.write(dict(file=path, **results, error=error))
+            out.flush()
+
+    if failed:
+        warn(f'{failed} of {len(paths)} files could not be evaluated.')
+    return 1 if failed else 0
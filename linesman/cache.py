@@ -0,0 +1,137 @@
+import hashlib
+import os
+
+from .timing import stage
+from .trackfile import EXTENSION, read_track_file, write_track_file
+
+# default size budget of a track cache directory in bytes
+DEFAULT_MAX_BYTES = 2**30
+
+# how a cached file is identified
+KEY_MODES = ('content', 'stat')
+
+
+def _file_digest(path):
+    """:return: sha256 hex digest of the contents of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_identity(path, key='content'):
+    """
+    :param key: one of KEY_MODES, see TrackCache
+    :return: string identifying a file
+    """
+    if key == 'content':
+        return _file_digest(path)
+    st = os.stat(path)
+    return f'{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}'
+
+
+class TrackCache:
+    """
+    Persistent cache of tracks read from files. Every track is stored in the
+    binary track format (see trackfile) and loaded by memory mapping it.
+    Entries are keyed by the file and the linesman version. The least
+    recently used entries are removed when the cache directory exceeds its
+    size budget.
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, key='content'):
+        """
+        :param directory: cache directory, created if missing
+        :param max_bytes: size budget of the cache directory
+        :param key: 'content' identifies files by a hash of their contents,
+        'stat' by their path, size and modification time (faster, but misses
+        changes that keep size and modification time)
+        """
+        if key not in KEY_MODES:
+            raise ValueError('Cache key must be one of '
+                             f"{', '.join(KEY_MODES)}!")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.key_mode = key
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, path):
+        """:return: cache key of a file"""
+        from . import __version__
+
+        ident = file_identity(path, self.key_mode)
+        return hashlib.sha256(f'{__version__}:{ident}'.encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, f'{key}{EXTENSION}')
+
+    def get(self, path):
+        """:return: cached Track of a file or None"""
+        return self._load(self.key(path))
+
+    def _load(self, key):
+        entry = self._entry_path(key)
+        with stage('cache') as current:
+            try:
+                track = read_track_file(entry)
+            except (OSError, ValueError):
+                return None
+            current.points = len(track)
+        try:
+            os.utime(entry)  # mark as recently used
+        except OSError:
+            pass
+        return track
+
+    def put(self, path, track):
+        """Store the Track read from a file and enforce the size budget."""
+        self._store(self.key(path), track)
+
+    def _store(self, key, track):
+        # written atomically, concurrent readers (e.g. batch workers) only
+        # ever see complete entries
+        write_track_file(track, self._entry_path(key))
+        self.evict()
+
+    def read(self, path, reader):
+        """
+        :param path: path of the track file
+        :param reader: function reading a Track from a path, used on cache
+        misses
+        :return: Track of the file
+        """
+        key = self.key(path)
+        track = self._load(key)
+        if track is None:
+            track = reader(path)
+            self._store(key, track)
+        return track
+
+    def size(self):
+        """:return: total size of the cached entries in bytes"""
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """:return: list of (path, size, mtime) of all cache entries"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(EXTENSION):
+                try:
+                    st = entry.stat()
+                except OSError:  # removed concurrently
+                    continue
+                entries.append((entry.path, st.st_size, st.st_mtime))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the budget is kept."""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:  # removed concurrently or mapped (windows)
+                continue
+            total -= size
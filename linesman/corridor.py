@@ -0,0 +1,178 @@
+import argparse
+from collections import namedtuple
+import sys
+import xml.etree.ElementTree as ET
+
+from gpxpy.gpx import GPXException
+import numpy as np
+
+from .engine import DEFAULT_ENGINE, engines
+from .geometry import Line
+from .measure import Measure
+from .output import abort, warnings_on_stderr, writers
+from .parse import latlon_pair_str, read_track, readable_file
+from .timing import stage
+
+# intervals in which a track leaves a corridor, as numpy arrays: indices of
+# the first and last point outside the corridor, start and end (in meters
+# along the reference line, where the track crosses the corridor's edge),
+# maximum absolute deviation and seconds spent outside (NaN without
+# timestamps) of every interval
+Violations = namedtuple('Violations', 'first last start end peak duration')
+
+COLUMNS = ('width',) + Violations._fields
+
+
+def _crossing(values, inside, outside, fraction):
+    """:return: values linearly interpolated between two indices"""
+    return values[inside] + fraction*(values[outside] - values[inside])
+
+
+def corridor_violations(x, y, widths, time=None):
+    """
+    Find the intervals in which a track is outside of corridors around the
+    reference line. All corridors are handled in a single pass over the
+    track: every point is assigned the number of corridors it is outside of,
+    the track is split into runs of constant number and the maximum deviation
+    of every run is calculated. The intervals of each corridor are unions of
+    consecutive runs, so they are found from the runs alone.
+    :param x: numpy array of positions along the reference line in meters
+    :param y: numpy array of deviations in meters
+    :param widths: iterable of corridor half-widths in meters, a point is
+    outside of a corridor if its absolute deviation is larger
+    :param time: numpy array of timestamps in seconds, if recorded
+    :return: dict of width to Violations, in the order of `widths`
+    """
+    widths = list(widths)
+    if any(width < 0 for width in widths):
+        raise ValueError('Corridor widths must not be negative!')
+    n = len(y)
+    with stage('corridor', n):
+        absolute = np.abs(y)
+        edges = np.unique(widths)
+        # number of corridors every point is outside of
+        level = np.searchsorted(edges, absolute)
+        run_starts = np.concatenate(([0], np.flatnonzero(np.diff(level)) + 1))
+        run_ends = np.append(run_starts[1:], n)
+        run_level = level[run_starts] if n else level
+        run_max = np.maximum.reduceat(absolute, run_starts) if n else absolute
+
+        intervals = {}
+        for k, width in enumerate(edges):
+            # runs outside of the corridor
+            change = np.diff((run_level > k).astype(np.int8), prepend=0,
+                             append=0)
+            first_run = np.flatnonzero(change == 1)
+            last_run = np.flatnonzero(change == -1) - 1
+            first, last = run_starts[first_run], run_ends[last_run] - 1
+            # runs between intervals are inside and deviate less
+            peak = np.maximum.reduceat(run_max, first_run) \
+                if len(first_run) else np.zeros(0)
+
+            # interpolate where the track crosses the edge of the corridor
+            entering = first > 0
+            leaving = last < n - 1
+            before, after = first[entering] - 1, last[leaving] + 1
+            into = (np.sign(y[first[entering]])*width - y[before]) \
+                / (y[first[entering]] - y[before])
+            out = (np.sign(y[last[leaving]])*width - y[last[leaving]]) \
+                / (y[after] - y[last[leaving]])
+            start, end = x[first].astype(np.float64), x[last].astype(np.float64)
+            start[entering] = _crossing(x, before, first[entering], into)
+            end[leaving] = _crossing(x, last[leaving], after, out)
+            if time is None:
+                duration = np.full(len(first), np.nan)
+            else:
+                t0, t1 = time[first].astype(np.float64), \
+                    time[last].astype(np.float64)
+                t0[entering] = _crossing(time, before, first[entering], into)
+                t1[leaving] = _crossing(time, last[leaving], after, out)
+                duration = t1 - t0
+            intervals[width] = Violations(first, last, start, end, peak,
+                                          duration)
+    return {width: intervals[width] for width in widths}
+
+
+def _rows(violations):
+    """
+    :param violations: dict of width to Violations
+    :return: iterable of the intervals as dicts of column to value
+    """
+    for width, intervals in violations.items():
+        columns = [getattr(intervals, name).tolist()
+                   for name in Violations._fields]
+        for values in zip(*columns):
+            yield dict(zip(COLUMNS, (width,) + values))
+
+
+def _argparser():
+    """:return: argument parser for the corridor subcommand"""
+    parser = argparse.ArgumentParser(
+        prog='linesman corridor',
+        description='Print the intervals in which a track leaves corridors '
+                    'around the reference line. A summary per corridor is '
+                    'printed on stderr.'
+    )
+    parser.add_argument('gpxfile', type=readable_file,
+                        help='gpx, FIT, NMEA or GeoJSON file (or converted '
+                             'track file) to evaluate')
+    parser.add_argument(
+        '-w', '--width', type=float, action='append',
+        help='Allowed deviation from the reference line in meters (half the '
+             'corridor width), may be given multiple times. Default: 100.'
+    )
+    parser.add_argument(
+        '--line', type=latlon_pair_str,
+        help="Reference line in format 'lat,lon;lat,lon'. Default: Line "
+             "defined by first and last point of the track."
+    )
+    parser.add_argument(
+        '--engine', choices=sorted(engines), default=DEFAULT_ENGINE,
+        help="Transformation of the track: 'exact' (default) or 'fast' "
+             "(spherical approximation)."
+    )
+    parser.add_argument(
+        '--format', choices=sorted(writers), default='csv',
+        help='Output format, one row per interval. Default: csv.'
+    )
+    return parser
+
+
+@warnings_on_stderr()
+def run(argv=None, out=None):
+    """
+    Run the corridor subcommand. Warnings are printed to stderr.
+    :param argv: command line arguments, defaults to sys.argv[1:]
+    :param out: text stream the intervals are written to, defaults to
+    sys.stdout
+    :return: exit status
+    """
+    parser = _argparser()
+    args = parser.parse_args(argv)
+    widths = args.width or [100.0]
+    if any(width < 0 for width in widths):
+        parser.error('--width must not be negative')
+    out = out or sys.stdout
+
+    try:
+        points = read_track(args.gpxfile)
+        line = args.line or Line(points[0], points[-1])
+        grid = Measure(points, line, engine=args.engine)
+        violations = corridor_violations(grid.x, grid.y, widths, points.time)
+    except (ValueError, GPXException, ET.ParseError) as e:
+        abort(str(e))
+
+    writer = writers[args.format](out, COLUMNS)
+    for row in _rows(violations):
+        writer.write(row)
+    out.flush()
+
+    for width, intervals in violations.items():
+        length = float(np.sum(intervals.end - intervals.start))
+        summary = f'Corridor of {width:g} m: {len(intervals.first)} ' \
+                  f'violations, {length:.1f} m outside'
+        if points.time is not None:
+            summary += f', {float(np.nansum(intervals.duration)):.1f} s ' \
+                       'outside'
+        print(summary, file=sys.stderr)
+    return 0
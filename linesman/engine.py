@@ -0,0 +1,137 @@
+import math
+
+from geographiclib.geodesic import Geodesic
+import numpy as np
+
+from .geo import azimuth, mercator_project_arrays
+from .geometry import Line
+from .timing import stage
+
+# semi-major axis and flattening of the WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1/298.257223563
+
+# engine used if none is selected
+DEFAULT_ENGINE = 'exact'
+
+
+class Engine:
+    """
+    Abstract base class for transforming tracks into the meter grid of a
+    reference line: x is the position along the line, y the deviation from
+    the line (positive on the right hand side).
+    """
+    def projector(self, refline: Line):
+        """
+        :param refline: line defining the grid
+        :return: function mapping array-likes (lon, lat) to a tuple (x, y) of
+        numpy arrays in meters
+        """
+        raise NotImplementedError()
+
+    def project(self, refline: Line, lon, lat):
+        """:return: tuple (x, y) of numpy arrays, see projector()"""
+        return self.projector(refline)(lon, lat)
+
+
+class ExactEngine(Engine):
+    """
+    Oblique mercator projection on the WGS84 ellipsoid with proj, see
+    geo.mercator_project_arrays().
+    """
+    def projector(self, refline):
+        origin = refline.point(0)
+        azi = azimuth(origin, refline.point(1))
+
+        def project(lon, lat):
+            return mercator_project_arrays(origin, azi, lon, lat)
+        return project
+
+
+def _unit_vectors(lon, lat):
+    """:return: 3 x n array of the unit vectors of (lon, lat) on a sphere"""
+    lon, lat = np.radians(lon), np.radians(lat)
+    cos_lat = np.cos(lat)
+    return np.stack((cos_lat*np.cos(lon), cos_lat*np.sin(lon), np.sin(lat)))
+
+
+class FastEngine(Engine):
+    """
+    Along and cross track distances to the great circle through the line's
+    points on a sphere, calculated with numpy only. For lines up to 100 km,
+    deviations differ from the exact engine by less than 0.01% plus 1
+    centimeter, for lines up to 300 km by less than 0.01% plus 10 centimeters
+    (see tests/test_engine.py).
+    """
+    def projector(self, refline):
+        start, end = refline.point(0), refline.point(1)
+        # The ellipsoid is mapped to a sphere with the radius of curvature in
+        # the prime vertical at the middle of the line, stretching latitudes
+        # around the middle, such that distances and angles are preserved
+        # there.
+        middle = math.radians((start.y + end.y)/2)
+        e2 = WGS84_F*(2 - WGS84_F)
+        w2 = 1 - e2*math.sin(middle)**2
+        radius = WGS84_A/math.sqrt(w2)
+        stretch = (1 - e2)/w2  # meridian radius of curvature / radius
+
+        def unit_vectors(lon, lat):
+            lat = np.degrees(middle + (np.radians(lat) - middle)*stretch)
+            return _unit_vectors(lon, lat)
+
+        a = unit_vectors(start.x, start.y)
+        b = unit_vectors(end.x, end.y)
+        normal = np.cross(a, b)
+        if not np.linalg.norm(normal):
+            raise ValueError('Line points must not be antipodal!')
+        normal /= np.linalg.norm(normal)
+        along = np.cross(normal, a)
+
+        def dot(u, p):
+            # elementwise instead of a matrix product, whose rounding may
+            # depend on the array length
+            return u[0]*p[0] + u[1]*p[1] + u[2]*p[2]
+
+        def great_circle(lon, lat):
+            p = unit_vectors(lon, lat)
+            return (np.arctan2(dot(along, p), dot(a, p))*radius,
+                    -np.arcsin(np.clip(dot(normal, p), -1, 1))*radius)
+
+        # The great circle bulges away from the geodesic between the line's
+        # points by up to some decimeters per 100 km. The bulge is corrected
+        # as parabola through the points and the geodesic's midpoint.
+        geodesic = Geodesic.WGS84.InverseLine(start.y, start.x, end.y, end.x)
+        mid = geodesic.Position(geodesic.s13/2)
+        length = float(great_circle(end.x, end.y)[0])
+        bulge = float(great_circle(mid['lon2'], mid['lat2'])[1])
+
+        def project(lon, lat):
+            lon = np.asarray(lon, dtype=np.float64)
+            lat = np.asarray(lat, dtype=np.float64)
+            if lon.shape != lat.shape:
+                raise ValueError('lon and lat must have the same shape!')
+            with stage('projection', len(lon)):
+                x, y = great_circle(lon, lat)
+                y -= 4*bulge*(x/length)*(1 - x/length)
+            return x, y
+        return project
+
+
+engines = {
+    'exact': ExactEngine,
+    'fast': FastEngine,
+}
+
+
+def get_engine(engine=DEFAULT_ENGINE):
+    """
+    :param engine: Engine instance or name of an engine in `engines`
+    :return: Engine instance
+    """
+    if isinstance(engine, Engine):
+        return engine
+    try:
+        return engines[engine]()
+    except KeyError:
+        raise ValueError(f"Unknown engine '{engine}', available are "
+                         f"{', '.join(engines)}!")
@@ -0,0 +1,229 @@
+from collections import namedtuple
+import math
+
+import numpy as np
+
+from .geo import azimuth, mercator_project_arrays, mercator_unproject
+from .geometry import Line, Vector
+from .measure import MaxDeviation, AvgDeviation, SquareDeviationAvg, \
+    accumulate
+from .resample import resample as resample_track, DEFAULT_SPACING
+from .timing import stage
+from .track import as_track
+
+# result of fit_line(): fitted reference line, result of the measure for this
+# line and number of projections of the track needed
+FitResult = namedtuple('FitResult', 'line value iterations')
+
+
+def _cross(x, y, a, b, candidates):
+    """:return: cross products (b - a) x (p - a) of the candidate points p"""
+    return ((x[b] - x[a])*(y[candidates] - y[a])
+            - (y[b] - y[a])*(x[candidates] - x[a]))
+
+
+def convex_hull(x, y):
+    """
+    Convex hull of a set of points (quickhull). Every step discards the points
+    inside the current polygon with array operations, which is fast for the
+    elongated point sets of tracks.
+    :param x: numpy array of x coordinates
+    :param y: numpy array of y coordinates
+    :return: numpy array of the indices of the hull vertices in
+    counterclockwise order
+    """
+    if not len(x):
+        return np.empty(0, dtype=np.int64)
+    order = np.lexsort((y, x))
+    left, right = order[0], order[-1]
+    if x[left] == x[right] and y[left] == y[right]:
+        return np.array([left])
+
+    candidates = np.arange(len(x))
+    cross = _cross(x, y, left, right, candidates)
+    hull = []
+    # in-order traversal: vertices are emitted between their chain's ends;
+    # the points to the right of a->b are outside of the polygon
+    stack = [('chain', right, left, candidates[cross > 0]),
+             ('vertex', right),
+             ('chain', left, right, candidates[cross < 0]),
+             ('vertex', left)]
+    while stack:
+        item = stack.pop()
+        if item[0] == 'vertex':
+            hull.append(item[1])
+            continue
+        _, a, b, candidates = item
+        if not len(candidates):
+            continue
+        cross = _cross(x, y, a, b, candidates)
+        far = candidates[np.argmin(cross)]
+        cross_af = _cross(x, y, a, far, candidates)
+        cross_fb = _cross(x, y, far, b, candidates)
+        stack.extend([('chain', far, b, candidates[cross_fb < 0]),
+                      ('vertex', far),
+                      ('chain', a, far, candidates[cross_af < 0])])
+    return np.array(hull)
+
+
+def min_width_line(x, y):
+    """
+    Center line of the narrowest strip containing all points, i.e. the line
+    minimizing the maximum distance to the points. The narrowest strip is
+    flush with a convex hull edge; the hull is scanned with rotating calipers.
+    :return: Line instance in the plane
+    """
+    hull = convex_hull(x, y)
+    hx, hy = x[hull], y[hull]
+    h = len(hull)
+    if h < 3:
+        return _line_through(x, y)
+
+    best = None
+    j = 1
+    for i in range(h):
+        ax, ay = hx[i], hy[i]
+        dx, dy = hx[(i + 1) % h] - ax, hy[(i + 1) % h] - ay
+        length = math.hypot(dx, dy)
+        if not length:
+            continue
+
+        def height(k):
+            return (dx*(hy[k % h] - ay) - dy*(hx[k % h] - ax))/length
+
+        # advance the antipodal vertex while its distance grows
+        while height(j + 1) >= height(j) and (j + 1) % h != i:
+            j += 1
+        width = height(j)
+        if best is None or width < best[0]:
+            best = (width, ax, ay, dx/length, dy/length)
+
+    width, ax, ay, ux, uy = best
+    # shift the hull edge by half the width towards the antipodal vertex
+    px, py = ax - uy*width/2, ay + ux*width/2
+    return Line(Vector(px, py), Vector(px + ux, py + uy))
+
+
+def _line_through(x, y):
+    """:return: Line through the two extreme points of collinear points"""
+    order = np.lexsort((y, x))
+    return Line(Vector(x[order[0]], y[order[0]]),
+                Vector(x[order[-1]], y[order[-1]]))
+
+
+def least_squares_line(x, y, weights=None):
+    """
+    Orthogonal (total) least squares line, minimizing the (weighted) sum of
+    squared distances to the points. It passes through the centroid along the
+    principal axis of the points.
+    :return: Line instance in the plane
+    """
+    cx, cy = np.average(x, weights=weights), np.average(y, weights=weights)
+    dx, dy = x - cx, y - cy
+    sxx = np.average(dx*dx, weights=weights)
+    syy = np.average(dy*dy, weights=weights)
+    sxy = np.average(dx*dy, weights=weights)
+    angle = math.atan2(2*sxy, sxx - syy)/2
+    return Line(Vector(cx, cy),
+                Vector(cx + math.cos(angle), cy + math.sin(angle)))
+
+
+def least_absolute_line(x, y, iterations=20):
+    """
+    Line minimizing the sum of distances to the points, approximated by
+    iteratively reweighted least squares.
+    :return: Line instance in the plane
+    """
+    line = least_squares_line(x, y)
+    for _ in range(iterations):
+        distance = np.abs(_distances(line, x, y))
+        weights = 1/np.maximum(distance, 1e-6*max(distance.max(), 1e-9))
+        line = least_squares_line(x, y, weights)
+    return line
+
+
+def _distances(line, x, y):
+    """:return: signed distances of the points to a Line in the plane"""
+    p, d = line.point(0), line.direction
+    return (d.x*(y - p.y) - d.y*(x - p.x))/d.length()
+
+
+# functions fitting a line in the plane for a measure, given the points the
+# measure aggregates
+plane_fits = {
+    MaxDeviation: min_width_line,
+    AvgDeviation: least_absolute_line,
+    SquareDeviationAvg: least_squares_line,
+}
+
+
+def _to_geographic(origin, azimuth, x, y):
+    """:return: (lon, lat) Vector of a point in the projection plane"""
+    lon, lat = mercator_unproject(origin, azimuth, x, y)
+    return Vector(float(lon), float(lat))
+
+
+def fit_line(points, measure, start: Line = None, resample=True,
+             spacing=DEFAULT_SPACING, tolerance=1e-3, max_iterations=10):
+    """
+    Find the reference line minimizing a measure for a track.
+    The track is projected to the plane of a starting line, where the optimal
+    straight line is found directly: the center line of the narrowest strip
+    containing the track (MAX), the least squares line (SQ-AVG) or the least
+    absolute deviations line (AVG). The fitted line defines the plane of the
+    next iteration, until the fitted line is the plane's x axis itself (within
+    `tolerance` meters at the ends of the track), i.e. optimal for the exact
+    measure, or until the measure doesn't improve any more.
+    :param points: Track instance (or list of Vector(lon,lat) instances)
+    :param measure: Measure class listed in plane_fits
+    :param start: line of the first projection, defaults to the line through
+    the first and last point
+    :param resample: see measure.Measure
+    :param spacing: see measure.Measure
+    :param tolerance: distance in meters below which a line is not moved
+    :param max_iterations: maximum number of projections of the track
+    :return: FitResult with the line (spanning the track) minimizing the
+    measure among all iterations
+    """
+    if measure not in plane_fits:
+        raise ValueError(f'Fitting a line is not supported for {measure.desc}!')
+    if resample and spacing <= 0:
+        raise ValueError('Resampling spacing must be positive!')
+    points = as_track(points)
+    line = start if start is not None else Line(points[0], points[-1])
+    sampled = resample and any(a.sampled for a in measure.accumulators)
+
+    best = None
+    for iteration in range(1, max_iterations + 1):
+        origin = line.point(0)
+        azi = azimuth(origin, line.point(1))
+        x, y = mercator_project_arrays(origin, azi, points.lon, points.lat)
+        acc = accumulate(x, y, measure.accumulators,
+                         spacing if resample else None)
+        value = measure.from_accumulators(acc)
+        if best is not None and not value < best[1]:
+            break  # converged, up to the accuracy of the plane fit
+        best = (line, value)
+
+        with stage('fit', len(x)):
+            fx, fy = resample_track(x, y, spacing) if sampled else (x, y)
+            try:
+                plane_line = plane_fits[measure](fx, fy)
+            except ValueError:  # all points are equal
+                break
+
+            # ends of the track along the fitted line
+            p, d = plane_line.point(0), plane_line.direction
+            if d.x < 0:
+                d = -d
+            u = Vector(d.x/d.length(), d.y/d.length())
+            along = (x - p.x)*u.x + (y - p.y)*u.y
+            ends = [p + float(t)*u for t in (along.min(), along.max())]
+        if all(abs(e.y) < tolerance for e in ends):
+            break
+        try:
+            line = Line(*(_to_geographic(origin, azi, e.x, e.y)
+                          for e in ends))
+        except ValueError:  # all points are equal
+            break
+    return FitResult(best[0], best[1], iteration)
@@ -0,0 +1,449 @@
+from array import array
+from datetime import datetime, timezone
+from functools import lru_cache
+import json
+import os
+import re
+import struct
+
+import numpy as np
+
+from .output import warn
+from .parse import nmea_fix, open_track_file
+from .timing import stage
+from .track import Track
+
+# file formats by extension, used if the format isn't recognized by the first
+# bytes of the file (compression extensions are ignored)
+EXTENSIONS = {
+    '.gpx': 'gpx',
+    '.fit': 'fit',
+    '.nmea': 'nmea',
+    '.nma': 'nmea',
+    '.geojson': 'geojson',
+    '.json': 'geojson',
+}
+COMPRESSION_EXTENSIONS = ('.gz', '.bz2', '.xz')
+
+# size of the chunks NMEA files are read in
+NMEA_CHUNK_SIZE = 2**22
+
+# beginning of an NMEA sentence at the start of a line
+_NMEA_START = re.compile(rb'(?:^|\n)\$[A-Z]{5},')
+
+
+def detect_format(path):
+    """
+    Detect the format of a (possibly compressed) track file: by its first
+    bytes (FIT header, '<' for gpx, '{' for GeoJSON and a line starting with
+    an NMEA sentence, e.g. '$GPGGA,') or else by its extension. Unrecognized
+    files are assumed to be gpx files.
+    :param path: path of the file, or its contents as bytes
+    :return: 'gpx', 'fit', 'nmea' or 'geojson'
+    """
+    with open_track_file(path) as f:
+        head = f.read(1024)
+    if len(head) >= 12 and head[8:12] == b'.FIT':
+        return 'fit'
+    start = head.lstrip(b'\xef\xbb\xbf \t\r\n')[:1]
+    detected = {b'<': 'gpx', b'{': 'geojson'}.get(start)
+    if detected is None and _NMEA_START.search(head):
+        detected = 'nmea'
+    if detected is None and not isinstance(path, bytes):
+        name, ext = os.path.splitext(path.lower())
+        if ext in COMPRESSION_EXTENSIONS:
+            ext = os.path.splitext(name)[1]
+        detected = EXTENSIONS.get(ext)
+    return detected or 'gpx'
+
+
+def _track(lon, lat, ele, time):
+    """
+    :return: Track of the columns, without the elevation and time columns if
+    they are NaN only
+    """
+    ele, time = (None if np.isnan(column).all() else column
+                 for column in (np.asarray(ele, dtype=np.float64),
+                                np.asarray(time, dtype=np.float64)))
+    return Track(np.asarray(lon, dtype=np.float64),
+                 np.asarray(lat, dtype=np.float64), ele, time)
+
+
+# FIT protocol: unix time of its epoch 1989-12-31T00:00:00Z, global number
+# of record messages, field numbers of the record message read and the value
+# marking an invalid field of the base types read
+FIT_EPOCH = 631065600
+FIT_RECORD = 20
+FIT_FIELDS = {
+    0: ('lat', 'i'),    # position_lat in semicircles
+    1: ('lon', 'i'),    # position_long in semicircles
+    2: ('alt', 'H'),    # altitude, 5*(meters + 500)
+    78: ('ealt', 'I'),  # enhanced_altitude, 5*(meters + 500)
+    253: ('time', 'I'),  # timestamp in seconds since the FIT epoch
+}
+FIT_INVALID = {'i': 0x7FFFFFFF, 'H': 0xFFFF, 'I': 0xFFFFFFFF}
+SEMICIRCLES = 180/2**31
+
+
+def _fit_definition(data, pos, developer):
+    """
+    Decode a definition message.
+    :return: tuple (position after the message, global message number, Struct
+    of the message's data, tuple of the positions of the FIT_FIELDS names in
+    the unpacked values, -1 for missing fields)
+    """
+    big_endian = data[pos + 1] == 1
+    message, = struct.unpack_from('>H' if big_endian else '<H', data, pos + 2)
+    count = data[pos + 4]
+    pos += 5
+    codes, names = ['>' if big_endian else '<'], []
+    for i in range(count):
+        number, size = data[pos + 3*i], data[pos + 3*i + 1]
+        field = FIT_FIELDS.get(number)
+        # record fields and the timestamp of other messages (for compressed
+        # timestamps) are read, everything else is skipped
+        if field and (message == FIT_RECORD or number == 253) \
+                and struct.calcsize(field[1]) == size:
+            codes.append(field[1])
+            names.append(field[0])
+        else:
+            codes.append(f'{size}x')
+    pos += 3*count
+    if developer:
+        fields = data[pos]
+        codes.append(f'{sum(data[pos + 3*i + 2] for i in range(fields))}x')
+        pos += 1 + 3*fields
+    index = tuple(names.index(name) if name in names else -1
+                  for name, _ in FIT_FIELDS.values())
+    return pos, message, struct.Struct(''.join(codes)), index
+
+
+def fit_read_segments(path):
+    """
+    Read the positions of the record messages of a (possibly compressed or
+    chained) FIT file, as written by many GPS devices. Messages are decoded
+    sequentially with one precompiled struct per message definition, into
+    coordinate arrays. The whole (decompressed) file is read into memory
+    first, which takes about as much memory as the coordinate arrays.
+    :param path: path of the FIT file or its contents as bytes
+    :return: list with one track of one segment, see read_segments()
+    """
+    with open_track_file(path) as f:
+        data = f.read()
+    lon, lat, ele, time = array('d'), array('d'), array('d'), array('d')
+    nan = float('nan')
+    invalid_angle, invalid_alt, invalid_time = \
+        FIT_INVALID['i'], FIT_INVALID['H'], FIT_INVALID['I']
+    invalid_ealt = invalid_time
+    with stage('parse') as current:
+        start = 0
+        try:
+            while start < len(data):
+                header_size = data[start]
+                if data[start + 8:start + 12] != b'.FIT':
+                    raise ValueError('Invalid FIT file header!')
+                size, = struct.unpack_from('<I', data, start + 4)
+                pos, end = start + header_size, start + header_size + size
+                if end > len(data):
+                    raise ValueError('Truncated FIT file!')
+                definitions = {}
+                timestamp = None
+                while pos < end:
+                    header = data[pos]
+                    pos += 1
+                    if header & 0x80:  # compressed timestamp header
+                        local = (header >> 5) & 0x03
+                        if timestamp is not None:
+                            offset = header & 0x1F
+                            timestamp += (offset - timestamp) & 0x1F
+                    elif header & 0x40:  # definition message
+                        pos, *definition = _fit_definition(data, pos,
+                                                           header & 0x20)
+                        definitions[header & 0x0F] = definition
+                        continue
+                    else:
+                        local = header & 0x0F
+                    if local not in definitions:
+                        raise ValueError('FIT data message without '
+                                         'definition!')
+                    message, layout, index = definitions[local]
+                    # missing fields are read as None
+                    values = layout.unpack_from(data, pos) + (None,)
+                    pos += layout.size
+                    i_lat, i_lon, i_alt, i_ealt, i_time = index
+                    if values[i_time] not in (None, invalid_time):
+                        timestamp = values[i_time]
+                    y, x = values[i_lat], values[i_lon]
+                    if message != FIT_RECORD or y in (None, invalid_angle) \
+                            or x in (None, invalid_angle):
+                        continue  # no position
+                    lat.append(y*SEMICIRCLES)
+                    lon.append(x*SEMICIRCLES)
+                    altitude = values[i_ealt]
+                    if altitude in (None, invalid_ealt):
+                        altitude = values[i_alt]
+                        if altitude == invalid_alt:
+                            altitude = None
+                    ele.append(nan if altitude is None else altitude/5 - 500)
+                    time.append(nan if timestamp is None
+                                else timestamp + FIT_EPOCH)
+                start = end + 2  # CRC
+        except (IndexError, struct.error):
+            raise ValueError('Truncated FIT file!')
+        current.points = len(lon)
+        return [[_track(lon, lat, ele, time)]]
+
+
+# hex digit values by character code, -1 for other characters
+_HEX = np.full(256, -1, dtype=np.int16)
+for _i, _c in enumerate(b'0123456789ABCDEF'):
+    _HEX[_c] = _i
+for _i, _c in enumerate(b'abcdef'):
+    _HEX[_c] = _i + 10
+
+
+def _nmea_sentences(chunk):
+    """
+    Find the GGA and RMC sentences of a chunk of complete NMEA lines. The
+    checksums are verified for all sentences at once, as differences of a
+    prefix xor over the chunk.
+    :return: list of the sentences (str, without '$' and checksum) with a
+    valid or without checksum
+    """
+    data = np.frombuffer(chunk, dtype=np.uint8)
+    n = len(data)
+    starts = np.flatnonzero(data == ord('$'))
+    starts = starts[starts + 6 < n]
+    kinds = (data[starts + 3].astype(np.int32) << 16) \
+        | (data[starts + 4].astype(np.int32) << 8) | data[starts + 5]
+    gga = (ord('G') << 16) | (ord('G') << 8) | ord('A')
+    rmc = (ord('R') << 16) | (ord('M') << 8) | ord('C')
+    starts = starts[(kinds == gga) | (kinds == rmc)]
+
+    line_ends = np.append(np.flatnonzero((data == ord('\n'))
+                                         | (data == ord('\r'))), n)
+    ends = line_ends[np.searchsorted(line_ends, starts)]
+    stars = np.append(np.flatnonzero(data == ord('*')), n)
+    stars = stars[np.searchsorted(stars, starts)]
+    checked = stars < ends
+    stops = np.where(checked, stars, ends)
+
+    prefix = np.bitwise_xor.accumulate(data)
+    computed = prefix[stops - 1] ^ prefix[starts]
+    digits = np.minimum(stops + 2, n - 1)
+    given = _HEX[data[np.minimum(stops + 1, n - 1)]]*16 + _HEX[data[digits]]
+    valid = ~checked | ((stops + 2 < ends) & (computed == given))
+    # every byte is decoded to one character, offsets stay the same
+    text = chunk.decode('ascii', 'replace')
+    return [text[a + 1:b] for a, b in zip(starts[valid].tolist(),
+                                          stops[valid].tolist())]
+
+
+def _nmea_seconds(value):
+    """:return: seconds of the day of a NMEA hhmmss.ss time"""
+    hours, rest = divmod(float(value), 10000)
+    minutes, seconds = divmod(rest, 100)
+    return hours*3600 + minutes*60 + seconds
+
+
+@lru_cache(maxsize=64)
+def _nmea_day(value):
+    """:return: unix time of the start of a NMEA ddmmyy date"""
+    date = datetime.strptime(value, '%d%m%y')
+    return date.replace(tzinfo=timezone.utc).timestamp()
+
+
+def nmea_read_segments(path, chunk_size=NMEA_CHUNK_SIZE):
+    """
+    Read the positions of the GGA and RMC sentences of a (possibly
+    compressed) NMEA 0183 log. The file is read in chunks of lines whose
+    checksums are verified at once, the sentences are parsed like live NMEA
+    input (see parse.nmea_fix()). A GGA and a RMC sentence of the same fix
+    (equal time) yield one point. Dates are only part of RMC sentences, fixes
+    before the first one are assumed to be on its date.
+    :param path: path of the NMEA file or its contents as bytes
+    :param chunk_size: number of bytes read at once
+    :return: list with one track of one segment, see read_segments()
+    """
+    lon, lat, ele = array('d'), array('d'), array('d')
+    # time of a fix: start of its day (unix time) and seconds of the day
+    days, seconds = array('d'), array('d')
+    nan = float('nan')
+    day = nan
+    last_fix = None
+    with stage('parse') as current, open_track_file(path) as f:
+        rest = b''
+        while True:
+            data = f.read(chunk_size)
+            chunk = rest + data
+            if data:
+                end = chunk.rfind(b'\n') + 1
+                chunk, rest = chunk[:end], chunk[end:]
+            for sentence in _nmea_sentences(chunk):
+                fields = sentence.split(',')
+                try:
+                    fix = nmea_fix(fields)
+                    if fix is None:
+                        continue
+                    x, y, altitude, date = fix
+                    if date:
+                        day = _nmea_day(date)
+                    if fields[1] and fields[1] == last_fix:
+                        # second sentence of the same fix
+                        if date:
+                            days[-1] = day
+                        continue
+                    second = _nmea_seconds(fields[1]) if fields[1] else nan
+                except ValueError:
+                    continue  # corrupt sentence
+                if not date and seconds and second < seconds[-1] - 43200:
+                    day += 86400  # midnight passed without a RMC sentence
+                last_fix = fields[1]
+                lon.append(x)
+                lat.append(y)
+                ele.append(altitude)
+                days.append(day)
+                seconds.append(second)
+            if not data:
+                break
+        current.points = len(lon)
+
+    days = np.asarray(days)
+    known = np.flatnonzero(~np.isnan(days))
+    if len(known):
+        days[:known[0]] = days[known[0]]
+    return [[_track(lon, lat, ele, days + np.asarray(seconds))]]
+
+
+def _geojson_time(value):
+    """:return: seconds since the epoch of a coordTimes entry or NaN"""
+    from gpxpy.gpx import GPXException
+    from .gpx import _iso_timestamp
+    try:
+        return _iso_timestamp(str(value))
+    except GPXException:
+        return float('nan')
+
+
+def _geojson_lines(obj):
+    """
+    :return: iterable of (list of coordinate lists, list of time lists or
+    None), one per LineString or MultiLineString geometry in a GeoJSON object
+    """
+    if not isinstance(obj, dict):
+        return
+    kind = obj.get('type')
+    if kind == 'FeatureCollection':
+        for feature in obj.get('features') or ():
+            yield from _geojson_lines(feature)
+    elif kind == 'Feature':
+        geometry = obj.get('geometry') or {}
+        # coordinate times as written by togeojson
+        times = (obj.get('properties') or {}).get('coordTimes')
+        for lines, _ in _geojson_lines(geometry):
+            if times and geometry.get('type') == 'LineString':
+                times = [times]
+            yield lines, times
+    elif kind == 'GeometryCollection':
+        for geometry in obj.get('geometries') or ():
+            yield from _geojson_lines(geometry)
+    elif kind == 'LineString':
+        yield [obj.get('coordinates') or []], None
+    elif kind == 'MultiLineString':
+        lines = obj.get('coordinates') or []
+        if not isinstance(lines, list):
+            raise ValueError('GeoJSON MultiLineString coordinates must be an '
+                             'array!')
+        yield lines, None
+
+
+def _geojson_segment(coordinates, times):
+    """:return: Track of the positions of a LineString"""
+    if not isinstance(coordinates, list):
+        raise ValueError('GeoJSON LineString coordinates must be an array!')
+    if not coordinates:
+        return Track(np.empty(0), np.empty(0))
+    try:
+        points = np.array(coordinates, dtype=np.float64)
+    except (TypeError, ValueError):
+        points = None
+    if points is None or points.ndim != 2:
+        # positions with and without elevation, or invalid positions
+        if not all(isinstance(p, list) and len(p) >= 2 for p in coordinates):
+            raise ValueError('GeoJSON positions must have at least two '
+                             'coordinates!')
+        try:
+            points = np.array([p[:3] + [np.nan]*(3 - len(p))
+                               for p in coordinates], dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError('GeoJSON positions must be arrays of numbers!')
+    if points.shape[1] < 2:
+        raise ValueError('GeoJSON positions must have at least two '
+                         'coordinates!')
+    if not np.isfinite(points[:, :2]).all():
+        raise ValueError('GeoJSON positions must have finite longitude and '
+                         'latitude!')
+    ele = points[:, 2] if points.shape[1] > 2 else np.full(len(points), np.nan)
+    time = np.full(len(points), np.nan)
+    if times and len(times) == len(points):
+        time = np.array([_geojson_time(t) for t in times], dtype=np.float64)
+    return _track(points[:, 0], points[:, 1], ele, time)
+
+
+def geojson_read_segments(path):
+    """
+    Read the LineString and MultiLineString geometries of a (possibly
+    compressed) GeoJSON file. Every geometry is a track, the lines of a
+    MultiLineString are its segments. Times are read from the 'coordTimes'
+    property of features if given.
+    :param path: path of the GeoJSON file or its contents as bytes
+    :return: see read_segments()
+    """
+    with stage('parse') as current, open_track_file(path) as f:
+        try:
+            obj = json.load(f)
+        except ValueError as e:
+            raise ValueError(f'Invalid GeoJSON file: {e}')
+        tracks = [[_geojson_segment(coordinates, times[i] if times else None)
+                   for i, coordinates in enumerate(lines)]
+                  for lines, times in _geojson_lines(obj)]
+        current.points = sum(len(s) for track in tracks for s in track)
+    if not tracks:
+        raise ValueError('The GeoJSON file must contain at least one '
+                         'LineString!')
+    return tracks
+
+
+# functions reading the tracks of a file segment by segment, by format
+segment_readers = {
+    'fit': fit_read_segments,
+    'nmea': nmea_read_segments,
+    'geojson': geojson_read_segments,
+}
+
+
+def read_segments(path, file_format):
+    """
+    :param path: path of the track file or its contents as bytes
+    :param file_format: key of segment_readers
+    :return: list with a list of Track instances (one per segment) per track
+    """
+    return segment_readers[file_format](path)
+
+
+def read_track(path, file_format):
+    """
+    Read the points of the first track of a file.
+    :param path: path of the track file or its contents as bytes
+    :param file_format: key of segment_readers
+    :return: Track instance
+    """
+    tracks = read_segments(path, file_format)
+    if len(tracks) > 1:
+        warn(f'{file_format} file has multiple tracks, defaulting to first '
+             'one.')
+    track = Track.concatenate(tracks[0])
+    if len(track) < 2:
+        raise ValueError(f'{file_format} file must have at least two points '
+                         'in the selected track!')
+    return track
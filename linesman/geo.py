@@ -1,7 +1,13 @@
+from collections import namedtuple, OrderedDict
+import threading
+
 from geographiclib.geodesic import Geodesic
+import numpy as np
 from pyproj import CRS, Transformer
 
 from .geometry import Vector, Line
+from .timing import stage
+from .track import as_track
 
 
 def azimuth(p1: Vector, p2: Vector):
@@ -20,6 +26,136 @@ def dist_m(a, b):
     return res['s12']
 
 
+def mercator_transformer(origin: Vector, azimuth, ellps='WGS84'):
+    """
+    :return: pyproj Transformer from (lat, lon) to the oblique mercator
+    projection described in mercator_project()
+    """
+    base = CRS.from_user_input(4326)
+    mercator = CRS(f'+proj=omerc +lonc={origin.x} +lat_0={origin.y} '
+                   f'+alpha={azimuth} +gamma=0 +ellps={ellps}')
+    return Transformer.from_crs(base, mercator)
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class TransformerCache:
+    """
+    Bounded LRU cache of mercator_transformer() results keyed by (origin,
+    azimuth, ellipsoid). pyproj Transformers are not thread-safe, so every
+    thread keeps its own instances; hit/miss counters are shared.
+    """
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    def _entries(self):
+        """:return: OrderedDict of the calling thread's cached transformers"""
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            local.entries = OrderedDict()
+            local.generation = self._generation
+        return local.entries
+
+    def get(self, origin: Vector, azimuth, ellps='WGS84'):
+        """:return: (cached) Transformer, see mercator_transformer()"""
+        key = (origin.x, origin.y, azimuth, ellps)
+        entries = self._entries()
+        transformer = entries.get(key)
+        if transformer is not None:
+            entries.move_to_end(key)
+            with self._lock:
+                self._hits += 1
+            return transformer
+
+        with self._lock:
+            self._misses += 1
+        with stage('transformer'):
+            transformer = mercator_transformer(origin, azimuth, ellps)
+        entries[key] = transformer
+        while len(entries) > max(self.maxsize, 0):
+            entries.popitem(last=False)
+        return transformer
+
+    def info(self):
+        """
+        :return: CacheInfo with hits and misses of all threads and the number
+        of transformers cached for the calling thread
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize,
+                             len(self._entries()))
+
+    def clear(self):
+        """Drop the cached transformers of all threads and reset counters."""
+        with self._lock:
+            self._generation += 1
+            self._hits = 0
+            self._misses = 0
+
+
+# cache used by mercator_project_arrays()
+transformer_cache = TransformerCache()
+
+
+def _central_azimuth(azimuth):
+    """
+    proj's omerc rotates the projected coordinates if the azimuth of the
+    central line exceeds +-90 degrees. The opposite azimuth describes the same
+    geodesic, with the projected coordinates mirrored at the origin.
+    :return: tuple (azimuth within +-90 degrees, sign of the coordinates)
+    """
+    azimuth = (azimuth + 180) % 360 - 180
+    if azimuth > 90:
+        return azimuth - 180, -1
+    if azimuth < -90:
+        return azimuth + 180, -1
+    return azimuth, 1
+
+
+def mercator_project_arrays(origin: Vector, azimuth, lon, lat, ellps='WGS84'):
+    """
+    Array variant of mercator_project(): all points are passed to proj in a
+    single call instead of one call per point.
+    :param origin: (lon, lat) that will become (0, 0) in projection
+    :param azimuth: azimuth in degrees of origin defining the direction of the
+    geodesic that becomes the new equator (y=0) in projection
+    :param lon: array-like of longitudes
+    :param lat: array-like of latitudes, same length as lon
+    :param ellps: proj ellipsoid identifier, see mercator_project()
+    :return: tuple (x, y) of float64 numpy arrays in meters
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    if lon.shape != lat.shape:
+        raise ValueError('lon and lat must have the same shape!')
+
+    azimuth, sign = _central_azimuth(azimuth)
+    t = transformer_cache.get(origin, azimuth, ellps)
+    with stage('projection', len(lon)):
+        y, x = t.transform(lat, lon)
+    return (sign*np.asarray(x, dtype=np.float64),
+            sign*np.asarray(y, dtype=np.float64))
+
+
+def mercator_unproject(origin: Vector, azimuth, x, y, ellps='WGS84'):
+    """
+    Inverse of mercator_project_arrays().
+    :return: tuple (lon, lat) of numpy arrays
+    """
+    azimuth, sign = _central_azimuth(azimuth)
+    t = transformer_cache.get(origin, azimuth, ellps)
+    lat, lon = t.transform(sign*np.asarray(y, dtype=np.float64),
+                           sign*np.asarray(x, dtype=np.float64),
+                           direction='INVERSE')
+    return np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+
+
 def mercator_project(origin: Vector, azimuth, points: [Vector], ellps='WGS84'):
     """
     Perform a oblique mercator projection of a given list of points with the
@@ -28,17 +164,14 @@ def mercator_project(origin: Vector, azimuth, points: [Vector], ellps='WGS84'):
     :param origin: (lon, lat) that will become (0, 0) in projection
     :param azimuth: azimuth in degrees of origin defining the direction of the
     geodesic that becomes the new equator (y=0) in projection
-    :param points: iterable of (lon,lat) Vector instance
+    :param points: Track instance or iterable of (lon,lat) Vector instances
     :param ellps: proj ellipsoid identifier for ellipsoid to use as model for
     the globe. Defaults to WGS84.
     :return: iterable of (x, y) Vector instances in the coordinate system with
     unit 1 meter
     """
-    base = CRS.from_user_input(4326)
-    mercator = CRS(f'+proj=omerc +lonc={origin.x} +lat_0={origin.y} '
-                   f'+alpha={azimuth} +gamma=0 +ellps={ellps}')
-    t = Transformer.from_crs(base, mercator)
+    track = as_track(points)
+    x, y = mercator_project_arrays(origin, azimuth, track.lon, track.lat, ellps)
 
-    for p in points:
-        res = t.transform(p.y, p.x)
-        yield Vector(res[1], res[0])
+    for px, py in zip(x.tolist(), y.tolist()):
+        yield Vector(px, py)
@@ -0,0 +1,240 @@
+from datetime import datetime, timezone
+import xml.etree.ElementTree as ET
+
+import gpxpy
+from gpxpy.gpxfield import parse_time
+import numpy as np
+
+from .output import warn
+from .parse import open_track_file, readable_file
+from .timing import stage
+from .track import Track
+
+# number of track points per chunk yielded by gpx_iter_chunks()
+CHUNK_SIZE = 2**16
+
+
+def gpx_file(path):
+    """:return: contents of (possibly compressed) gpx file parsed with gpxpy"""
+    if not isinstance(path, bytes):
+        readable_file(path)
+    with stage('gpxpy.parse'), open_track_file(path) as f:
+        return gpxpy.parse(f.read().decode('utf-8'))
+
+
+def _timestamp(time):
+    """:return: seconds since the epoch of a datetime, assuming UTC if naive"""
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return time.timestamp()
+
+
+def _points_track(points):
+    """:return: Track of a list of gpxpy track points"""
+    n = len(points)
+    with stage('extract', n):
+        lon = np.fromiter((p.longitude for p in points), np.float64, n)
+        lat = np.fromiter((p.latitude for p in points), np.float64, n)
+        ele = time = None
+        if any(p.elevation is not None for p in points):
+            ele = np.fromiter((np.nan if p.elevation is None else p.elevation
+                               for p in points), np.float64, n)
+        if any(p.time is not None for p in points):
+            time = np.fromiter((np.nan if p.time is None
+                                else _timestamp(p.time) for p in points),
+                               np.float64, n)
+        return Track(lon, lat, ele, time)
+
+
+def gpx_extract_points(gpx_obj):
+    """
+    Extract the points of the first track of a gpx file.
+    :return: Track instance
+    """
+    tracks = len(gpx_obj.tracks)
+    if tracks < 1:
+        raise ValueError('The gpx file must contain at least one track!')
+    elif tracks > 1:
+        warn('gpx file has multiple tracks, defaulting to first one.')
+
+    track = gpx_obj.tracks[0]
+    points = [p for segment in track.segments for p in segment.points]
+    if len(points) < 2:
+        msg = 'gpx file must have at least two points in the selected track!'
+        raise ValueError(msg)
+    return _points_track(points)
+
+
+def gpx_extract_segments(gpx_obj):
+    """
+    Extract the points of all tracks of a gpx file, segment by segment.
+    :return: list with a list of Track instances (one per segment) per track
+    """
+    if not gpx_obj.tracks:
+        raise ValueError('The gpx file must contain at least one track!')
+    return [[_points_track(segment.points) for segment in track.segments]
+            for track in gpx_obj.tracks]
+
+
+def _local_name(tag):
+    """:return: xml tag without namespace"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _iso_timestamp(string):
+    """:return: seconds since the epoch of an ISO 8601 time or NaN"""
+    string = string.strip()
+    try:
+        time = datetime.fromisoformat(string.replace('Z', '+00:00'))
+    except ValueError:
+        time = parse_time(string)
+        if time is None:
+            return np.nan
+    return _timestamp(time)
+
+
+def _chunk(lon, lat, ele, time):
+    """:return: Track of the collected point values"""
+    return Track(
+        np.array(lon, dtype=np.float64), np.array(lat, dtype=np.float64),
+        np.array(ele, dtype=np.float64),
+        np.array([np.nan if t is None else _iso_timestamp(t) for t in time],
+                 dtype=np.float64)
+    )
+
+
+def _iter_points(path, chunk_size, all_tracks):
+    """
+    Incrementally read the track points of a (possibly compressed) gpx file.
+    :param all_tracks: whether to read all tracks instead of the first one.
+    If set, chunks end at segment boundaries.
+    :return: iterable of tuples (track index, segment index, Track chunk)
+    """
+    lon, lat, ele, time = [], [], [], []
+    point_ele = point_time = None
+    tracks = segments = 0
+    in_track = in_point = False
+    names = {}  # cache of namespaced tag -> local name
+    with open_track_file(path) as f:
+        stack = []
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            tag = names.get(elem.tag)
+            if tag is None:
+                tag = names[elem.tag] = _local_name(elem.tag)
+            if event == 'start':
+                stack.append(elem)
+                if tag == 'trk':
+                    tracks += 1
+                    segments = 0
+                    if tracks > 1 and not all_tracks:
+                        warn('gpx file has multiple tracks, defaulting to '
+                             'first one.')
+                        break
+                    in_track = True
+                elif tag == 'trkseg' and in_track:
+                    segments += 1
+                elif tag == 'trkpt' and in_track:
+                    in_point = True
+                    point_ele = point_time = None
+                continue
+
+            stack.pop()
+            if in_point:
+                if tag == 'ele':
+                    point_ele = elem.text
+                elif tag == 'time':
+                    point_time = elem.text
+                elif tag == 'trkpt':
+                    in_point = False
+                    try:
+                        lon.append(float(elem.get('lon')))
+                        lat.append(float(elem.get('lat')))
+                    except (TypeError, ValueError):
+                        raise ValueError('gpx track point without valid '
+                                         'lat/lon attributes!')
+                    ele.append(np.nan if point_ele is None
+                               else float(point_ele))
+                    time.append(point_time)
+                    if len(lon) >= chunk_size:
+                        yield (tracks - 1, segments - 1,
+                               _chunk(lon, lat, ele, time))
+                        lon, lat, ele, time = [], [], [], []
+            elif tag == 'trkseg' and in_track and all_tracks:
+                # every segment yields a chunk, even if it is empty
+                yield tracks - 1, segments - 1, _chunk(lon, lat, ele, time)
+                lon, lat, ele, time = [], [], [], []
+            elif tag == 'trk':
+                in_track = False
+            # free every finished element, its data has been consumed above
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+    if lon:
+        yield tracks - 1, segments - 1, _chunk(lon, lat, ele, time)
+    if tracks < 1:
+        raise ValueError('The gpx file must contain at least one track!')
+
+
+def gpx_iter_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Incrementally read the points of the first track of a (possibly
+    compressed) gpx file. Parsed xml elements are freed immediately, so memory
+    usage does not depend on the file size.
+    :param path: path of the gpx file or its contents as bytes
+    :param chunk_size: maximum number of points per yielded chunk
+    :return: iterable of Track instances, each with elevation and time columns
+    that are NaN where the gpx file does not contain a value
+    """
+    for _, _, chunk in _iter_points(path, chunk_size, all_tracks=False):
+        yield chunk
+
+
+def gpx_read_track(path, chunk_size=CHUNK_SIZE):
+    """
+    Read the points of the first track of a (possibly compressed) gpx file
+    with gpx_iter_chunks(). Files the incremental reader can't parse are
+    passed to gpxpy as fallback.
+    :return: Track instance
+    """
+    try:
+        with stage('parse') as current:
+            track = Track.concatenate(gpx_iter_chunks(path, chunk_size))
+            current.points = len(track)
+    except ET.ParseError:
+        return gpx_extract_points(gpx_file(path))
+
+    if len(track) < 2:
+        msg = 'gpx file must have at least two points in the selected track!'
+        raise ValueError(msg)
+    return _optional_columns(track)
+
+
+def _optional_columns(track):
+    """:return: Track without its elevation and time columns if all NaN"""
+    ele = None if np.isnan(track.ele).all() else track.ele
+    time = None if np.isnan(track.time).all() else track.time
+    return Track(track.lon, track.lat, ele, time)
+
+
+def gpx_read_segments(path, chunk_size=CHUNK_SIZE):
+    """
+    Read the points of all tracks of a (possibly compressed) gpx file,
+    segment by segment. Like gpx_read_track(), gpxpy is used as fallback.
+    :return: list with a list of Track instances (one per segment) per track
+    """
+    try:
+        with stage('parse') as current:
+            chunks = []
+            for track, segment, chunk in _iter_points(path, chunk_size, True):
+                while len(chunks) <= track:
+                    chunks.append([])
+                while len(chunks[track]) <= segment:
+                    chunks[track].append([])
+                chunks[track][segment].append(chunk)
+            tracks = [[_optional_columns(Track.concatenate(segment))
+                       for segment in track] for track in chunks]
+            current.points = sum(len(s) for track in tracks for s in track)
+    except ET.ParseError:
+        return gpx_extract_segments(gpx_file(path))
+    return tracks
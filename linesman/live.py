@@ -0,0 +1,260 @@
+import argparse
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from .accumulator import DeviationBlock
+from .engine import DEFAULT_ENGINE, engines, get_engine
+from .geometry import Line
+from .measure import available_measures, required_accumulators, \
+    QuantileDeviation
+from .output import abort
+from .gpx import _local_name
+from .parse import latlon_pair_str, nmea_position, readable_file
+from .resample import resample as resample_track, DEFAULT_SPACING
+
+# measures evaluated by default: quantiles take time linear in the number of
+# points on each read of the results
+DEFAULT_MEASURES = {name: m for name, m in available_measures.items()
+                    if not issubclass(m, QuantileDeviation)}
+
+class LiveEvaluation:
+    """
+    Measures of a growing track, e.g. while a straight line attempt is
+    underway. The reference line is fixed on creation. Appending a point
+    projects only this point and updates the accumulators of the measures in
+    constant time; reading the results doesn't touch the points (except for
+    quantiles) and is cached until the next point is added.
+    """
+    def __init__(self, refline: Line, measures=None, resample=True,
+                 spacing=DEFAULT_SPACING, engine=DEFAULT_ENGINE):
+        """
+        :param refline: line to compare the points to
+        :param measures: iterable of Measure classes, defaults to the
+        DEFAULT_MEASURES
+        :param resample: see measure.Measure
+        :param spacing: see measure.Measure
+        :param engine: see measure.Measure
+        """
+        if resample and spacing <= 0:
+            raise ValueError('Resampling spacing must be positive!')
+        self.measures = list(measures or DEFAULT_MEASURES.values())
+        self.spacing = spacing if resample else None
+        self.count = 0
+
+        self._project = get_engine(engine).projector(refline)
+        self._acc = {cls: cls()
+                     for cls in required_accumulators(self.measures)}
+        self._sampled = [a for a in self._acc.values()
+                         if self.spacing and a.sampled]
+        self._recorded = [a for a in self._acc.values()
+                          if not (self.spacing and a.sampled)]
+        self._last = None  # last point in the meter grid
+        self._results = None  # cached results, None once outdated
+
+    def append(self, lon, lat):
+        """Add a single (lon, lat) point to the track."""
+        self._update(*self._project([lon], [lat]))
+
+    def extend(self, lon, lat):
+        """Add arrays of (lon, lat) points to the track."""
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        if not len(lon):
+            return
+        self._update(*self._project(lon, lat))
+
+    def _update(self, x, y):
+        self.count += len(y)
+        self._results = None
+        block = DeviationBlock(y)
+        for a in self._recorded:
+            a.update(block)
+        if self._sampled:
+            # continue with the segment from the previous point
+            if self._last is not None:
+                x = np.concatenate(([self._last[0]], x))
+                y = np.concatenate(([self._last[1]], y))
+            block = DeviationBlock(resample_track(x, y, self.spacing)[1])
+            for a in self._sampled:
+                a.update(block)
+        self._last = (x[-1], y[-1])
+
+    @property
+    def results(self):
+        """:return: dict of Measure class to its current result"""
+        if self._results is None:
+            self._results = {m: m.from_accumulators(self._acc)
+                             for m in self.measures}
+        return dict(self._results)
+
+
+def _tail(path, poll_interval=1.0, idle_timeout=None):
+    """
+    Read a file that is still being written.
+    :param poll_interval: seconds to wait for new data at the end of the file
+    :param idle_timeout: stop after this many seconds without new data, follow
+    the file forever if None
+    :return: iterable of newly appended data (bytes)
+    """
+    with open(path, 'rb') as f:
+        idle = 0
+        while True:
+            data = f.read()
+            if data:
+                idle = 0
+                yield data
+                continue
+            if idle_timeout is not None and idle >= idle_timeout:
+                return
+            time.sleep(poll_interval)
+            idle += poll_interval
+
+
+def _follow_gpx(chunks):
+    """:return: iterable of (lon, lat) arrays of new gpx track points"""
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    stack = []
+    for data in chunks:
+        parser.feed(data)
+        lon, lat = [], []
+        for event, elem in parser.read_events():
+            if event == 'start':
+                stack.append(elem)
+                continue
+            stack.pop()
+            if _local_name(elem.tag) == 'trkpt':
+                try:
+                    lon.append(float(elem.get('lon')))
+                    lat.append(float(elem.get('lat')))
+                except (TypeError, ValueError):
+                    raise ValueError('gpx track point without valid lat/lon '
+                                     'attributes!')
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+        if lon:
+            yield np.array(lon), np.array(lat)
+
+
+def _follow_nmea(chunks):
+    """:return: iterable of (lon, lat) arrays of new NMEA GGA/RMC positions"""
+    rest = b''
+    for data in chunks:
+        lines = (rest + data).split(b'\n')
+        rest = lines.pop()  # incomplete line
+        positions = [nmea_position(line.decode('ascii', 'replace'))
+                     for line in lines]
+        positions = [p for p in positions if p is not None]
+        if positions:
+            yield (np.array([p.x for p in positions]),
+                   np.array([p.y for p in positions]))
+
+
+followers = {
+    'gpx': _follow_gpx,
+    'nmea': _follow_nmea,
+}
+
+
+def follow(path, file_format=None, poll_interval=1.0, idle_timeout=None):
+    """
+    Follow a growing gpx or NMEA file, e.g. written by a GPS logger.
+    :param file_format: 'gpx' or 'nmea', guessed from the file extension if
+    None ('.gpx' is gpx, anything else NMEA)
+    :param poll_interval: see _tail()
+    :param idle_timeout: see _tail()
+    :return: iterable of (lon, lat) arrays with the newly appended points
+    """
+    if file_format is None:
+        is_gpx = os.path.splitext(path)[1].lower() == '.gpx'
+        file_format = 'gpx' if is_gpx else 'nmea'
+    chunks = _tail(path, poll_interval, idle_timeout)
+    return followers[file_format](chunks)
+
+
+def _argparser():
+    """:return: argument parser for the live subcommand"""
+    parser = argparse.ArgumentParser(
+        prog='linesman live',
+        description='Follow a gpx or NMEA file written by a GPS logger and '
+                    'print the measures whenever new points arrive.'
+    )
+    parser.add_argument(
+        'file', type=readable_file,
+        help='growing gpx or NMEA (GGA/RMC sentences) file'
+    )
+    parser.add_argument(
+        '--line', type=latlon_pair_str, required=True,
+        help="Reference line in format 'lat,lon;lat,lon'."
+    )
+    parser.add_argument(
+        '-m', '--measure', action='append', choices=available_measures.keys(),
+        help='Quality measure to calculate, may be given multiple times. '
+             'Default: all measures except the quantiles (P50-P99).'
+    )
+    parser.add_argument(
+        '--format', dest='file_format', choices=followers.keys(),
+        help="File format. Default: 'gpx' for .gpx files, otherwise 'nmea'."
+    )
+    parser.add_argument(
+        '--spacing', type=float, default=DEFAULT_SPACING,
+        help='Distance in meters between the equidistant points on the '
+             f'reference line. Default: {DEFAULT_SPACING:g}.'
+    )
+    parser.add_argument(
+        '--no-resample', dest='resample', action='store_false',
+        help='Compare the recorded points instead of a resampled track.'
+    )
+    parser.add_argument(
+        '--engine', choices=sorted(engines), default=DEFAULT_ENGINE,
+        help="Transformation of the track: 'exact' (default) or 'fast' "
+             "(spherical approximation)."
+    )
+    parser.add_argument(
+        '--poll', type=float, default=1.0,
+        help='Seconds between checks for new data. Default: 1.'
+    )
+    parser.add_argument(
+        '--idle-timeout', type=float,
+        help='Stop after this many seconds without new data. Default: follow '
+             'the file until interrupted.'
+    )
+    return parser
+
+
+def run(argv=None, out=None):
+    """
+    Run the live subcommand.
+    :param argv: command line arguments, defaults to sys.argv[1:]
+    :param out: text stream results are written to, defaults to sys.stdout
+    :return: exit status
+    """
+    parser = _argparser()
+    args = parser.parse_args(argv)
+    if args.spacing <= 0:
+        parser.error('--spacing must be positive')
+    out = out or sys.stdout
+    names = args.measure or list(DEFAULT_MEASURES.keys())
+    evaluation = LiveEvaluation(
+        args.line, [available_measures[name] for name in names],
+        args.resample, args.spacing, args.engine
+    )
+
+    try:
+        for lon, lat in follow(args.file, args.file_format, args.poll,
+                               args.idle_timeout):
+            evaluation.extend(lon, lat)
+            results = evaluation.results
+            values = ', '.join(f'{name} {results[available_measures[name]]}'
+                               for name in names)
+            out.write(f'{evaluation.count} points: {values}\n')
+            out.flush()
+    except KeyboardInterrupt:
+        pass
+    except (ValueError, ET.ParseError) as e:
+        abort(str(e))
+    return 0
@@ -1,68 +1,173 @@
-from .geo import mercator_project, azimuth
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import math
+import time
+
+from .accumulator import DeviationBlock, CountAccumulator, MaxAccumulator, \
+    SumAccumulator, SquareSumAccumulator, QuantileSketch
+from .engine import DEFAULT_ENGINE, get_engine
 from .geometry import Vector, Line
+from .resample import resample as resample_track, DEFAULT_SPACING
+from .simplify import simplify as simplify_track, SimplifyStats
+from .timing import stage
+from .track import Track, as_track
+
+# number of deviations passed to the accumulators at once
+BLOCK_SIZE = 2**16
+
+
+def accumulate(x, y, accumulators, spacing=None, block_size=BLOCK_SIZE,
+               stop=None):
+    """
+    Feed the deviations to all accumulators in a single pass. The track is
+    processed in blocks of points, each block is handed to every accumulator
+    while it is still in cache.
+    :param x: numpy array of positions along the reference line
+    :param y: numpy array of deviations
+    :param accumulators: iterable of Accumulator classes
+    :param spacing: if given, accumulators with `sampled` set are updated with
+    the track resampled at this spacing (see resample.resample()) instead of
+    the recorded points
+    :param block_size: number of recorded points per block
+    :param stop: number of points to accumulate, defaults to all. A point
+    after them only completes the segment from the last accumulated point,
+    which allows accumulating a track in chunks.
+    :return: dict of Accumulator class to updated instance
+    """
+    acc = {cls: cls() for cls in accumulators}
+    sampled = [a for a in acc.values() if spacing and a.sampled]
+    recorded = [a for a in acc.values() if not (spacing and a.sampled)]
+    stop = len(y) if stop is None else stop
+    with stage('accumulate', stop):
+        for start in range(0, stop, block_size):
+            end = min(start + block_size, stop)
+            if recorded:
+                block = DeviationBlock(y[start:end])
+                for a in recorded:
+                    a.update(block)
+            if sampled:
+                # the segment from the block's last to the next block's first
+                # point belongs to this block
+                block = DeviationBlock(resample_track(
+                    x[start:end + 1], y[start:end + 1], spacing)[1])
+                for a in sampled:
+                    a.update(block)
+    return acc
+
+
+def _average(total, count):
+    """:return: total/count, NaN if count is zero"""
+    return total/count if count else math.nan
 
 
 class Measure:
     """
     Abstract base class for measuring a sequence of points to a reference line.
+    Measures are calculated from mergeable accumulators: a measure lists the
+    Accumulator classes it needs in `accumulators` and combines their values
+    in from_accumulators(). This allows calculating several measures in one
+    pass over the deviations, see calculate_measures().
     """
     desc = None  # description of the value aggregated by this measure
+    accumulators = ()  # Accumulator classes required by from_accumulators()
 
-    def __init__(self, points: [Vector], refline: Line, resample=True):
+    def __init__(self, points: Track, refline: Line, resample=True,
+                 spacing=DEFAULT_SPACING, engine=DEFAULT_ENGINE,
+                 simplify=None):
         """
-        :param points: list of Vector(lon,lat) instances representing the gps
-        track
+        :param points: Track instance (or list of Vector(lon,lat) instances)
+        representing the gps track
         :param refline: line to compare the points to
         :param resample: Whether to resample the recorded track from equidistant
         points on the reference line (default). If False, the recorded track
         points are compared to their projections on the reference line.
+        :param spacing: distance of the equidistant points in meters
+        :param engine: engine.Engine instance or name transforming the points,
+        see engine.engines
+        :param simplify: if given, tolerance in meters the transformed track
+        is simplified with (see simplify.simplify()), which requires
+        resampling. The maximum deviation is unchanged, the average deviation
+        changes by at most the tolerance.
         """
+        if resample and spacing <= 0:
+            raise ValueError('Resampling spacing must be positive!')
+        if simplify and not resample:
+            raise ValueError('Simplifying the track requires resampling!')
         self.resample = resample
+        self.spacing = spacing
+        self.engine = get_engine(engine)
 
-        self.points = list(self._to_meter_grid(points, refline))
+        self.x, self.y = self._to_meter_grid(as_track(points), refline)
+        # SimplifyStats if the track was simplified
+        self.simplified = None
+        if simplify:
+            start = time.perf_counter()
+            keep = simplify_track(self.x, self.y, simplify)
+            self.simplified = SimplifyStats(len(self.x), len(keep),
+                                            time.perf_counter() - start)
+            self.x, self.y = self.x[keep], self.y[keep]
 
-    def _to_meter_grid(self, points: [Vector], refline: Line):
+    def _to_meter_grid(self, points: Track, refline: Line):
         """
         Transform the given (lon, lat) points such that the reference line is
         on the x axis and the y coordinate of a point being its shortest
         distance from the reference line. The unit of the resulting cartesian
         grid is 1 Meter.
         After this transformation, each point's deviation is its y coordinate.
-        :param points: iterable of (lon, lat) Vector instances to transform
+        :param points: Track instance to transform
         :param refline: Line instance that becomes the new x axis
-        :return: iterable of transformed points
+        :return: tuple (x, y) of numpy arrays with the transformed points
         """
-        start = refline.point(0)
-        end = refline.point(1)
-        return mercator_project(start, azimuth(start, end), points)
+        return self.engine.project(refline, points.lon, points.lat)
+
+    def accumulate(self, accumulators):
+        """
+        :param accumulators: iterable of Accumulator classes
+        :return: dict of Accumulator class to instance updated with the
+        deviations of the track
+        """
+        spacing = self.spacing if self.resample else None
+        return accumulate(self.x, self.y, accumulators, spacing)
+
+    @classmethod
+    def from_accumulators(cls, acc):
+        """
+        :param acc: dict of Accumulator class to instance, containing at least
+        the classes listed in `accumulators`
+        :return: result of the measure
+        """
+        raise NotImplementedError()
 
     def calculate(self):
         """
         :return: result of the measure (e.g. maximum or an average)
         """
-        raise NotImplementedError()
+        return self.from_accumulators(self.accumulate(self.accumulators))
 
 
 class AbsoluteDeviationMeasure(Measure):
     """Deviation measure considering the absolute deviation."""
-    def _absolute_deviations(self):
-        return [abs(p.y) for p in self.points]
 
 
 class MaxDeviation(AbsoluteDeviationMeasure):
     """Maximum deviation from the line in meters."""
     desc = 'Maximum deviation in meters'
+    accumulators = (MaxAccumulator,)
 
-    def calculate(self):
-        return max(self._absolute_deviations())
+    @classmethod
+    def from_accumulators(cls, acc):
+        return acc[MaxAccumulator].value
 
 
 class AvgDeviation(AbsoluteDeviationMeasure):
     """Average deviation from the line in meters."""
     desc = 'Average deviation in meters'
+    accumulators = (SumAccumulator, CountAccumulator)
 
-    def calculate(self):
-        return sum(self._absolute_deviations())/len(self.points)
+    @classmethod
+    def from_accumulators(cls, acc):
+        return _average(acc[SumAccumulator].value,
+                        acc[CountAccumulator].value)
 
 
 class SquareDeviationAvg(Measure):
@@ -71,6 +176,173 @@ class SquareDeviationAvg(Measure):
     This measure punishes bigger distances more than small ones.
     """
     desc = 'Average squared deviation'
+    accumulators = (SquareSumAccumulator, CountAccumulator)
 
-    def calculate(self):
-        return sum([p.y**2 for p in self.points])/len(self.points)
+    @classmethod
+    def from_accumulators(cls, acc):
+        return _average(acc[SquareSumAccumulator].value,
+                        acc[CountAccumulator].value)
+
+
+class QuantileDeviation(AbsoluteDeviationMeasure):
+    """
+    Abstract base class for a quantile of the absolute deviation, which is
+    robust against single outliers (e.g. GPS glitches) unlike the maximum.
+    Quantiles are exact for up to QuantileSketch.exact_limit deviations and
+    estimated by the sketch beyond. Subclasses may list a subclass of
+    QuantileSketch with other accuracy in `accumulators`.
+    """
+    quantile = None  # quantile between 0 and 1
+    accumulators = (QuantileSketch,)
+
+    @classmethod
+    def from_accumulators(cls, acc):
+        return acc[cls.accumulators[0]].quantile(cls.quantile)
+
+
+class MedianDeviation(QuantileDeviation):
+    """Median deviation from the line in meters."""
+    desc = 'Median deviation in meters'
+    quantile = 0.5
+
+
+class P90Deviation(QuantileDeviation):
+    """90th percentile of the deviation from the line in meters."""
+    desc = '90th percentile deviation in meters'
+    quantile = 0.9
+
+
+class P95Deviation(QuantileDeviation):
+    """95th percentile of the deviation from the line in meters."""
+    desc = '95th percentile deviation in meters'
+    quantile = 0.95
+
+
+class P99Deviation(QuantileDeviation):
+    """99th percentile of the deviation from the line in meters."""
+    desc = '99th percentile deviation in meters'
+    quantile = 0.99
+
+
+class DeviationDistribution(Measure):
+    """
+    Distribution of the absolute deviations, as QuantileSketch instance
+    answering quantile and histogram queries.
+    """
+    desc = 'Deviation distribution'
+    accumulators = (QuantileSketch,)
+
+    @classmethod
+    def from_accumulators(cls, acc):
+        return acc[QuantileSketch]
+
+
+available_measures = {
+    'MAX': MaxDeviation,
+    'AVG': AvgDeviation,
+    'SQ-AVG': SquareDeviationAvg,
+    'P50': MedianDeviation,
+    'P90': P90Deviation,
+    'P95': P95Deviation,
+    'P99': P99Deviation,
+}
+
+
+def required_accumulators(measures):
+    """
+    :param measures: iterable of Measure classes
+    :return: list of the Accumulator classes needed by any of the measures,
+    each listed once
+    """
+    required = []
+    for measure in measures:
+        for cls in measure.accumulators:
+            if cls not in required:
+                required.append(cls)
+    return required
+
+
+def calculate_measures(points: Track, refline: Line, measures, resample=True,
+                       spacing=DEFAULT_SPACING, engine=DEFAULT_ENGINE,
+                       simplify=None):
+    """
+    Calculate several measures with a single projection of the track and a
+    single pass over its deviations.
+    :param points: Track instance (or list of Vector(lon,lat) instances)
+    :param refline: line to compare the points to
+    :param measures: iterable of Measure classes
+    :param resample: see Measure
+    :param spacing: see Measure
+    :param engine: see Measure
+    :param simplify: see Measure
+    :return: dict of Measure class to result
+    """
+    measures = list(measures)
+    grid = Measure(points, refline, resample, spacing, engine, simplify)
+    acc = grid.accumulate(required_accumulators(measures))
+    return {measure: measure.from_accumulators(acc) for measure in measures}
+
+
+# results of evaluate_segments(): list (per track) of lists of per-segment
+# results, list of per-track results and the results of all tracks, each
+# result being a dict of Measure class to value
+SegmentResults = namedtuple('SegmentResults', 'segments tracks total')
+
+
+def _merged(accumulators, parts):
+    """
+    :param accumulators: Accumulator classes to merge
+    :param parts: iterable of dicts of Accumulator class to instance
+    :return: dict of Accumulator class to instance aggregating all parts
+    """
+    merged = {cls: cls() for cls in accumulators}
+    for acc in parts:
+        for cls, a in merged.items():
+            a.merge(acc[cls])
+    return merged
+
+
+def evaluate_segments(tracks, refline: Line, measures, resample=True,
+                      spacing=DEFAULT_SPACING, workers=None,
+                      engine=DEFAULT_ENGINE):
+    """
+    Evaluate every segment of several tracks against the same reference line.
+    Segments are projected and accumulated concurrently in a thread pool
+    (proj and numpy release the GIL). Results of whole tracks and of all
+    tracks are calculated by merging the accumulators of their segments, the
+    gaps between segments are not part of any result.
+    :param tracks: list of tracks, each given as list of Track instances
+    (one per segment)
+    :param refline: line to compare the points to
+    :param measures: iterable of Measure classes
+    :param resample: see Measure
+    :param spacing: see Measure
+    :param workers: maximum number of threads, see ThreadPoolExecutor
+    :param engine: see Measure
+    :return: SegmentResults instance
+    """
+    measures = list(measures)
+    required = required_accumulators(measures)
+    engine = get_engine(engine)
+
+    def segment_accumulators(points):
+        grid = Measure(points, refline, resample, spacing, engine)
+        return grid.accumulate(required)
+
+    def results(acc):
+        return {measure: measure.from_accumulators(acc)
+                for measure in measures}
+
+    with ThreadPoolExecutor(workers) as pool:
+        flat = list(pool.map(segment_accumulators,
+                             [segment for track in tracks for segment in track]))
+    per_track, start = [], 0
+    for track in tracks:
+        per_track.append(flat[start:start + len(track)])
+        start += len(track)
+
+    return SegmentResults(
+        [[results(acc) for acc in track] for track in per_track],
+        [results(_merged(required, track)) for track in per_track],
+        results(_merged(required, flat)),
+    )
@@ -1,10 +1,77 @@
+from contextlib import contextmanager
+import csv
+import json
 import sys
 
+# whether warnings are printed to stderr instead of stdout
+_warnings_to_stderr = False
+
 
 def warn(msg):
-    print('Warning: ' + msg, file=sys.stdout)
+    stream = sys.stderr if _warnings_to_stderr else sys.stdout
+    print('Warning: ' + msg, file=stream)
 
 
 def abort(msg):
     print('ERROR: ' + msg, file=sys.stderr)
     raise SystemExit(1)
+
+
+def warnings_to_stderr():
+    """
+    Print warnings to stderr from now on, e.g. in worker processes of a
+    subcommand writing its results to stdout.
+    """
+    global _warnings_to_stderr
+    _warnings_to_stderr = True
+
+
+@contextmanager
+def warnings_on_stderr():
+    """
+    Print warnings to stderr within the context, for subcommands writing their
+    results to stdout. Can be used as decorator, too.
+    """
+    global _warnings_to_stderr
+    previous, _warnings_to_stderr = _warnings_to_stderr, True
+    try:
+        yield
+    finally:
+        _warnings_to_stderr = previous
+
+
+class CsvWriter:
+    """Writes rows (dicts of column to value) as CSV with a header line."""
+    def __init__(self, out, columns):
+        """
+        :param out: text stream
+        :param columns: names of the columns, missing values are empty
+        """
+        self._writer = csv.DictWriter(out, columns)
+        self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+
+class JsonLinesWriter:
+    """Writes rows (dicts of column to value) as one JSON object per line."""
+    def __init__(self, out, columns):
+        """
+        :param out: text stream
+        :param columns: names of the columns (unused, rows are written with
+        the columns they have)
+        """
+        self._out = out
+
+    def write(self, row):
+        # NaN is no valid JSON
+        row = {k: None if v != v else v for k, v in row.items()}
+        self._out.write(json.dumps(row) + '\n')
+
+
+# output formats of subcommands writing one row per result
+writers = {
+    'csv': CsvWriter,
+    'jsonl': JsonLinesWriter,
+}
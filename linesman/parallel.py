@@ -0,0 +1,131 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import math
+import os
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # python < 3.8
+    shared_memory = None
+
+import numpy as np
+
+from .engine import DEFAULT_ENGINE, get_engine
+from .geometry import Line
+from .measure import BLOCK_SIZE, accumulate, required_accumulators, _merged
+from .resample import DEFAULT_SPACING
+from .timing import stage
+from .track import Track, as_track
+
+# number of chunks per worker process, more chunks balance the load better
+CHUNKS_PER_WORKER = 4
+
+
+def chunk_bounds(n, chunks, block_size=BLOCK_SIZE):
+    """
+    Split n points into about `chunks` chunks of whole blocks, such that
+    every chunk is accumulated in the same blocks as the whole track.
+    :return: list of tuples (start, stop)
+    """
+    blocks = math.ceil(n/block_size)
+    size = max(math.ceil(blocks/max(chunks, 1)), 1)*block_size
+    return [(start, min(start + size, n)) for start in range(0, n, size)]
+
+
+def _accumulate_chunk(name, n, bounds, refline, accumulators, spacing,
+                      engine):
+    """
+    Worker process entry point: project the chunk's points (and the next
+    point, completing the chunk's last segment) from shared memory and
+    accumulate their deviations.
+    :return: dict of Accumulator class to instance
+    """
+    start, stop = bounds
+    shm = shared_memory.SharedMemory(name)
+    try:
+        coordinates = np.ndarray((2, n), np.float64, shm.buf)
+        end = min(stop + 1, n)
+        x, y = engine.project(refline, coordinates[0, start:end],
+                              coordinates[1, start:end])
+        del coordinates  # the buffer can't be closed while viewed
+        return accumulate(x, y, accumulators, spacing, stop=stop - start)
+    finally:
+        shm.close()
+
+
+def _accumulate_copy(lon, lat, stop, refline, accumulators, spacing, engine):
+    """
+    Worker process entry point without shared memory (python < 3.8): project
+    the chunk's points (and the next point) sent to the worker and accumulate
+    the deviations of the first `stop` points.
+    :return: dict of Accumulator class to instance
+    """
+    x, y = engine.project(refline, lon, lat)
+    return accumulate(x, y, accumulators, spacing, stop=stop)
+
+
+def _map_chunks(n, workers, chunks, function, *iterables):
+    """:return: list of the results of function for every chunk, computed in
+    a pool of worker processes"""
+    with stage('parallel', n), \
+            ProcessPoolExecutor(min(workers, len(chunks) or 1)) as pool:
+        return list(pool.map(function, *iterables))
+
+
+def parallel_measures(points: Track, refline: Line, measures, resample=True,
+                      spacing=DEFAULT_SPACING, engine=DEFAULT_ENGINE,
+                      workers=None):
+    """
+    Calculate several measures like measure.calculate_measures(), projecting
+    and accumulating chunks of the track in a pool of worker processes. The
+    coordinates are copied to shared memory once, workers read their chunks
+    from there (python < 3.8 has no shared memory, every chunk is sent to its
+    worker instead), only the partial accumulators are sent back and merged.
+    Chunks consist of whole blocks (see measure.accumulate()) and the
+    accumulators are merged without rounding errors, so the results equal
+    the results of calculate_measures() exactly.
+    :param points: Track instance (or list of Vector(lon,lat) instances)
+    :param refline: line to compare the points to
+    :param measures: iterable of Measure classes
+    :param resample: see measure.Measure
+    :param spacing: see measure.Measure
+    :param engine: see measure.Measure
+    :param workers: number of worker processes, defaults to the number of
+    CPUs
+    :return: dict of Measure class to result
+    """
+    if resample and spacing <= 0:
+        raise ValueError('Resampling spacing must be positive!')
+    measures = list(measures)
+    required = required_accumulators(measures)
+    engine = get_engine(engine)
+    points = as_track(points)
+    n = len(points)
+    workers = max(workers or os.cpu_count() or 1, 1)
+    chunks = chunk_bounds(n, workers*CHUNKS_PER_WORKER)
+    settings = (repeat(refline), repeat(required),
+                repeat(spacing if resample else None), repeat(engine))
+
+    if shared_memory is None:
+        parts = _map_chunks(
+            n, workers, chunks, _accumulate_copy,
+            [points.lon[start:stop + 1] for start, stop in chunks],
+            [points.lat[start:stop + 1] for start, stop in chunks],
+            [stop - start for start, stop in chunks], *settings
+        )
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=max(16*n, 1))
+        try:
+            with stage('shared memory', n):
+                coordinates = np.ndarray((2, n), np.float64, shm.buf)
+                coordinates[0] = points.lon
+                coordinates[1] = points.lat
+                del coordinates
+            parts = _map_chunks(n, workers, chunks, _accumulate_chunk,
+                                repeat(shm.name), repeat(n), chunks,
+                                *settings)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    acc = _merged(required, parts)
+    return {measure: measure.from_accumulators(acc) for measure in measures}
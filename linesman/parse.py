@@ -1,9 +1,16 @@
 import argparse
-
-import gpxpy
+import bz2
+import gzip
+import io
+import lzma
+import math
+import zlib
 
 from .geometry import Vector, Line
-from .output import warn
+
+# gpx functions formerly defined in this module, see __getattr__()
+_GPX_NAMES = ('gpx_file', 'gpx_extract_points', 'gpx_iter_chunks',
+              'gpx_read_track')
 
 
 def latlon_str(string):
@@ -31,32 +38,212 @@ def latlon_pair_str(string):
     return Line(latlon_str(start), latlon_str(end))
 
 
-def gpx_file(path):
-    """:return: contents of gpx file parsed with gpxpy"""
-    file_tester = argparse.FileType('r')
-    gpxfile = file_tester(path)
-    return gpxpy.parse(gpxfile)
+# compression formats detected by the leading magic bytes of a file
+COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+)
+
+
+# errors raised while reading corrupt or truncated compressed files
+DECOMPRESSION_ERRORS = (EOFError, OSError, lzma.LZMAError, zlib.error)
+
+
+class _DecompressedFile:
+    """
+    Decompressed file object. Used as context manager, it closes the file on
+    exit and turns errors of corrupt or truncated compressed files into
+    ValueError.
+    """
+    def __init__(self, f):
+        self._f = f
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, e, traceback):
+        self._f.close()
+        if isinstance(e, DECOMPRESSION_ERRORS):
+            raise ValueError(f'Corrupt compressed file: {e}') from e
+
+
+def open_track_file(path):
+    """
+    Open a file for binary reading. gzip, bzip2 and xz compressed files (e.g.
+    .gpx.gz, .gpx.bz2, .gpx.xz) are decompressed transparently, errors of
+    corrupt compressed files are raised as ValueError when the file is used
+    as context manager.
+    :param path: path of the file, or its contents as bytes (e.g. an upload)
+    :return: binary file object
+    """
+    f = io.BytesIO(path) if isinstance(path, bytes) else open(path, 'rb')
+    magic = f.read(6)
+    for prefix, opener in COMPRESSION_MAGIC:
+        if magic.startswith(prefix):
+            if isinstance(path, bytes):
+                f.seek(0)
+            else:
+                # the opener opens the file itself and closes it with the
+                # decompressed file
+                f.close()
+                f = path
+            return _DecompressedFile(opener(f))
+    f.seek(0)
+    return f
+
+
+def read_decompressed(data, max_size):
+    """
+    Decompress the contents of a (possibly compressed) file, reading at most
+    max_size decompressed bytes (e.g. against compression bombs).
+    :param data: contents of the file as bytes
+    :param max_size: maximum size of the decompressed contents in bytes
+    :return: decompressed contents as bytes
+    :raise ValueError: if the decompressed contents exceed max_size, are
+    compressed again or the compressed data is corrupt
+    """
+    with open_track_file(data) as f:
+        contents = f.read(max_size + 1)
+    if len(contents) > max_size:
+        raise ValueError(f'Decompressed file exceeds {max_size} bytes!')
+    if any(contents.startswith(prefix) for prefix, _ in COMPRESSION_MAGIC):
+        raise ValueError('Nested compression is not supported!')
+    return contents
+
+
+def readable_file(path):
+    """:return: path if it can be opened for reading (argparse type)"""
+    try:
+        open(path, 'rb').close()
+    except OSError as e:
+        raise argparse.ArgumentTypeError(f"can't open '{path}': {e}")
+    return path
+
+
+def _track_reader(path):
+    """:return: function reading the first track of a gpx, FIT, NMEA or
+    GeoJSON file, chosen by formats.detect_format()"""
+    from . import formats
+
+    file_format = formats.detect_format(path)
+    if file_format == 'gpx':
+        from .gpx import gpx_read_track
+        return gpx_read_track
+    return lambda path: formats.read_track(path, file_format)
+
+
+def read_track(path, cache=None):
+    """
+    Read a track from a file in any supported format: the binary linesman
+    track format (see trackfile) or a (compressed) gpx, FIT, NMEA or GeoJSON
+    file (see formats).
+    :param path: path of the track file, or the contents of a file in any
+    format but the binary one as bytes
+    :param cache: optional cache.TrackCache for files in the other formats
+    :return: track.Track instance
+    """
+    from . import trackfile
+
+    if not isinstance(path, bytes) and trackfile.is_track_file(path):
+        return trackfile.read_track_file(path)
+    reader = _track_reader(path)
+    if cache is not None:
+        return cache.read(path, reader)
+    return reader(path)
 
 
-def gpx_extract_points(gpx_obj):
+def read_segments(path):
     """
-    Extract the points of the first track of a gpx file.
-    :return: list of lon,lat-Vector instances
+    Read all tracks of a file segment by segment. Binary track, FIT and NMEA
+    files contain a single track with a single segment.
+    :param path: path of the track file
+    :return: list with a list of track.Track instances (one per segment) per
+    track
     """
-    tracks = len(gpx_obj.tracks)
-    if tracks < 1:
-        raise ValueError('The gpx file must contain at least one track!')
-    elif tracks > 1:
-        warn('gpx file has multiple tracks, defaulting to first one.')
+    from . import formats, trackfile
+
+    if trackfile.is_track_file(path):
+        return [[trackfile.read_track_file(path)]]
+    file_format = formats.detect_format(path)
+    if file_format == 'gpx':
+        from .gpx import gpx_read_segments
+        return gpx_read_segments(path)
+    return formats.read_segments(path, file_format)
 
-    points = []
-    track = gpx_obj.tracks[0]
-    for segment in track.segments:
-        for actual in segment.points:
-            points.append(Vector(actual.longitude, actual.latitude))
 
-    if len(points) < 2:
-        msg = 'gpx file must have at least two points in the selected track!'
-        raise ValueError(msg)
+def _nmea_angle(value, hemisphere):
+    """:return: decimal degrees of a NMEA (d)ddmm.mmmm angle"""
+    degrees, minutes = divmod(float(value), 100)
+    angle = degrees + minutes/60
+    return -angle if hemisphere in ('S', 'W') else angle
 
-    return points
+
+def nmea_fix(fields):
+    """
+    Extract the fix of a NMEA 0183 GGA or RMC sentence.
+    :param fields: list of the fields of the sentence, without '$' and
+    checksum
+    :return: tuple (lon, lat, altitude, date) with the altitude in meters
+    (NaN for RMC sentences or if missing) and the ddmmyy date field ('' for
+    GGA sentences), None if the sentence has no valid position (other
+    sentence types or no fix)
+    :raise ValueError: if a number is malformed
+    """
+    kind = fields[0][2:]
+    if kind == 'GGA' and len(fields) > 6 and fields[6] not in ('', '0'):
+        lat, ns, lon, ew = fields[2:6]
+        altitude = float(fields[9]) if len(fields) > 9 and fields[9] \
+            else math.nan
+        date = ''
+    elif kind == 'RMC' and len(fields) > 6 and fields[2] == 'A':
+        lat, ns, lon, ew = fields[3:7]
+        altitude, date = math.nan, fields[9] if len(fields) > 9 else ''
+    else:
+        return None
+    return _nmea_angle(lon, ew), _nmea_angle(lat, ns), altitude, date
+
+
+def nmea_position(sentence):
+    """
+    Extract the position of a NMEA 0183 GGA or RMC sentence.
+    :param sentence: single NMEA sentence, e.g. '$GPGGA,...*47'
+    :return: Vector(lon, lat) or None if the sentence has no valid position
+    (other sentence types, invalid checksum or no fix)
+    """
+    sentence = sentence.strip()
+    if not sentence.startswith('$'):
+        return None
+    data, _, checksum = sentence[1:].partition('*')
+    if checksum:
+        expected = 0
+        for char in data.encode('ascii', 'replace'):
+            expected ^= char
+        try:
+            if int(checksum[:2], 16) != expected:
+                return None
+        except ValueError:
+            return None
+
+    try:
+        fix = nmea_fix(data.split(','))
+    except ValueError:
+        return None
+    return None if fix is None else Vector(fix[0], fix[1])
+
+
+def __getattr__(name):
+    """
+    Provide the gpx functions that moved to linesman.gpx without importing
+    gpxpy and numpy on import of this module.
+    """
+    if name in _GPX_NAMES:
+        from . import gpx
+        return getattr(gpx, name)
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -0,0 +1,240 @@
+import argparse
+from collections import deque, namedtuple
+import math
+import sys
+import xml.etree.ElementTree as ET
+
+from gpxpy.gpx import GPXException
+import numpy as np
+
+from .engine import DEFAULT_ENGINE, engines
+from .geometry import Line
+from .measure import Measure
+from .output import abort, warnings_on_stderr, writers
+from .parse import latlon_pair_str, read_track, readable_file
+from .resample import resample as resample_track, DEFAULT_SPACING
+from .timing import stage
+
+# sliding window statistics of deviation_profile(): numpy arrays with the
+# start and end (in meters along the reference line), the maximum absolute
+# deviation, the mean absolute deviation, the root mean square deviation and
+# the number of deviations of every window
+Profile = namedtuple('Profile', 'start end max mean rms count')
+
+COLUMNS = Profile._fields
+
+# positions closer than this to a bin edge (in meters) are counted in the bin
+# starting there, e.g. the start of a track on the reference line, which is
+# projected slightly before it by rounding
+EDGE_TOLERANCE = 1e-3
+
+
+def rolling_max(values, window):
+    """
+    Maximum of every window of consecutive values, in O(n) with a monotonic
+    deque holding the indices of decreasing values of the current window.
+    :param values: numpy array, NaN values are ignored
+    :param window: number of values per window
+    :return: numpy array of len(values) - window + 1 maxima, NaN for windows
+    of NaN values only
+    """
+    values = np.where(np.isnan(values), -math.inf, values).tolist()
+    maxima = []
+    candidates = deque()
+    for i, value in enumerate(values):
+        while candidates and values[candidates[-1]] <= value:
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        if i >= window - 1:
+            maxima.append(values[candidates[0]])
+    maxima = np.array(maxima, dtype=np.float64)
+    maxima[maxima == -math.inf] = np.nan
+    return maxima
+
+
+def _rolling_sum(values, window):
+    """:return: sum of every window of consecutive values, by prefix sums"""
+    prefix = np.concatenate(([0], np.cumsum(values)))
+    return prefix[window:] - prefix[:-window]
+
+
+def _bin_index(x, step):
+    """:return: numpy array of the index of the bin of every position"""
+    q = x/step
+    edges = np.round(q)
+    return np.where(np.abs(q - edges)*step < EDGE_TOLERANCE, edges,
+                    np.floor(q)).astype(np.int64)
+
+
+def _bin_max(bins, values, size):
+    """:return: maximum of the values per bin, NaN for empty bins"""
+    maxima = np.full(size, np.nan)
+    if not len(bins):
+        return maxima
+    if np.any(bins[1:] < bins[:-1]):  # track moves backwards
+        order = np.argsort(bins, kind='stable')
+        bins, values = bins[order], values[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+    maxima[bins[starts]] = np.maximum.reduceat(values, starts)
+    return maxima
+
+
+def deviation_profile(x, y, window, step=None, spacing=DEFAULT_SPACING):
+    """
+    Deviation statistics of sliding windows along the reference line.
+    Deviations are collected in bins of `step` meters first; window
+    statistics are calculated from the bins with prefix sums (mean, RMS) and
+    a monotonic deque (maximum), both in linear time.
+    :param x: numpy array of positions along the reference line in meters
+    :param y: numpy array of deviations in meters
+    :param window: length of the windows in meters, a multiple of step
+    :param step: distance between the starts of consecutive windows in
+    meters, defaults to the window length
+    :param spacing: if given, the mean and RMS are calculated from the track
+    resampled at this spacing (see resample.resample()). The maximum
+    considers the recorded points in any case.
+    :return: Profile of the windows from the first to the last bin with
+    deviations, or of a single window if the track is shorter than the
+    window. The first and last windows may be covered only partially by the
+    track (see the count).
+    """
+    step = step or window
+    if window <= 0 or step <= 0 or round(window/step) < 1 or \
+            not math.isclose(round(window/step)*step, window):
+        raise ValueError('The window length must be a positive multiple of '
+                         'the step!')
+    if len(x) < 1:
+        raise ValueError('The track must have at least one point!')
+
+    with stage('profile', len(x)):
+        xs, ys = resample_track(x, y, spacing) if spacing else (x, y)
+        bins, point_bins = _bin_index(xs, step), _bin_index(x, step)
+        first = int(min(point_bins.min(), bins.min() if len(bins) else 0))
+        size = int(max(point_bins.max(), bins.max() if len(bins) else 0)) \
+            - first + 1
+        bins, point_bins = bins - first, point_bins - first
+        absolute = np.abs(ys)
+        count = np.bincount(bins, minlength=size)
+        total = np.bincount(bins, absolute, minlength=size)
+        squares = np.bincount(bins, absolute*absolute, minlength=size)
+        maxima = _bin_max(point_bins, np.abs(y), size)
+        if spacing:
+            # a window may contain no recorded point close to its maximum
+            maxima = np.fmax(maxima, _bin_max(bins, absolute, size))
+
+        n = min(round(window/step), size)
+        count = _rolling_sum(count, n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = _rolling_sum(total, n)/count
+            rms = np.sqrt(_rolling_sum(squares, n)/count)
+        start = (first + np.arange(len(count)))*step
+        return Profile(start, start + n*step, rolling_max(maxima, n), mean,
+                       rms, count)
+
+
+def worst_windows(profile):
+    """
+    :return: dict of statistic ('max', 'mean' or 'rms') to the index of the
+    window where it is largest, None if it is NaN for all windows
+    """
+    worst = {}
+    for column in ('max', 'mean', 'rms'):
+        values = getattr(profile, column)
+        valid = ~np.isnan(values)
+        worst[column] = int(np.flatnonzero(valid)[
+            np.argmax(values[valid])]) if valid.any() else None
+    return worst
+
+
+def _rows(profile):
+    """:return: iterable of the windows as dicts of column to value"""
+    columns = [getattr(profile, name).tolist() for name in COLUMNS]
+    for values in zip(*columns):
+        yield dict(zip(COLUMNS, values))
+
+
+def _argparser():
+    """:return: argument parser for the profile subcommand"""
+    parser = argparse.ArgumentParser(
+        prog='linesman profile',
+        description='Print the maximum, mean and RMS deviation of sliding '
+                    'windows along the reference line. The worst windows are '
+                    'reported on stderr.'
+    )
+    parser.add_argument('gpxfile', type=readable_file,
+                        help='gpx, FIT, NMEA or GeoJSON file (or converted '
+                             'track file) to evaluate')
+    parser.add_argument(
+        '--line', type=latlon_pair_str,
+        help="Reference line in format 'lat,lon;lat,lon'. Default: Line "
+             "defined by first and last point of the track."
+    )
+    parser.add_argument(
+        '--window', type=float, default=1000,
+        help='Length of the windows in meters. Default: 1000.'
+    )
+    parser.add_argument(
+        '--step', type=float,
+        help='Distance between the starts of consecutive windows in meters, '
+             'the window length must be a multiple of it. Default: the '
+             'window length.'
+    )
+    parser.add_argument(
+        '--spacing', type=float, default=DEFAULT_SPACING,
+        help='Resampling distance in meters, see linesman --help. '
+             f'Default: {DEFAULT_SPACING:g}.'
+    )
+    parser.add_argument(
+        '--no-resample', dest='resample', action='store_false',
+        help='Calculate mean and RMS from the recorded points.'
+    )
+    parser.add_argument(
+        '--engine', choices=sorted(engines), default=DEFAULT_ENGINE,
+        help="Transformation of the track: 'exact' (default) or 'fast' "
+             "(spherical approximation)."
+    )
+    parser.add_argument(
+        '--format', choices=sorted(writers), default='csv',
+        help='Output format, one row per window. Default: csv.'
+    )
+    return parser
+
+
+@warnings_on_stderr()
+def run(argv=None, out=None):
+    """
+    Run the profile subcommand. Warnings are printed to stderr.
+    :param argv: command line arguments, defaults to sys.argv[1:]
+    :param out: text stream the windows are written to, defaults to
+    sys.stdout
+    :return: exit status
+    """
+    parser = _argparser()
+    args = parser.parse_args(argv)
+    if args.spacing <= 0:
+        parser.error('--spacing must be positive')
+    out = out or sys.stdout
+
+    try:
+        points = read_track(args.gpxfile)
+        line = args.line or Line(points[0], points[-1])
+        grid = Measure(points, line, args.resample, args.spacing,
+                       args.engine)
+        profile = deviation_profile(grid.x, grid.y, args.window, args.step,
+                                    args.spacing if args.resample else None)
+    except (ValueError, GPXException, ET.ParseError) as e:
+        abort(str(e))
+
+    writer = writers[args.format](out, COLUMNS)
+    for row in _rows(profile):
+        writer.write(row)
+    out.flush()
+
+    for column, index in worst_windows(profile).items():
+        if index is not None:
+            print(f'Worst window by {column}: {profile.start[index]:g} to '
+                  f'{profile.end[index]:g} m: {getattr(profile, column)[index]}',
+                  file=sys.stderr)
+    return 0
@@ -0,0 +1,43 @@
+# default distance in meters between resampled points on the reference line
+DEFAULT_SPACING = 1.0
+
+
+def resample(x, y, spacing=DEFAULT_SPACING):
+    """
+    Resample a track in the meter grid at equidistant positions k*spacing on
+    the x axis (the reference line). Every segment between two consecutive
+    points is sampled at all grid positions it passes, with the deviation
+    interpolated linearly. Sections where the track moves backwards (x
+    decreasing) are sampled as well, so a section passed several times is
+    represented once per pass. Segment ends are half-open, so a point on a
+    grid position is sampled only once.
+    :param x: numpy array of x coordinates (position along the reference line)
+    :param y: numpy array of y coordinates (deviations)
+    :param spacing: distance between grid positions in meters
+    :return: tuple (x, y) of numpy arrays with the positions and deviations
+    of the samples in track order
+    """
+    # imported here to keep the command line startup fast
+    import numpy as np
+
+    if spacing <= 0:
+        raise ValueError('Resampling spacing must be positive!')
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    a, b = x[:-1], x[1:]
+
+    # forwards: a <= k*spacing < b, backwards: b < k*spacing <= a
+    forward = b > a
+    first = np.where(forward, np.ceil(a/spacing), np.floor(a/spacing))
+    last = np.where(forward, np.ceil(b/spacing) - 1, np.floor(b/spacing) + 1)
+    step = np.where(forward, 1, -1)
+    counts = np.maximum((last - first)*step + 1, 0).astype(np.int64)
+    counts[a == b] = 0
+
+    segment = np.repeat(np.arange(len(a)), counts)
+    offset = np.arange(len(segment)) - np.repeat(np.cumsum(counts) - counts,
+                                                 counts)
+    xs = (first[segment] + step[segment]*offset)*spacing
+    t = (xs - a[segment])/(b[segment] - a[segment])
+    ys = y[:-1][segment] + t*(y[1:][segment] - y[:-1][segment])
+    return xs, ys
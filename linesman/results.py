@@ -0,0 +1,314 @@
+import argparse
+from collections import namedtuple
+from contextlib import contextmanager
+import os
+import sqlite3
+import time
+
+from .cache import KEY_MODES, file_identity
+from .output import abort
+from .resample import DEFAULT_SPACING
+
+# seconds to wait for a database locked by a concurrent writer
+TIMEOUT = 30
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    file TEXT NOT NULL,
+    line TEXT NOT NULL,
+    measure TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value REAL,
+    created REAL NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (file, line, measure, settings, version)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+# summary of a result store: number of stored results, of distinct files and
+# linesman versions, lookup hits and misses, database size in bytes and the
+# unix times of the least and most recently used result (None if empty)
+StoreStats = namedtuple(
+    'StoreStats', 'entries files versions hits misses size oldest newest'
+)
+
+
+def normalized_line(line):
+    """
+    :param line: Line of (lon, lat) Vector instances or None for the line
+    through the first and last point of the track
+    :return: line as 'lat,lon;lat,lon' string rounded to 9 decimals (below a
+    millimeter), empty for None
+    """
+    if line is None:
+        return ''
+    a, b = line.point(0), line.point(1)
+    return f'{a.y:.9f},{a.x:.9f};{b.y:.9f},{b.x:.9f}'
+
+
+def settings_key(resample=True, spacing=DEFAULT_SPACING, engine='exact',
+                 simplify=None):
+    """:return: string identifying the evaluation settings"""
+    if not resample:
+        return f'recorded;engine={engine}'
+    return f'spacing={float(spacing)!r};engine={engine};' \
+           f'simplify={float(simplify or 0)!r}'
+
+
+@contextmanager
+def _transaction(db):
+    """Write transaction, taking the write lock at its start."""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield db
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    db.execute('COMMIT')
+
+
+class ResultStore:
+    """
+    Persistent store of evaluation results in a SQLite database. Results are
+    keyed by the evaluated file, the reference line, the measure, the
+    evaluation settings and the linesman version. The database is used in
+    write-ahead log mode, so several processes (e.g. batch workers) can read
+    and write it concurrently.
+    """
+    def __init__(self, path, key='content'):
+        """
+        :param path: path of the database file, created if missing
+        :param key: how files are identified, see cache.TrackCache
+        """
+        if key not in KEY_MODES:
+            raise ValueError(f"Key must be one of {', '.join(KEY_MODES)}!")
+        self.path = path
+        self.key_mode = key
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        # connections can't be shared with other processes
+        state = self.__dict__.copy()
+        state['_connection'] = state['_pid'] = None
+        return state
+
+    def _db(self):
+        """:return: sqlite3 connection of the current process"""
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=TIMEOUT,
+                                         isolation_level=None)
+            # switching the journal mode of a new database doesn't wait for
+            # concurrent connections, so it is retried
+            deadline = time.monotonic() + TIMEOUT
+            while True:
+                try:
+                    connection.execute('PRAGMA journal_mode=WAL')
+                    with _transaction(connection):
+                        for statement in SCHEMA.split(';'):
+                            connection.execute(statement)
+                    break
+                except sqlite3.OperationalError:
+                    if time.monotonic() > deadline:
+                        connection.close()
+                        raise
+                    time.sleep(0.01)
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = self._pid = None
+
+    def get(self, file, line, settings, measures):
+        """
+        Look up results and count hits and misses.
+        :param file: file identity, see cache.file_identity()
+        :param line: normalized reference line, see normalized_line()
+        :param settings: see settings_key()
+        :param measures: names of the measures
+        :return: dict of measure name to result for the stored results
+        """
+        from . import __version__
+
+        db = self._db()
+        found = {}
+        for measure in measures:
+            row = db.execute(
+                'SELECT value FROM results WHERE file = ? AND line = ? AND '
+                'measure = ? AND settings = ? AND version = ?',
+                (file, line, measure, settings, __version__)
+            ).fetchone()
+            if row is not None:
+                found[measure] = float('nan') if row[0] is None else row[0]
+        with _transaction(db):
+            if found:
+                db.executemany(
+                    'UPDATE results SET used = ? WHERE file = ? AND line = ? '
+                    'AND measure = ? AND settings = ? AND version = ?',
+                    [(time.time(), file, line, m, settings, __version__)
+                     for m in found]
+                )
+            self._count(db, 'hits', len(found))
+            self._count(db, 'misses', len(measures) - len(found))
+        return found
+
+    @staticmethod
+    def _count(db, name, n):
+        db.execute('INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) '
+                   'DO UPDATE SET value = value + excluded.value', (name, n))
+
+    def put(self, file, line, settings, results):
+        """
+        :param results: dict of measure name to result
+        """
+        from . import __version__
+
+        now = time.time()
+        db = self._db()
+        with _transaction(db):
+            db.executemany(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(file, line, measure, settings, __version__,
+                  None if value != value else value, now, now)
+                 for measure, value in results.items()]
+            )
+
+    def evaluate(self, path, line, measures, compute, resample=True,
+                 spacing=DEFAULT_SPACING, engine='exact', simplify=None):
+        """
+        Return stored results, computing and storing them if any is missing.
+        :param path: path of the evaluated file
+        :param line: reference line or None, see normalized_line()
+        :param measures: names of the measures
+        :param compute: function returning a dict of measure name to result
+        for all measures, called if any result is not stored
+        :param resample: see measure.Measure
+        :param spacing: see measure.Measure
+        :param engine: engine name, see measure.Measure
+        :param simplify: see measure.Measure
+        :return: dict of measure name to result
+        """
+        file = file_identity(path, self.key_mode)
+        line = normalized_line(line)
+        settings = settings_key(resample, spacing, engine, simplify)
+        results = self.get(file, line, settings, measures)
+        if len(results) < len(measures):
+            results = compute()
+            self.put(file, line, settings, results)
+        return {measure: results[measure] for measure in measures}
+
+    def stats(self):
+        """:return: StoreStats instance"""
+        db = self._db()
+        entries, files, versions, oldest, newest = db.execute(
+            'SELECT COUNT(*), COUNT(DISTINCT file), COUNT(DISTINCT version), '
+            'MIN(used), MAX(used) FROM results'
+        ).fetchone()
+        counters = dict(db.execute('SELECT name, value FROM counters'))
+        size = sum(os.path.getsize(p) for p in
+                   (self.path, self.path + '-wal') if os.path.exists(p))
+        return StoreStats(entries, files, versions, counters.get('hits', 0),
+                          counters.get('misses', 0), size, oldest, newest)
+
+    def prune(self, older_than=None, other_versions=False):
+        """
+        Remove results.
+        :param older_than: remove results not used for this many seconds
+        :param other_versions: remove results of other linesman versions
+        :return: number of removed results
+        """
+        from . import __version__
+
+        db = self._db()
+        removed = 0
+        with _transaction(db):
+            if older_than is not None:
+                removed += db.execute('DELETE FROM results WHERE used < ?',
+                                      (time.time() - older_than,)).rowcount
+            if other_versions:
+                removed += db.execute('DELETE FROM results WHERE version != ?',
+                                      (__version__,)).rowcount
+        db.execute('VACUUM')
+        return removed
+
+
+def _argparser():
+    """:return: argument parser for the results subcommand"""
+    parser = argparse.ArgumentParser(
+        prog='linesman results',
+        description='Show statistics of a result store or prune it.'
+    )
+    parser.add_argument(
+        'action', choices=('stats', 'prune'),
+        help="'stats' prints the number of stored results and the hit rate, "
+             "'prune' removes old results."
+    )
+    parser.add_argument(
+        '--store', default=os.environ.get('LINESMAN_RESULT_STORE'),
+        help='Path of the result store. Default: $LINESMAN_RESULT_STORE.'
+    )
+    parser.add_argument(
+        '--older-than', type=float, metavar='DAYS',
+        help='Prune results not used for this many days.'
+    )
+    parser.add_argument(
+        '--other-versions', action='store_true',
+        help='Prune results of other linesman versions.'
+    )
+    return parser
+
+
+def _time(timestamp):
+    if timestamp is None:
+        return '-'
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def run(argv=None):
+    """
+    Run the results subcommand.
+    :param argv: command line arguments, defaults to sys.argv[1:]
+    :return: exit status
+    """
+    parser = _argparser()
+    args = parser.parse_args(argv)
+    if not args.store:
+        parser.error('--store or $LINESMAN_RESULT_STORE is required')
+    if not os.path.exists(args.store):
+        abort(f"Result store '{args.store}' does not exist!")
+    store = ResultStore(args.store)
+
+    try:
+        if args.action == 'prune':
+            if args.older_than is None and not args.other_versions:
+                parser.error('prune requires --older-than or '
+                             '--other-versions')
+            older_than = None if args.older_than is None \
+                else args.older_than*86400
+            removed = store.prune(older_than, args.other_versions)
+            print(f'Removed {removed} results.')
+            return 0
+
+        s = store.stats()
+        lookups = s.hits + s.misses
+        rate = f'{100*s.hits/lookups:.1f}%' if lookups else '-'
+        print(f'Results: {s.entries} ({s.files} files, {s.versions} '
+              'versions)')
+        print(f'Lookups: {s.hits} hits, {s.misses} misses, hit rate {rate}')
+        print(f'Size: {s.size/2**20:.2f} MB')
+        print(f'Least recently used: {_time(s.oldest)}')
+        print(f'Most recently used: {_time(s.newest)}')
+    except sqlite3.Error as e:
+        abort(str(e))
+    finally:
+        store.close()
+    return 0
@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import json
+import os
+import sys
+from urllib.parse import parse_qs, urlsplit
+import xml.etree.ElementTree as ET
+
+from gpxpy.gpx import GPXException
+
+from .api import evaluate
+from .engine import DEFAULT_ENGINE, engines
+from .measure import available_measures
+from .output import abort
+from .parse import latlon_pair_str, read_decompressed, read_track
+from .resample import DEFAULT_SPACING
+
+# default maximum size of a request body in bytes
+MAX_BODY = 64*2**20
+
+# default maximum size of a decompressed request body in bytes
+MAX_DECOMPRESSED = 512*2**20
+
+# seconds a client may take to send the request line and headers
+HEADER_TIMEOUT = 30
+
+# seconds a client may take to send the request body
+BODY_TIMEOUT = 60
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    408: 'Request Timeout',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    """Error answered with the given status code and message."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+@lru_cache(maxsize=256)
+def _reference_line(string):
+    """:return: Line parsed from 'lat,lon;lat,lon', cached across requests"""
+    return latlon_pair_str(string)
+
+
+def _parameters(query):
+    """
+    :param query: query string of an evaluation request
+    :return: dict of keyword arguments for api.evaluate()
+    """
+    params = parse_qs(query, keep_blank_values=True)
+    unknown = set(params) - {'measure', 'line', 'spacing', 'resample',
+                             'engine'}
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+
+    def single(name, default=None):
+        values = params.get(name, [])
+        if len(values) > 1:
+            raise ValueError(f"Parameter '{name}' must be given once!")
+        return values[0] if values else default
+
+    kwargs = {'measures': params.get('measure', ['ALL'])}
+    if single('line'):
+        kwargs['line'] = _reference_line(single('line'))
+    try:
+        kwargs['spacing'] = float(single('spacing', DEFAULT_SPACING))
+    except ValueError:
+        raise ValueError('spacing must be a number!')
+    resample = single('resample', 'true').lower()
+    if resample not in ('true', 'false'):
+        raise ValueError("resample must be 'true' or 'false'!")
+    kwargs['resample'] = resample == 'true'
+    kwargs['engine'] = single('engine', DEFAULT_ENGINE)
+    return kwargs
+
+
+def _coordinates(body, content_type, max_decompressed=MAX_DECOMPRESSED):
+    """
+    :param body: request body, a (compressed) gpx, FIT, NMEA or GeoJSON file
+    or a JSON object with the arrays 'lon' and 'lat'
+    :param max_decompressed: maximum size of the decompressed file in bytes
+    :return: tuple (lon, lat) of array-likes
+    """
+    if content_type != 'application/json':
+        track = read_track(read_decompressed(body, max_decompressed))
+        return track.lon, track.lat
+    data = json.loads(body)
+    if not isinstance(data, dict) or 'lon' not in data or 'lat' not in data:
+        raise ValueError("JSON body must be an object with 'lon' and 'lat'!")
+    try:
+        return [float(v) for v in data['lon']], [float(v) for v in data['lat']]
+    except (TypeError, ValueError):
+        raise ValueError("'lon' and 'lat' must be arrays of numbers!")
+
+
+def _evaluate_task(body, content_type, kwargs,
+                   max_decompressed=MAX_DECOMPRESSED):
+    """
+    Worker process entry point. Errors are returned instead of raised, such
+    that they are reported to the client: invalid input with status 400, any
+    other error with status 500.
+    :return: tuple (results, error status, error message)
+    """
+    try:
+        lon, lat = _coordinates(body, content_type, max_decompressed)
+        return evaluate(lon, lat, **kwargs), None, None
+    except (ValueError, GPXException, ET.ParseError) as e:
+        return {}, 400, str(e) or type(e).__name__
+    except Exception as e:
+        return {}, 500, f'Evaluation failed: {str(e) or type(e).__name__}'
+
+
+def _warm_up():
+    """Load the libraries and the proj database of a worker process."""
+    evaluate([10, 10.001], [50, 50.001])
+
+
+class EvaluationServer:
+    """
+    HTTP server evaluating tracks posted to /evaluate. Requests are parsed by
+    asyncio, the evaluation runs in a pool of worker processes which stay
+    alive between requests, keeping libraries, reference lines and proj
+    transformers loaded. Requests exceeding the limit of pending evaluations
+    are rejected with 503 instead of being queued without bound.
+    """
+    def __init__(self, workers=None, max_pending=None, max_body=MAX_BODY,
+                 max_decompressed=MAX_DECOMPRESSED):
+        """
+        :param workers: number of worker processes, defaults to the number of
+        CPUs
+        :param max_pending: maximum number of evaluations queued or running at
+        once, defaults to twice the number of workers
+        :param max_body: maximum size of a request body in bytes
+        :param max_decompressed: maximum size of a decompressed request body
+        in bytes
+        """
+        self.workers = max(workers or os.cpu_count() or 1, 1)
+        self.max_pending = max(max_pending or 2*self.workers, 1)
+        self.max_body = max_body
+        self.max_decompressed = max_decompressed
+        self.pending = 0
+        self._pool = None
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=8080, unix=None):
+        """
+        Start the worker processes and listen for connections.
+        :param unix: path of a unix socket to listen on instead of host/port
+        :return: asyncio Server instance
+        """
+        self._pool = ProcessPoolExecutor(self.workers)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _warm_up)
+                               for _ in range(self.workers)))
+        if unix:
+            self._server = await asyncio.start_unix_server(self._handle, unix)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    async def close(self):
+        """Stop listening and shut the worker processes down."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                status, body = await self._respond(reader)
+            except HTTPError as e:
+                status, body = e.status, {'error': str(e)}
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as e:  # e.g. a crashed worker process
+                status, body = 500, {'error': str(e) or type(e).__name__}
+            data = json.dumps(body).encode()
+            head = [f'HTTP/1.1 {status} {REASONS[status]}',
+                    'Content-Type: application/json',
+                    f'Content-Length: {len(data)}',
+                    'Connection: close']
+            if status == 503:
+                head.append('Retry-After: 1')
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + data)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # client went away
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader):
+        """:return: tuple (method, target, dict of lowercase headers)"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(),
+                                                  HEADER_TIMEOUT)
+            parts = request_line.decode('latin-1').split()
+            if len(parts) != 3:
+                raise HTTPError(400, 'Malformed request line')
+            headers = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(),
+                                              HEADER_TIMEOUT)
+                line = line.decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        except asyncio.TimeoutError:
+            raise HTTPError(408, 'Request headers not received in time')
+        except (ValueError, asyncio.LimitOverrunError):
+            raise HTTPError(400, 'Request headers too long')
+        return parts[0], parts[1], headers
+
+    async def _respond(self, reader):
+        """:return: tuple (status, JSON-serializable response body)"""
+        method, target, headers = await self._read_head(reader)
+        url = urlsplit(target)
+        if url.path == '/health':
+            if method != 'GET':
+                raise HTTPError(405, 'Use GET for /health')
+            return 200, {'status': 'ok', 'workers': self.workers,
+                         'pending': self.pending}
+        if url.path != '/evaluate':
+            raise HTTPError(404, f'Unknown path {url.path}')
+        if method != 'POST':
+            raise HTTPError(405, 'Use POST for /evaluate')
+
+        try:
+            length = int(headers['content-length'])
+        except (KeyError, ValueError):
+            raise HTTPError(411, 'Content-Length is required')
+        if length > self.max_body:
+            raise HTTPError(413, f'Body exceeds {self.max_body} bytes')
+        try:
+            kwargs = _parameters(url.query)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length),
+                                          BODY_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPError(408, 'Request body not received in time')
+        # only requests with a complete body count as pending, slow clients
+        # don't block the evaluations of others
+        if self.pending >= self.max_pending:
+            raise HTTPError(503, 'Too many pending evaluations')
+
+        self.pending += 1
+        try:
+            content_type = headers.get('content-type', '').split(';')[0]
+            loop = asyncio.get_running_loop()
+            results, status, error = await loop.run_in_executor(
+                self._pool, _evaluate_task, body, content_type.strip(), kwargs,
+                self.max_decompressed
+            )
+        finally:
+            self.pending -= 1
+        if error:
+            raise HTTPError(status, error)
+        # NaN is no valid JSON
+        return 200, {k: None if v != v else v for k, v in results.items()}
+
+
+def _argparser():
+    """:return: argument parser for the serve subcommand"""
+    parser = argparse.ArgumentParser(
+        prog='linesman serve',
+        description='Run an HTTP server evaluating tracks. POST a gpx file '
+                    "(or a JSON object with the arrays 'lon' and 'lat') to "
+                    '/evaluate, optionally with the query parameters measure '
+                    f"(repeatable, one of {', '.join(available_measures)}), "
+                    "line ('lat,lon;lat,lon'), spacing, resample "
+                    f"(true/false) and engine ({', '.join(engines)}). The "
+                    'response is a JSON object of measure name to result.'
+    )
+    parser.add_argument(
+        '--host', default='127.0.0.1',
+        help='Address to listen on. Default: 127.0.0.1.'
+    )
+    parser.add_argument(
+        '--port', type=int, default=8080,
+        help='Port to listen on. Default: 8080.'
+    )
+    parser.add_argument(
+        '--unix', metavar='PATH',
+        help='Listen on a unix socket at PATH instead of --host/--port.'
+    )
+    parser.add_argument(
+        '-j', '--workers', type=int, default=os.cpu_count(),
+        help='Number of worker processes. Default: number of CPUs.'
+    )
+    parser.add_argument(
+        '--max-pending', type=int,
+        help='Maximum number of evaluations queued or running at once, '
+             'further requests are answered with 503. Default: twice the '
+             'number of workers.'
+    )
+    parser.add_argument(
+        '--max-body', type=float, default=MAX_BODY/2**20,
+        help=f'Maximum upload size in MB. Default: {MAX_BODY/2**20:g}.'
+    )
+    parser.add_argument(
+        '--max-decompressed', type=float, default=MAX_DECOMPRESSED/2**20,
+        help='Maximum size of a decompressed upload in MB. Default: '
+             f'{MAX_DECOMPRESSED/2**20:g}.'
+    )
+    return parser
+
+
+async def _serve(args):
+    server = EvaluationServer(args.workers, args.max_pending,
+                              int(args.max_body*2**20),
+                              int(args.max_decompressed*2**20))
+    listener = await server.start(args.host, args.port, args.unix)
+    address = args.unix or '{}:{}'.format(*listener.sockets[0].getsockname())
+    print(f'Listening on {address}', file=sys.stderr)
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def run(argv=None):
+    """
+    Run the serve subcommand until interrupted.
+    :param argv: command line arguments, defaults to sys.argv[1:]
+    :return: exit status
+    """
+    args = _argparser().parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        abort(str(e))
+    return 0
@@ -0,0 +1,80 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .timing import stage
+
+# summary of a simplification: number of points before and after, and the
+# seconds spent simplifying
+SimplifyStats = namedtuple('SimplifyStats', 'points kept seconds')
+
+
+def _run_bounds(x, y):
+    """
+    :return: sorted indices of the points that must be kept: the ends of the
+    track, the ends of all runs in which x is monotonic (increasing, constant
+    or decreasing) and the point with the maximum absolute deviation
+    """
+    direction = np.sign(np.diff(x))
+    turns = np.flatnonzero(direction[1:] != direction[:-1]) + 1
+    bounds = [0, len(x) - 1, int(np.argmax(np.abs(y)))]
+    return np.unique(np.concatenate((bounds, turns)))
+
+
+def simplify(x, y, tolerance):
+    """
+    Douglas-Peucker simplification of a track in the meter grid, using the
+    deviation (y) difference between a point and the simplified track at the
+    same position on the reference line as distance. The track is split at
+    points where it changes direction along the reference line, so the
+    simplified track passes the same positions in the same direction and
+    resampling it (see resample.resample()) yields samples at the same
+    positions, each deviating by at most `tolerance` from the original
+    sample. The point with the maximum absolute deviation is kept. Hence the
+    maximum deviation is unchanged, the resampled average deviation changes
+    by at most `tolerance` and the resampled average squared deviation by at
+    most tolerance*(2*average deviation + tolerance).
+    :param x: numpy array of positions along the reference line
+    :param y: numpy array of deviations
+    :param tolerance: maximum deviation difference in meters
+    :return: numpy array of the indices of the kept points, in track order
+    """
+    if tolerance < 0:
+        raise ValueError('Simplification tolerance must not be negative!')
+    if len(x) < 3:
+        return np.arange(len(x))
+
+    with stage('simplify', len(x)):
+        keep = np.zeros(len(x), dtype=bool)
+        keep[_run_bounds(x, y)] = True
+        pending = ~keep
+        # Douglas-Peucker for all sections between kept points at once: each
+        # pass compares the pending points to the chord of their section and
+        # keeps the farthest point of every section exceeding the tolerance.
+        # Sections within the tolerance are dropped.
+        while pending.any():
+            candidates = np.flatnonzero(pending)
+            kept = np.flatnonzero(keep)
+            right = np.searchsorted(kept, candidates)
+            left, right = kept[right - 1], kept[right]
+            dx = x[right] - x[left]
+            slope = np.divide(y[right] - y[left], dx, out=np.zeros(len(dx)),
+                              where=dx != 0)
+            # sections without length (runs of equal x) are never sampled
+            distance = np.where(dx != 0, np.abs(
+                y[candidates] - y[left] - (x[candidates] - x[left])*slope), 0)
+
+            starts = np.flatnonzero(np.diff(left, prepend=-1))
+            section = np.repeat(np.arange(len(starts)),
+                                np.diff(starts, append=len(candidates)))
+            farthest = np.maximum.reduceat(distance, starts)
+            split = farthest > tolerance
+            pending[candidates[~split[section]]] = False
+
+            # first point at the maximum distance of every split section
+            first = np.flatnonzero(split[section]
+                                   & (distance == farthest[section]))
+            first = candidates[first[np.diff(section[first], prepend=-1) > 0]]
+            keep[first] = True
+            pending[first] = False
+        return np.flatnonzero(keep)
@@ -0,0 +1,103 @@
+from collections import namedtuple
+from contextlib import contextmanager
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+# peak_increase_bytes: increase of the peak resident memory of the process
+# during the stage, i.e. 0 if the stage stayed below an earlier peak
+StageTiming = namedtuple(
+    'StageTiming',
+    ['stage', 'wall_s', 'cpu_s', 'points', 'peak_increase_bytes']
+)
+
+# callables receiving a StageTiming instance whenever a stage finished
+hooks = []
+
+
+def add_hook(hook):
+    """Register a callable that receives the StageTiming of every stage."""
+    hooks.append(hook)
+
+
+def remove_hook(hook):
+    hooks.remove(hook)
+
+
+def _peak_memory():
+    """:return: peak resident memory of the process in bytes or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak*1024
+
+
+class Stage:
+    """Running pipeline stage; set `points` to the number of processed
+    points if it is not known when the stage starts."""
+    def __init__(self, name, points=None):
+        self.name = name
+        self.points = points
+
+
+@contextmanager
+def stage(name, points=None):
+    """
+    Context manager timing a stage of the evaluation pipeline. On exit, the
+    StageTiming is passed to all registered hooks. Without hooks, nothing is
+    measured.
+    :param name: stage name, e.g. 'parse' or 'projection'
+    :param points: number of points processed by the stage, if known
+    :return: Stage instance
+    """
+    current = Stage(name, points)
+    if not hooks:
+        yield current
+        return
+
+    peak = _peak_memory()
+    wall, cpu = time.perf_counter(), time.process_time()
+    yield current
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    increase = None if peak is None else _peak_memory() - peak
+    timing = StageTiming(current.name, wall, cpu, current.points, increase)
+    for hook in list(hooks):
+        hook(timing)
+
+
+class Recorder:
+    """Hook collecting StageTiming instances, usable as context manager."""
+    def __init__(self):
+        self.timings = []
+
+    def __call__(self, timing):
+        self.timings.append(timing)
+
+    def __enter__(self):
+        add_hook(self)
+        return self
+
+    def __exit__(self, *exc):
+        remove_hook(self)
+
+    def as_json(self):
+        """:return: timings as JSON array of objects"""
+        return json.dumps([t._asdict() for t in self.timings])
+
+    def as_text(self):
+        """:return: timings as human readable table"""
+        lines = [f"{'stage':<14}{'wall [s]':>10}{'cpu [s]':>10}"
+                 f"{'points':>12}{'peak increase [MB]':>20}"]
+        for t in self.timings:
+            points = '' if t.points is None else t.points
+            peak = '' if t.peak_increase_bytes is None \
+                else f'{t.peak_increase_bytes/2**20:.1f}'
+            lines.append(f'{t.stage:<14}{t.wall_s:>10.4f}{t.cpu_s:>10.4f}'
+                         f'{points:>12}{peak:>20}')
+        return '\n'.join(lines)
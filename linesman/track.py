@@ -0,0 +1,108 @@
+import numpy as np
+
+from .geometry import Vector
+
+
+class Track:
+    """
+    Columnar container for the points of a recorded track. Coordinates are
+    stored as contiguous float64 arrays instead of one Vector per point.
+    Elevation (meters) and time (seconds since the unix epoch) are optional;
+    missing single values are NaN.
+    """
+    def __init__(self, lon, lat, ele=None, time=None):
+        self._lon = np.ascontiguousarray(lon, dtype=np.float64)
+        self._lat = np.ascontiguousarray(lat, dtype=np.float64)
+        if self._lon.ndim != 1 or self._lon.shape != self._lat.shape:
+            raise ValueError('lon and lat must be one-dimensional and have '
+                             'the same length!')
+        self._ele = self._optional_column(ele)
+        self._time = self._optional_column(time)
+
+    def _optional_column(self, values):
+        if values is None:
+            return None
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        if values.shape != self._lon.shape:
+            raise ValueError('Optional track columns must have the same '
+                             'length as lon and lat!')
+        return values
+
+    @classmethod
+    def from_points(cls, points: [Vector]):
+        """:return: Track of the given (lon, lat) Vector instances"""
+        points = list(points)
+        lon = np.fromiter((p.x for p in points), np.float64, len(points))
+        lat = np.fromiter((p.y for p in points), np.float64, len(points))
+        return cls(lon, lat)
+
+    @classmethod
+    def concatenate(cls, tracks):
+        """
+        :param tracks: sequence of Track instances
+        :return: Track with the points of all tracks in the given order.
+        Optional columns missing in some of the tracks are filled with NaN.
+        """
+        tracks = list(tracks)
+        if not tracks:
+            return cls(np.empty(0), np.empty(0))
+
+        def column(name):
+            if all(getattr(t, name) is None for t in tracks):
+                return None
+            return np.concatenate([
+                np.full(len(t), np.nan) if getattr(t, name) is None
+                else getattr(t, name) for t in tracks
+            ])
+
+        return cls(np.concatenate([t.lon for t in tracks]),
+                   np.concatenate([t.lat for t in tracks]),
+                   column('ele'), column('time'))
+
+    @property
+    def lon(self):
+        return self._lon
+
+    @property
+    def lat(self):
+        return self._lat
+
+    @property
+    def ele(self):
+        return self._ele
+
+    @property
+    def time(self):
+        return self._time
+
+    def __len__(self):
+        return len(self._lon)
+
+    def __getitem__(self, index):
+        """
+        :return: Vector(lon, lat) for an integer index, Track for a slice
+        """
+        if isinstance(index, slice):
+            return Track(
+                self._lon[index], self._lat[index],
+                None if self._ele is None else self._ele[index],
+                None if self._time is None else self._time[index]
+            )
+        return Vector(float(self._lon[index]), float(self._lat[index]))
+
+    def __iter__(self):
+        for lon, lat in zip(self._lon.tolist(), self._lat.tolist()):
+            yield Vector(lon, lat)
+
+    def __repr__(self):
+        return f'Track({len(self)} points)'
+
+
+def as_track(points):
+    """
+    :param points: Track instance or iterable of Vector(lon, lat) instances
+    :return: Track instance
+    """
+    if isinstance(points, Track):
+        return points
+    return Track.from_points(points)
@@ -0,0 +1,119 @@
+import argparse
+import os
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+from .output import abort
+from .parse import readable_file
+from .track import Track
+
+# Binary linesman track format (.lmt): a 64 byte header followed by the
+# columns lon, lat[, ele][, time] as little endian float64 arrays. The header
+# holds the magic bytes, the format version, flags for the optional columns
+# and the number of points (little endian).
+MAGIC = b'LMTRACK\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQ')
+HEADER_SIZE = 64
+FLAG_ELE = 1
+FLAG_TIME = 2
+EXTENSION = '.lmt'
+
+
+def is_track_file(path):
+    """:return: whether the file starts with the magic bytes of the format"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_track_file(track, path):
+    """
+    Write a Track in the binary track format. The file is replaced
+    atomically, readers never see an incomplete file.
+    """
+    flags = ((FLAG_ELE if track.ele is not None else 0)
+             | (FLAG_TIME if track.time is not None else 0))
+    header = HEADER.pack(MAGIC, VERSION, flags, 0, len(track))
+    columns = [track.lon, track.lat, track.ele, track.time]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b'\x00'))
+            for column in columns:
+                if column is not None:
+                    f.write(column.astype('<f8', copy=False).tobytes())
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def read_track_file(path):
+    """
+    Read a file in the binary track format. The columns are memory mapped,
+    nothing is copied into memory until it is accessed.
+    :return: Track instance
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+        raise ValueError(f"'{path}' is no linesman track file!")
+    _, version, flags, _, n = HEADER.unpack_from(header)
+    if version > VERSION:
+        raise ValueError(f'Unsupported track file version {version}!')
+
+    names = ['lon', 'lat']
+    names += ['ele'] if flags & FLAG_ELE else []
+    names += ['time'] if flags & FLAG_TIME else []
+    if os.path.getsize(path) < HEADER_SIZE + len(names)*n*8:
+        raise ValueError(f"Track file '{path}' is truncated!")
+    if n == 0:
+        return Track(np.empty(0), np.empty(0))
+
+    data = np.memmap(path, dtype='<f8', mode='r', offset=HEADER_SIZE,
+                     shape=(len(names), n))
+    columns = dict(zip(names, data))
+    return Track(columns['lon'], columns['lat'], columns.get('ele'),
+                 columns.get('time'))
+
+
+def _argparser():
+    """:return: argument parser for the convert subcommand"""
+    parser = argparse.ArgumentParser(
+        prog='linesman convert',
+        description='Convert a track to the binary linesman track format '
+                    f'({EXTENSION}), which is evaluated without parsing.'
+    )
+    parser.add_argument(
+        'input', type=readable_file,
+        help='track file to convert, e.g. a (compressed) gpx, FIT, NMEA or '
+             'GeoJSON file'
+    )
+    parser.add_argument(
+        'output', help=f'path of the converted file, e.g. track{EXTENSION}'
+    )
+    return parser
+
+
+def run(argv=None):
+    """
+    Run the convert subcommand.
+    :param argv: command line arguments, defaults to sys.argv[1:]
+    :return: exit status
+    """
+    from gpxpy.gpx import GPXException
+    from .parse import read_track
+
+    args = _argparser().parse_args(argv)
+    try:
+        track = read_track(args.input)
+        write_track_file(track, args.output)
+    except (ValueError, OSError, GPXException) as e:
+        abort(str(e))
+    print(f'Wrote {len(track)} points to {args.output}', file=sys.stderr)
+    return 0
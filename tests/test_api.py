@@ -0,0 +1,65 @@
+import array
+
+import numpy as np
+import pytest
+
+import linesman
+from linesman.geo import transformer_cache
+from linesman.geometry import Line, Vector
+from linesman.measure import available_measures, calculate_measures, \
+    MaxDeviation
+from linesman.track import Track
+
+LON = [10.0, 10.001, 10.002, 10.004]
+LAT = [50.0, 50.001, 50.0, 50.0005]
+
+
+def test_evaluate():
+    results = linesman.evaluate(np.array(LON), np.array(LAT))
+    assert list(results) == list(available_measures)
+    expected = calculate_measures(Track(LON, LAT),
+                                  Line(Vector(10, 50), Vector(10.004, 50.0005)),
+                                  available_measures.values())
+    for name, measure in available_measures.items():
+        assert results[name] == expected[measure]
+
+
+def test_evaluate_buffers():
+    expected = linesman.evaluate(LON, LAT, measures=['MAX'])
+    lon = array.array('d', LON)
+    lat = memoryview(array.array('d', LAT))
+    assert linesman.evaluate(lon, lat, measures=['MAX']) == expected
+    assert np.shares_memory(Track(lon, lat).lon, np.asarray(lon))
+
+
+def test_evaluate_line_and_measures():
+    line = Line(Vector(10, 50), Vector(10.004, 50))
+    results = linesman.evaluate(LON, LAT, line, ['SQ-AVG', MaxDeviation])
+    assert list(results) == ['SQ-AVG', 'MAX']
+    assert results == linesman.evaluate(LON, LAT, '50,10;50,10.004',
+                                        ['SQ-AVG', 'MAX'])
+
+
+def test_evaluate_reuses_transformers():
+    transformer_cache.clear()
+    linesman.evaluate(LON, LAT)
+    linesman.evaluate(np.array(LAT), np.array(LON))
+    linesman.evaluate(LON, LAT)
+    info = transformer_cache.info()
+    assert (info.hits, info.misses) == (1, 2)
+
+
+@pytest.mark.parametrize('args, kwargs', [
+    ((LON, LAT[:-1]), {}),
+    ((LON[:1], LAT[:1]), {}),
+    ((LON, LAT), {'measures': ['NONE']}),
+    ((LON, LAT), {'measures': []}),
+    ((LON, LAT, '50,10'), {}),
+    ((LON, LAT), {'spacing': 0}),
+    ((LON, [50, 95, 50, 50]), {}),
+    ((LON, [50, float('nan'), 50, 50]), {}),
+    ((LON, LAT, '50,10;91,10'), {}),
+])
+def test_evaluate_errors(args, kwargs):
+    with pytest.raises(ValueError):
+        linesman.evaluate(*args, **kwargs)
@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+import os
+
+import pytest
+from gpxpy.gpx import GPXTrackPoint
+
+from linesman import batch
+
+
+@pytest.fixture
+def gpx_dir(gpx_obj, tmp_path):
+    segment = gpx_obj.tracks[0].segments[0]
+    segment.points.append(GPXTrackPoint(1, 1))
+    segment.points.append(GPXTrackPoint(2, 1))
+    segment.points.append(GPXTrackPoint(2, 2))
+    for name in ('a.gpx', 'b.gpx'):
+        (tmp_path / name).write_text(gpx_obj.to_xml())
+    (tmp_path / 'broken.gpx').write_text('<gpx><trk>')
+    return tmp_path
+
+
+def test_batch_csv(gpx_dir):
+    out = io.StringIO()
+    status = batch.run([str(gpx_dir / '*.gpx'), '-m', 'MAX', '-m', 'AVG',
+                        '-j', '2'], out=out)
+    assert status == 1
+
+    rows = {os.path.basename(row['file']): row
+            for row in csv.DictReader(io.StringIO(out.getvalue()))}
+    assert set(rows) == {'a.gpx', 'b.gpx', 'broken.gpx'}
+    assert rows['a.gpx']['MAX'] == rows['b.gpx']['MAX']
+    assert float(rows['a.gpx']['AVG']) > 0
+    assert rows['a.gpx']['error'] == ''
+    assert rows['broken.gpx']['MAX'] == ''
+    assert rows['broken.gpx']['error']
+
+
+def test_batch_jsonl_shared_line(gpx_dir):
+    out = io.StringIO()
+    status = batch.run([str(gpx_dir / 'a.gpx'), str(gpx_dir / 'missing.gpx'),
+                        '--line', '1,1;3,2', '--format', 'jsonl'], out=out)
+    assert status == 1
+
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    rows = {os.path.basename(row['file']): row for row in rows}
+    assert abs(rows['a.gpx']['MAX']/49695.425252590474 - 1) < 0.001
+    assert set(rows['a.gpx']) == {'file', 'MAX', 'AVG', 'SQ-AVG', 'P50', 'P90',
+                                 'P95', 'P99', 'error'}
+    assert rows['a.gpx']['error'] is None
+    assert rows['missing.gpx']['error']
+
+
+def test_batch_jsonl_undefined_results(tmp_path, capfd):
+    # two tracks (warning) and no resampled deviations (AVG is NaN)
+    (tmp_path / 'short.gpx').write_text(
+        '<gpx><trk><trkseg><trkpt lat="50" lon="10.000003"/>'
+        '<trkpt lat="50.000001" lon="10.000008"/></trkseg></trk>'
+        '<trk><trkseg><trkpt lat="1" lon="1"/></trkseg></trk></gpx>'
+    )
+    assert batch.run([str(tmp_path / 'short.gpx'), '--format', 'jsonl',
+                      '--line', '50,10;50,10.01', '-j', '1']) == 0
+
+    captured = capfd.readouterr()
+    [row] = [json.loads(line) for line in captured.out.splitlines()]
+    assert row['AVG'] is None and row['MAX'] > 0
+    assert 'multiple tracks' in captured.err
+
+
+def test_batch_unexpected_error(gpx_dir):
+    # latitude out of range, fails in pyproj
+    (gpx_dir / 'outside.gpx').write_text(
+        '<gpx><trk><trkseg><trkpt lat="50" lon="10"/>'
+        '<trkpt lat="95" lon="10.1"/></trkseg></trk></gpx>'
+    )
+    out = io.StringIO()
+    status = batch.run([str(gpx_dir / 'outside.gpx'), str(gpx_dir / 'a.gpx'),
+                        '-m', 'MAX', '-j', '1'], out=out)
+    assert status == 1
+
+    rows = {os.path.basename(row['file']): row
+            for row in csv.DictReader(io.StringIO(out.getvalue()))}
+    assert rows['outside.gpx']['error'] and rows['outside.gpx']['MAX'] == ''
+    assert rows['a.gpx']['error'] == ''
+
+
+def test_batch_all_successful(gpx_dir):
+    out = io.StringIO()
+    assert batch.run([str(gpx_dir / 'a.gpx'), '-j', '1'], out=out) == 0
+
+
+def test_batch_result_store(gpx_dir):
+    store = str(gpx_dir / 'results.sqlite')
+    outputs = []
+    for _ in range(2):
+        out = io.StringIO()
+        batch.run([str(gpx_dir / '*.gpx'), '-j', '2', '--result-store', store],
+                  out=out)
+        outputs.append({row['file']: row
+                        for row in csv.DictReader(io.StringIO(out.getvalue()))})
+    assert outputs[0] == outputs[1]
+    # a.gpx and b.gpx have the same contents and share their results
+    stats = batch.ResultStore(store).stats()
+    assert (stats.files, stats.entries) == (1, 7)
+    assert stats.hits + stats.misses == 42 and stats.hits >= 14
@@ -0,0 +1,44 @@
+import numpy as np
+
+from benchmarks.run import compare, run_benchmarks
+from benchmarks.synthetic import synthetic_track, write_gpx
+from linesman.measure import MaxDeviation
+from linesman.gpx import gpx_read_track
+
+
+def test_synthetic_track_deterministic():
+    a, line_a = synthetic_track(100, lat=70, line_km=10, seed=1)
+    b, line_b = synthetic_track(100, lat=70, line_km=10, seed=1)
+    np.testing.assert_array_equal(a.lon, b.lon)
+    np.testing.assert_array_equal(a.lat, b.lat)
+    assert line_a == line_b
+
+    c, _ = synthetic_track(100, lat=70, line_km=10, seed=2)
+    assert not np.array_equal(a.lat, c.lat)
+
+
+def test_synthetic_track_deviation():
+    track, line = synthetic_track(1000, lat=0, line_km=100)
+    assert 20 < MaxDeviation(track, line).calculate() < 100
+
+
+def test_write_gpx(tmp_path):
+    track, _ = synthetic_track(10)
+    path = str(tmp_path / 'synthetic.gpx')
+    write_gpx(track, path)
+    parsed = gpx_read_track(path)
+    np.testing.assert_allclose(parsed.lat, track.lat, atol=1e-8)
+    np.testing.assert_array_equal(parsed.time, track.time)
+
+
+def test_run_benchmarks():
+    results = run_benchmarks([100], [45], [10], repeat=1, cli=False)
+    stages = {row['stage'] for row in results}
+    assert {'parse.gpx_read_track', 'geo.mercator_project_arrays',
+            'measure.MaxDeviation', 'measure.calculate_measures'} <= stages
+    assert all(row['wall_s'] >= 0 and row['peak_bytes'] > 0
+               for row in results)
+
+    slower = [dict(row, wall_s=row['wall_s']*2 + 1) for row in results]
+    assert len(compare(slower, {'results': results}, 0.2)) == len(results)
+    assert compare(results, {'results': results}, 0.2) == []
@@ -0,0 +1,91 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from linesman.cache import TrackCache
+from linesman.track import Track
+
+
+@pytest.fixture
+def track_file(tmp_path):
+    path = tmp_path / 'track.gpx'
+    path.write_text('stand-in for a gpx file')
+    return str(path)
+
+
+def _reader(track):
+    calls = []
+
+    def read(path):
+        calls.append(path)
+        return track
+    return read, calls
+
+
+@pytest.mark.parametrize('key', ['content', 'stat'])
+def test_cache_read(tmp_path, track_file, key):
+    track = Track([1, 2, 3], [4, 5, 6], time=[7, 8, 9])
+    read, calls = _reader(track)
+    cache = TrackCache(str(tmp_path / 'cache'), key=key)
+
+    assert cache.get(track_file) is None
+    assert cache.read(track_file, read) is track
+    cached = cache.read(track_file, read)
+    assert calls == [track_file]
+    assert isinstance(cached.lon.base, np.memmap) or \
+        isinstance(cached.lon, np.memmap)
+    np.testing.assert_array_equal(cached.lat, track.lat)
+    np.testing.assert_array_equal(cached.time, track.time)
+    assert cached.ele is None
+
+
+def test_cache_columns(tmp_path, track_file):
+    cache = TrackCache(str(tmp_path))
+    cache.put(track_file, Track([1, 2], [3, 4]))
+    cached = cache.get(track_file)
+    assert cached.ele is None and cached.time is None
+
+    cache.put(track_file, Track([1, 2], [3, 4], ele=[5, np.nan]))
+    cached = cache.get(track_file)
+    np.testing.assert_array_equal(cached.ele, [5, np.nan])
+    assert cached.time is None
+
+
+def test_cache_content_changed(tmp_path, track_file):
+    cache = TrackCache(str(tmp_path / 'cache'))
+    cache.put(track_file, Track([1, 2], [3, 4]))
+    with open(track_file, 'a') as f:
+        f.write('changed')
+    assert cache.get(track_file) is None
+
+
+def test_cache_eviction(tmp_path):
+    cache = TrackCache(str(tmp_path / 'cache'))
+    files = []
+    for i in range(3):
+        path = tmp_path / f'{i}.gpx'
+        path.write_text(str(i))
+        files.append(str(path))
+    track = Track(np.zeros(1000), np.zeros(1000))
+
+    cache.put(files[0], track)
+    entry_size = cache.size()
+    cache.max_bytes = 2*entry_size
+    cache.put(files[1], track)
+    # make entry of files[0] the least recently used one
+    old = time.time() - 100
+    os.utime(cache._entry_path(cache.key(files[0])), (old, old))
+    assert cache.get(files[1]) is not None
+
+    cache.put(files[2], track)
+    assert cache.size() == 2*entry_size
+    assert cache.get(files[0]) is None
+    assert cache.get(files[1]) is not None
+    assert cache.get(files[2]) is not None
+
+
+def test_cache_invalid_key(tmp_path):
+    with pytest.raises(ValueError, match='.*must be one of.*'):
+        TrackCache(str(tmp_path), key='name')
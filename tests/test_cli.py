@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 import tempfile
@@ -5,7 +6,7 @@ import tempfile
 import pytest
 from gpxpy.gpx import GPXTrackPoint, GPXTrack, GPX, GPXTrackSegment
 
-from linesman import get_evaluation_measure
+from linesman import get_evaluation_measure, run
 from linesman.geo import dist_m
 from linesman.geometry import Vector
 
@@ -103,10 +104,201 @@ def test_measures(gpx_file):
     m = get_evaluation_measure()
     assert abs(m.calculate()/deviation - 1) < MAX_REL_DIFF
 
-    sys.argv = ['linesman', gpx_file, 'AVG']
+    sys.argv = ['linesman', gpx_file, 'AVG', '--no-resample']
     m = get_evaluation_measure()
     assert abs(m.calculate()/(deviation/3) - 1) < MAX_REL_DIFF
 
+    sys.argv = ['linesman', gpx_file, 'SQ-AVG', '--no-resample']
+    m = get_evaluation_measure()
+    assert abs(m.calculate()/(deviation**2/3) - 1) < MAX_REL_DIFF
+
+
+def test_measures_resampled(gpx_file):
+    # the deviation grows linearly to its maximum at (2, 1) and shrinks back
+    # to 0, such that the resampled track averages over a triangle
+    deviation = dist_m(Vector(1.5, 1.5), Vector(2, 1))
+    MAX_REL_DIFF = 0.001
+
+    sys.argv = ['linesman', gpx_file, 'MAX']
+    m = get_evaluation_measure()
+    assert abs(m.calculate()/deviation - 1) < MAX_REL_DIFF
+
+    sys.argv = ['linesman', gpx_file, 'AVG', '--spacing', '10']
+    m = get_evaluation_measure()
+    assert abs(m.calculate()/(deviation/2) - 1) < MAX_REL_DIFF
+
     sys.argv = ['linesman', gpx_file, 'SQ-AVG']
     m = get_evaluation_measure()
     assert abs(m.calculate()/(deviation**2/3) - 1) < MAX_REL_DIFF
+
+
+def test_invalid_spacing(gpx_file):
+    sys.argv = ['linesman', gpx_file, 'AVG', '--spacing', '0']
+    with pytest.raises(SystemExit):
+        get_evaluation_measure()
+
+
+def test_batch_subcommand(gpx_file, capsys):
+    sys.argv = ['linesman', 'batch', gpx_file, '-m', 'MAX', '-j', '1']
+    with pytest.raises(SystemExit) as e:
+        run()
+    assert e.value.code == 0
+    assert capsys.readouterr().out.startswith('file,MAX,error')
+
+
+def test_multiple_measures(gpx_file, capsys):
+    sys.argv = ['linesman', gpx_file, 'MAX', 'SQ-AVG']
+    run()
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith('Maximum deviation in meters: ')
+    assert lines[1].startswith('Average squared deviation: ')
+
+    sys.argv = ['linesman', gpx_file, 'ALL']
+    run()
+    assert len(capsys.readouterr().out.splitlines()) == 7
+
+
+def test_timings(gpx_file, capsys):
+    sys.argv = ['linesman', gpx_file, 'MAX', '--timings', 'json']
+    run()
+    output = capsys.readouterr()
+    assert output.out.startswith('Maximum deviation in meters: ')
+    stages = [t['stage'] for t in json.loads(output.err)]
+    assert stages[0] == 'parse'
+    assert 'projection' in stages and 'accumulate' in stages
+
+
+def test_cache_dir(gpx_file, tmp_path, capsys):
+    cache_dir = str(tmp_path / 'cache')
+    sys.argv = ['linesman', gpx_file, 'MAX', '--cache-dir', cache_dir]
+    run()
+    assert len(os.listdir(cache_dir)) == 1
+    sys.argv += ['--timings', 'json']
+    run()
+    output = capsys.readouterr()
+    lines = output.out.splitlines()
+    assert lines[0] == lines[1]
+    assert json.loads(output.err)[0]['stage'] == 'cache'
+
+
+def test_result_store(gpx_file, tmp_path, capsys):
+    store = str(tmp_path / 'results.sqlite')
+    sys.argv = ['linesman', gpx_file, 'MAX', 'AVG', '--result-store', store]
+    run()
+    sys.argv += ['--timings', 'json']
+    run()
+    output = capsys.readouterr()
+    lines = output.out.splitlines()
+    assert lines[:2] == lines[2:]
+    # the file is not read again
+    assert json.loads(output.err) == []
+
+    sys.argv = ['linesman', 'results', 'stats', '--store', store]
+    with pytest.raises(SystemExit) as e:
+        run()
+    assert e.value.code == 0
+    assert 'hit rate 50.0%' in capsys.readouterr().out
+
+
+def test_histogram(gpx_file, capsys):
+    sys.argv = ['linesman', gpx_file, 'P50', '--histogram', '1000']
+    run()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith('Median deviation in meters: ')
+    assert lines[1] == 'Deviation histogram:'
+    assert lines[2].startswith('  0-1000 m: ')
+    assert sum(float(line.split('(')[1][:-2]) for line in lines[2:]) == \
+        pytest.approx(100, abs=0.1*len(lines))
+
+
+def test_segments(gpx_obj, capsys):
+    gpx_obj.tracks[0].segments[0].points.extend(
+        [GPXTrackPoint(1, 1), GPXTrackPoint(1.5, 1.5)])
+    second = GPXTrackSegment()
+    second.points.extend([GPXTrackPoint(1.5, 1.6), GPXTrackPoint(2, 2)])
+    gpx_obj.tracks[0].segments.append(second)
+    gpx_obj.tracks.append(GPXTrack())
+    gpx_obj.tracks[1].segments.append(GPXTrackSegment())
+    gpx_obj.tracks[1].segments[0].points.append(GPXTrackPoint(1.5, 1.7))
+    with tempfile.NamedTemporaryFile('w', suffix='.gpx') as f:
+        f.write(gpx_obj.to_xml())
+        f.flush()
+
+        sys.argv = ['linesman', f.name, 'MAX', '--segments']
+        run()
+    out = capsys.readouterr().out
+    headers = [line for line in out.splitlines() if line.endswith(':')]
+    assert headers == ['Track 1, segment 1:', 'Track 1, segment 2:',
+                       'Track 1:', 'Track 2, segment 1:', 'Track 2:',
+                       'All tracks:']
+    assert 'multiple tracks' not in out
+
+
+def test_fit(gpx_file, capsys):
+    sys.argv = ['linesman', gpx_file, 'MAX', 'SQ-AVG', '--fit']
+    run()
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith('Fitted line for MAX: ')
+    assert out[2].startswith('Fitted line for SQ-AVG: ')
+
+    sys.argv = ['linesman', gpx_file, 'MAX', '--line',
+                out[0].split(': ')[1]]
+    run()
+    value = float(capsys.readouterr().out.split(': ')[1])
+    assert value == pytest.approx(float(out[1].split(': ')[1]), rel=1e-6)
+
+
+def test_fit_quantiles(gpx_file, capsys):
+    sys.argv = ['linesman', gpx_file, 'ALL', '--fit']
+    run()
+    out = capsys.readouterr().out.splitlines()
+    assert len(out) == 6
+    sys.argv = ['linesman', gpx_file, 'P50', '--fit']
+    with pytest.raises(SystemExit):
+        run()
+
+
+def test_fit_segments(gpx_file):
+    sys.argv = ['linesman', gpx_file, 'MAX', '--fit', '--segments']
+    with pytest.raises(SystemExit):
+        run()
+
+
+def test_engine(gpx_file, capsys):
+    sys.argv = ['linesman', gpx_file, 'MAX']
+    run()
+    exact = float(capsys.readouterr().out.split(': ')[1])
+    sys.argv = ['linesman', gpx_file, 'MAX', '--engine', 'fast']
+    run()
+    fast = float(capsys.readouterr().out.split(': ')[1])
+    assert fast == pytest.approx(exact, rel=1e-3, abs=0.01)
+
+    sys.argv = ['linesman', gpx_file, 'MAX', '--engine', 'fast', '--fit']
+    with pytest.raises(SystemExit):
+        run()
+
+
+def test_simplify(gpx_file, capsys):
+    sys.argv = ['linesman', gpx_file, 'MAX']
+    run()
+    expected = capsys.readouterr().out
+    sys.argv = ['linesman', gpx_file, 'MAX', '--simplify', '0.5']
+    run()
+    captured = capsys.readouterr()
+    assert captured.out == expected
+    assert captured.err.startswith('Simplification dropped ')
+
+    sys.argv = ['linesman', gpx_file, 'MAX', '--simplify', '1',
+                '--no-resample']
+    with pytest.raises(SystemExit):
+        run()
+
+
+def test_workers(gpx_file, capsys):
+    sys.argv = ['linesman', gpx_file, 'ALL']
+    run()
+    expected = capsys.readouterr().out
+    sys.argv = ['linesman', gpx_file, 'ALL', '-j', '2']
+    run()
+    assert capsys.readouterr().out == expected
@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+
+import numpy as np
+import pytest
+from gpxpy.gpx import GPXTrackPoint
+
+from linesman import corridor
+from linesman.corridor import corridor_violations
+
+
+def _naive(x, y, width):
+    """:return: list of (first, last, peak) of the runs outside"""
+    runs, first = [], None
+    for i, value in enumerate(np.abs(y)):
+        if value > width and first is None:
+            first = i
+        if value <= width and first is not None:
+            runs.append((first, i - 1, np.abs(y[first:i]).max()))
+            first = None
+    if first is not None:
+        runs.append((first, len(y) - 1, np.abs(y[first:]).max()))
+    return runs
+
+
+def test_corridor_violations():
+    x = np.arange(8.0)*10
+    y = np.array([0, 50, 150, 250, 150, 50, -150, -50.])
+    time = np.arange(8.0)*2
+    v = corridor_violations(x, y, [100, 200], time)
+    assert list(v) == [100, 200]
+
+    assert v[100].first.tolist() == [2, 6]
+    assert v[100].last.tolist() == [4, 6]
+    assert v[100].peak.tolist() == [250, 150]
+    # where the linearly interpolated track crosses the edge
+    assert v[100].start.tolist() == [15, 57.5]
+    assert v[100].end.tolist() == [45, 65]
+    assert v[100].duration.tolist() == [6, 1.5]
+
+    assert v[200].first.tolist() == [3] and v[200].last.tolist() == [3]
+    assert v[200].start.tolist() == [25] and v[200].end.tolist() == [35]
+
+
+def test_corridor_violations_ends():
+    x = np.arange(4.0)
+    v = corridor_violations(x, np.array([-5, 1, 0, 5.]), [2])[2]
+    assert v.first.tolist() == [0, 3]
+    assert v.start.tolist() == [0, 2.4] and v.end.tolist() == [0.5, 3]
+    assert np.isnan(v.duration).all()
+    # a point exactly on the edge is inside
+    assert len(corridor_violations(x, np.array([0, 2, 2, 0.]), [2])[2].first) \
+        == 0
+    empty = corridor_violations(np.zeros(0), np.zeros(0), [1, 2])
+    assert all(len(v.first) == 0 for v in empty.values())
+    with pytest.raises(ValueError):
+        corridor_violations(x, x, [-1])
+
+
+def test_corridor_violations_random():
+    rng = np.random.default_rng(0)
+    y = np.cumsum(rng.normal(0, 10, 5000))
+    x = np.arange(len(y), dtype=np.float64)
+    widths = [300, 50, 100, 0]
+    violations = corridor_violations(x, y, widths)
+    for width in widths:
+        v = violations[width]
+        assert list(zip(v.first.tolist(), v.last.tolist(),
+                        v.peak.tolist())) == _naive(x, y, width)
+        assert np.all(v.start <= x[v.first]) and np.all(v.end >= x[v.last])
+
+
+@pytest.fixture
+def gpx_path(gpx_obj, tmp_path):
+    segment = gpx_obj.tracks[0].segments[0]
+    for lat, lon in ((0, 0), (0.001, 0.01), (0.002, 0.02), (0, 0.03)):
+        segment.points.append(GPXTrackPoint(lat, lon))
+    path = tmp_path / 'track.gpx'
+    path.write_text(gpx_obj.to_xml())
+    return str(path)
+
+
+def test_run_csv(gpx_path, capsys):
+    out = io.StringIO()
+    assert corridor.run([gpx_path, '-w', '100', '-w', '200'], out=out) == 0
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert [(row['width'], row['first'], row['last']) for row in rows] == \
+        [('100.0', '1', '2'), ('200.0', '2', '2')]
+    assert float(rows[1]['peak']) == pytest.approx(221.1, abs=0.5)
+    err = capsys.readouterr().err.splitlines()
+    assert err[0].startswith('Corridor of 100 m: 1 violations, ')
+
+
+def test_run_jsonl(gpx_path):
+    out = io.StringIO()
+    corridor.run([gpx_path, '--format', 'jsonl'], out=out)
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert set(rows[0]) == set(corridor.COLUMNS)
+    assert rows[0]['duration'] is None
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from pyproj import Geod
+
+from linesman import ENGINE_NAMES
+from linesman.engine import ExactEngine, FastEngine, engines, get_engine
+from linesman.geometry import Line, Vector
+from linesman.measure import available_measures, calculate_measures
+from linesman.track import Track
+
+GEOD = Geod(ellps='WGS84')
+
+
+def _track(lat, azimuth, length, deviation, n=500):
+    """:return: Line of the given length and a track weaving around it"""
+    lon2, lat2, _ = GEOD.fwd(10, lat, azimuth, length)
+    t = np.linspace(-0.05, 1.05, n)
+    lon, lat_, back = GEOD.fwd(np.full(n, 10.), np.full(n, float(lat)),
+                               np.full(n, float(azimuth)), t*length)
+    # perpendicular offsets from the points on the line
+    offset = deviation*np.sin(t*25)
+    lon, lat_, _ = GEOD.fwd(lon, lat_, back + 180 + 90, offset)
+    return Line(Vector(10, lat), Vector(lon2, lat2)), Track(lon, lat_)
+
+
+def test_engine_names():
+    assert set(ENGINE_NAMES) == set(engines)
+    assert isinstance(get_engine('fast'), FastEngine)
+    engine = ExactEngine()
+    assert get_engine(engine) is engine
+    with pytest.raises(ValueError):
+        get_engine('none')
+
+
+@pytest.mark.parametrize('lat', [-75, -30, 0, 30, 60, 80])
+@pytest.mark.parametrize('length', [1e3, 1e4, 1e5, 3e5])
+@pytest.mark.parametrize('azimuth', [10, 135])
+def test_fast_engine_error(lat, length, azimuth):
+    """The fast engine's deviations are within 0.01% + 1 cm (10 cm) of exact."""
+    tolerance = 0.01 if length <= 1e5 else 0.1
+    for deviation in (20, length*0.02):
+        line, track = _track(lat, azimuth, length, deviation)
+        exact = ExactEngine().project(line, track.lon, track.lat)
+        fast = FastEngine().project(line, track.lon, track.lat)
+
+        error = np.abs(fast[1] - exact[1])
+        assert np.all(error <= 1e-4*np.abs(exact[1]) + tolerance)
+        # positions along the line are used for resampling only
+        assert np.all(np.abs(fast[0] - exact[0])
+                      <= 1e-3*np.abs(exact[0]) + tolerance)
+
+
+def test_fast_engine_measures():
+    line, track = _track(45, 60, 5e4, 100)
+    measures = list(available_measures.values())
+    exact = calculate_measures(track, line, measures)
+    fast = calculate_measures(track, line, measures, engine='fast')
+    for measure in measures:
+        assert fast[measure] == pytest.approx(exact[measure], rel=1e-3)
+
+
+def test_deviation_sign():
+    line = Line(Vector(10, 45), Vector(10, 46))  # heading north
+    for engine in engines.values():
+        x, y = engine().project(line, [10.01, 9.99], [45.5, 45.5])
+        assert y[0] > 0 > y[1]  # east is right of the line
+        assert x[0] == pytest.approx(55600, rel=1e-2)
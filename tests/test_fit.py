@@ -0,0 +1,101 @@
+import math
+
+import numpy as np
+import pytest
+
+from linesman.fit import convex_hull, fit_line, least_absolute_line, \
+    least_squares_line, min_width_line
+from linesman.geometry import Line, Vector
+from linesman.measure import MaxDeviation, AvgDeviation, SquareDeviationAvg, \
+    Measure, calculate_measures
+from linesman.track import Track
+
+
+def _distances(line, x, y):
+    p, d = line.point(0), line.direction
+    return np.abs(d.x*(y - p.y) - d.y*(x - p.x))/d.length()
+
+
+@pytest.fixture
+def cloud():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=500)*100
+    return x, 0.2*x + rng.normal(size=500)*5
+
+
+def test_convex_hull(cloud):
+    x, y = cloud
+    hull = convex_hull(x, y)
+    hx, hy = x[hull], y[hull]
+    for i in range(len(hull)):
+        a, b = i, (i + 1) % len(hull)
+        cross = (hx[b] - hx[a])*(y - hy[a]) - (hy[b] - hy[a])*(x - hx[a])
+        assert cross.min() > -1e-9  # counterclockwise, all points inside
+    assert set(hull) >= {np.argmin(x), np.argmax(x), np.argmin(y),
+                         np.argmax(y)}
+
+
+def test_convex_hull_degenerate():
+    assert list(convex_hull(np.array([1., 1.]), np.array([2., 2.]))) == [0]
+    x = np.array([0., 1., 2., 3.])
+    assert sorted(convex_hull(x, 2*x)) == [0, 3]
+
+
+def test_min_width_line(cloud):
+    x, y = cloud
+    width = _distances(min_width_line(x, y), x, y).max()
+    angles = np.linspace(0, math.pi, 20001)
+    brute = min(np.ptp(-math.sin(a)*x + math.cos(a)*y)/2 for a in angles)
+    assert width <= brute + 1e-9
+    assert math.isclose(width, brute, rel_tol=1e-4)
+
+
+def test_least_squares_line(cloud):
+    x, y = cloud
+    line = least_squares_line(x, y)
+    best = np.sum(_distances(line, x, y)**2)
+    for angle in (-1e-3, 1e-3):
+        p, d = line.point(0), line.direction
+        rotated = Line(p, p + Vector(d.x*math.cos(angle) - d.y*math.sin(angle),
+                                     d.x*math.sin(angle) + d.y*math.cos(angle)))
+        assert np.sum(_distances(rotated, x, y)**2) > best
+
+    assert least_squares_line(x, 3*x + 1) == Line(Vector(0, 1), Vector(1, 4))
+
+
+def test_least_absolute_line():
+    x = np.arange(100.)
+    y = np.zeros(100)
+    y[::10] = 50  # outliers pull the least squares line, not the L1 line
+    line = least_absolute_line(x, y)
+    assert np.median(_distances(line, x, y)) < 1e-3
+
+
+@pytest.mark.parametrize('measure', [MaxDeviation, AvgDeviation,
+                                     SquareDeviationAvg])
+@pytest.mark.parametrize('resample', [True, False])
+def test_fit_line(measure, resample):
+    rng = np.random.default_rng(1)
+    lon = np.linspace(10, 10.1, 300)
+    lat = 45 + 0.01*np.sin(lon*60) + rng.normal(size=300)*1e-4
+    lat[0] += 0.005  # bad first point, the default line is far off
+    track = Track(lon, lat)
+
+    result = fit_line(track, measure, resample=resample, spacing=10)
+    start = Line(track[0], track[-1])
+    initial = calculate_measures(track, start, [measure], resample, 10)
+    assert result.value < initial[measure]
+    assert math.isclose(
+        result.value, measure(track, result.line, resample, 10).calculate())
+
+    # a fitted line is a fixed point of the search
+    again = fit_line(track, measure, result.line, resample, spacing=10)
+    assert math.isclose(again.value, result.value, rel_tol=1e-6)
+
+
+def test_fit_line_unsupported():
+    class Custom(Measure):
+        desc = 'custom'
+
+    with pytest.raises(ValueError):
+        fit_line(Track([1, 2], [3, 4]), Custom)
@@ -0,0 +1,189 @@
+import gzip
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from linesman.formats import FIT_EPOCH, detect_format, fit_read_segments, \
+    geojson_read_segments, nmea_read_segments, read_track
+from linesman.parse import read_segments, read_track as parse_read_track
+
+
+def _semicircles(degrees):
+    return round(degrees/180*2**31)
+
+
+def _fit(records, big_endian=False):
+    """:return: FIT file with a file_id message and the given record values
+    (timestamp, lat, lon, altitude), None timestamps are compressed"""
+    order = '>' if big_endian else '<'
+    data = bytearray()
+    # file_id definition (local 1, developer fields) and message
+    data += struct.pack('<BBBHB', 0x60 | 1, 0, 0, 0, 1) + bytes([0, 1, 0])
+    data += bytes([1, 1, 7, 0])  # one developer field of 7 bytes
+    data += bytes([1, 4]) + b'devdata'
+    # record definition: timestamp, position_lat, position_long, altitude
+    data += struct.pack(order[0] + 'BBB', 0x40, 0, int(big_endian))
+    data += struct.pack(order + 'HB', 20, 4)
+    data += bytes([253, 4, 0x86, 0, 4, 0x85, 1, 4, 0x85, 2, 2, 0x84])
+    # record definition without timestamp for compressed timestamp headers
+    data += struct.pack(order[0] + 'BBB', 0x42, 0, int(big_endian))
+    data += struct.pack(order + 'HB', 20, 2)
+    data += bytes([0, 4, 0x85, 1, 4, 0x85])
+    last = None
+    for time, lat, lon, alt in records:
+        lat = 0x7FFFFFFF if lat is None else _semicircles(lat)
+        lon = 0x7FFFFFFF if lon is None else _semicircles(lon)
+        if time is None:
+            data += bytes([0x80 | (2 << 5) | ((last + 1) & 0x1F)])
+            data += struct.pack(order + 'ii', lat, lon)
+            last += 1
+        else:
+            data += bytes([0]) + struct.pack(
+                order + 'IiiH', time - FIT_EPOCH, lat, lon,
+                0xFFFF if alt is None else round((alt + 500)*5))
+            last = time - FIT_EPOCH
+    header = struct.pack('<BBHI4sH', 14, 0x20, 2132, len(data), b'.FIT', 0)
+    return header + bytes(data) + b'\x00\x00'
+
+
+RECORDS = [(1600000000, 50.0, 10.0, 100.0), (1600000001, None, None, None),
+           (1600000030, 50.001, 10.001, None), (None, 50.002, 10.002, None)]
+
+
+@pytest.mark.parametrize('big_endian', [False, True])
+def test_fit(big_endian):
+    data = _fit(RECORDS, big_endian)
+    assert detect_format(data) == 'fit'
+    [[track]] = fit_read_segments(data)
+    np.testing.assert_allclose(track.lat, [50, 50.001, 50.002], atol=1e-7)
+    np.testing.assert_allclose(track.lon, [10, 10.001, 10.002], atol=1e-7)
+    assert track.ele[0] == 100 and np.isnan(track.ele[1:]).all()
+    assert track.time.tolist() == [1600000000, 1600000030, 1600000031]
+
+    # chained files
+    [[track]] = fit_read_segments(data + _fit(RECORDS[:1]))
+    assert len(track) == 4
+    with pytest.raises(ValueError):
+        fit_read_segments(data[:-10])
+
+
+def _nmea(sentence):
+    checksum = 0
+    for char in sentence.encode():
+        checksum ^= char
+    return f'${sentence}*{checksum:02X}'
+
+
+NMEA = '\r\n'.join([
+    'garbage line',
+    _nmea('GPGGA,235959.00,5000.000,N,01000.000,E,1,08,0.9,545.4,M,46.9,M,,'),
+    _nmea('GPGSV,3,1,11,03,03,111,00,04,15,270,00,06,01,010,00,13,06,292,00'),
+    _nmea('GPRMC,235959.00,A,5000.000,N,01000.000,E,0.0,0.0,311220,,,A'),
+    _nmea('GPGGA,000000.00,5000.060,N,01000.060,E,1,08,0.9,546.0,M,46.9,M,,'),
+    _nmea('GPGGA,000001.00,5000.120,S,01000.120,W,0,08,0.9,546.0,M,46.9,M,,'),
+    _nmea('GPRMC,000002.00,V,5000.180,N,01000.180,E,0.0,0.0,010121,,,A'),
+    _nmea('GPGGA,000003.00,5000.240,N,01000.240,E,1,08,0.9,,M,46.9,M,,')[:-2]
+    + '00',
+    'GPGGA,000004.00,5000.300,N,01000.300,E,1,08,0.9,,M,46.9,M,,',
+    '$GPGGA,000005.00,5000.360,N,01000.360,E,1,08,0.9,,M,46.9,M,,',
+    _nmea('GPRMC,000006.00,A,5000.420,N,01000.420,W,0.0,0.0,010121,,,A'),
+]) + '\r\n'
+
+
+def test_nmea():
+    assert detect_format(NMEA.encode()) == 'nmea'
+    for chunk_size in (2**20, 50, 7):
+        [[track]] = nmea_read_segments(NMEA.encode(), chunk_size)
+        np.testing.assert_allclose(track.lat, [50, 50.001, 50.006, 50.007])
+        np.testing.assert_allclose(track.lon, [10, 10.001, 10.006, -10.007])
+        assert track.ele[:2].tolist() == [545.4, 546]
+        day = 1609372800  # 2020-12-31
+        assert track.time.tolist() == [day + 86399, day + 86400,
+                                       day + 86405, day + 86406]
+
+
+def test_nmea_rmc_midnight():
+    fixes = [('235958', '311220'), ('235959', '311220'),
+             ('000000', '010121'), ('000001', '010121')]
+    lines = [_nmea(f'GPRMC,{time}.00,A,5000.000,N,0100{i}.000,E,0,0,{date},'
+                   ',,A') for i, (time, date) in enumerate(fixes)]
+    [[track]] = nmea_read_segments('\n'.join(lines).encode())
+    assert (track.time - track.time[0]).tolist() == [0, 1, 2, 3]
+
+
+def test_nmea_without_date():
+    lines = [_nmea(f'GPGGA,12000{i}.00,5000.000,N,0100{i}.000,E,1,08,0.9,,M,,'
+                   'M,,') for i in range(3)]
+    [[track]] = nmea_read_segments('\n'.join(lines).encode())
+    assert len(track) == 3 and track.time is None and track.ele is None
+
+
+def test_geojson(capsys):
+    collection = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'properties': {
+            'coordTimes': ['2020-01-01T00:00:00Z', '2020-01-01T00:00:10Z']},
+         'geometry': {'type': 'LineString',
+                      'coordinates': [[10, 50, 100], [10.1, 50.1, 110]]}},
+        {'type': 'Feature', 'properties': None, 'geometry': {
+            'type': 'Point', 'coordinates': [10, 50]}},
+        {'type': 'Feature', 'properties': {}, 'geometry': {
+            'type': 'MultiLineString', 'coordinates': [
+                [[10, 50], [11, 51, 5]], [[12, 52], [13, 53]]]}},
+    ]}
+    data = json.dumps(collection).encode()
+    assert detect_format(data) == 'geojson'
+    tracks = geojson_read_segments(data)
+    assert [len(track) for track in tracks] == [1, 2]
+    first = tracks[0][0]
+    assert first.lon.tolist() == [10, 10.1]
+    assert first.ele.tolist() == [100, 110]
+    assert first.time[1] - first.time[0] == 10
+    assert tracks[1][0].lat.tolist() == [50, 51]
+    assert np.isnan(tracks[1][0].ele[0]) and tracks[1][1].ele is None
+
+    assert len(read_track(data, 'geojson')) == 2
+    assert 'multiple tracks' in capsys.readouterr().out
+    for coordinates in ('[[1, 2], [3]]', '[[1, null], [3, 4]]',
+                        '[[1, "a"], [3, 4]]', '5', '[1, 2]'):
+        with pytest.raises(ValueError):
+            geojson_read_segments(
+                f'{{"type": "LineString", "coordinates": {coordinates}}}'
+                .encode()
+            )
+    with pytest.raises(ValueError):
+        geojson_read_segments(b'{"type": "MultiLineString", "coordinates": 5}')
+    with pytest.raises(ValueError):
+        geojson_read_segments(b'{"type": "Point", "coordinates": [1, 2]}')
+    with pytest.raises(ValueError):
+        geojson_read_segments(b'{"type": ')
+
+
+def test_geojson_times():
+    line = {'type': 'Feature', 'properties': {'coordTimes': [
+        '2020-01-01T00:00:00Z', '2020-01-01T01:00:00+01:00',
+        '2020-01-01 00:00:10', 'invalid']},
+        'geometry': {'type': 'LineString',
+                     'coordinates': [[10, 50], [11, 51], [12, 52], [13, 53]]}}
+    [[track]] = geojson_read_segments(json.dumps(line).encode())
+    assert track.time[:3].tolist() == [1577836800, 1577836800, 1577836810]
+    assert np.isnan(track.time[3])
+
+
+def test_parse_dispatch(tmp_path):
+    fit = tmp_path / 'ride'
+    fit.write_bytes(_fit(RECORDS))
+    nmea = tmp_path / 'log.nmea.gz'
+    with gzip.open(nmea, 'wb') as f:
+        f.write(NMEA.encode())
+    geojson = tmp_path / 'route.geojson'
+    geojson.write_text(json.dumps({'type': 'LineString',
+                                   'coordinates': [[10, 50], [11, 51]]}))
+
+    assert detect_format(str(fit)) == 'fit'
+    assert detect_format(str(nmea)) == 'nmea'
+    assert len(parse_read_track(str(fit))) == 3
+    assert len(parse_read_track(str(nmea))) == 4
+    [[track]] = read_segments(str(geojson))
+    assert track.lat.tolist() == [50, 51] and track.time is None
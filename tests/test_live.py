@@ -0,0 +1,88 @@
+import io
+
+import numpy as np
+import pytest
+
+from linesman import live
+from linesman.geometry import Line, Vector
+from linesman.live import LiveEvaluation, follow
+from linesman.measure import calculate_measures, MaxDeviation, AvgDeviation, \
+    MedianDeviation, SquareDeviationAvg
+from linesman.track import Track
+
+MEASURES = [MaxDeviation, AvgDeviation, SquareDeviationAvg]
+GGA = '$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\n'
+RMC = '$GPRMC,123520,A,4807.538,N,01131.500,E,022.4,084.4,230394,003.1,W*60\n'
+
+
+@pytest.fixture
+def track():
+    rng = np.random.default_rng(3)
+    lon = np.linspace(10, 10.1, 500)
+    lat = 50 + rng.normal(0, 1e-4, 500)
+    return Track(lon, lat)
+
+
+@pytest.mark.parametrize('resample', [True, False])
+def test_live_evaluation(track, resample):
+    line = Line(Vector(10, 50), Vector(10.1, 50))
+    evaluation = LiveEvaluation(line, MEASURES, resample, spacing=5)
+    for p in track[:100]:
+        evaluation.append(p.x, p.y)
+    evaluation.extend(track.lon[100:], track.lat[100:])
+
+    expected = calculate_measures(track, line, MEASURES, resample, spacing=5)
+    assert evaluation.count == 500
+    for measure, result in evaluation.results.items():
+        assert abs(result/expected[measure] - 1) < 1e-9
+
+
+def test_live_evaluation_invalid_spacing():
+    with pytest.raises(ValueError, match='.*must be positive.*'):
+        LiveEvaluation(Line(Vector(0, 0), Vector(1, 1)), spacing=-1)
+
+
+def test_follow_gpx(tmp_path):
+    path = tmp_path / 'live.gpx'
+    # incomplete gpx file, as written by a logger during recording
+    path.write_text('<gpx><trk><trkseg><trkpt lat="1" lon="2"></trkpt>'
+                    '<trkpt lat="3" lon="4"><ele>1</ele></trkpt><trkpt lat')
+    chunks = list(follow(str(path), poll_interval=0, idle_timeout=0))
+    assert len(chunks) == 1
+    np.testing.assert_array_equal(chunks[0][0], [2, 4])
+    np.testing.assert_array_equal(chunks[0][1], [1, 3])
+
+
+def test_follow_nmea(tmp_path):
+    path = tmp_path / 'live.nmea'
+    path.write_text(GGA + '$GPGSV,invalid\n' + RMC + RMC[:20])
+    chunks = list(follow(str(path), poll_interval=0, idle_timeout=0))
+    assert len(chunks) == 1
+    lon, lat = chunks[0]
+    assert len(lon) == 2
+    assert abs(lat[0] - (48 + 7.038/60)) < 1e-12
+    assert abs(lon[1] - (11 + 31.5/60)) < 1e-12
+
+
+def test_live_run(tmp_path):
+    path = tmp_path / 'live.nmea'
+    path.write_text(GGA + RMC)
+    out = io.StringIO()
+    status = live.run([str(path), '--line', '48.1,11.5;48.2,11.6', '-m', 'MAX',
+                       '--poll', '0', '--idle-timeout', '0'], out=out)
+    assert status == 0
+    assert out.getvalue().startswith('2 points: MAX ')
+
+
+def test_live_default_measures(track):
+    line = Line(Vector(10, 50), Vector(10.1, 50))
+    evaluation = LiveEvaluation(line)
+    assert evaluation.measures == list(live.DEFAULT_MEASURES.values())
+    assert MedianDeviation not in evaluation.measures
+
+    evaluation = LiveEvaluation(line, [MaxDeviation, MedianDeviation])
+    evaluation.extend(track.lon[:100], track.lat[:100])
+    results = evaluation.results
+    assert evaluation.results == results
+    evaluation.extend(track.lon[100:], track.lat[100:])
+    assert evaluation.results != results
@@ -0,0 +1,213 @@
+import math
+
+import numpy as np
+import pytest
+
+from linesman.accumulator import Accumulator, DeviationBlock, \
+    CountAccumulator, MaxAccumulator, SumAccumulator, SquareSumAccumulator, \
+    QuantileSketch
+from linesman.geometry import Line, Vector
+from linesman.measure import accumulate, calculate_measures, \
+    evaluate_segments, required_accumulators, Measure, MaxDeviation, \
+    AvgDeviation, SquareDeviationAvg, QuantileDeviation, MedianDeviation, \
+    P99Deviation
+from linesman.track import Track
+
+ACCUMULATORS = (CountAccumulator, MaxAccumulator, SumAccumulator,
+                SquareSumAccumulator)
+
+
+def test_accumulate():
+    y = np.array([1.0, -3.0, 2.0])
+    acc = accumulate(np.arange(3.0), y, ACCUMULATORS, block_size=2)
+    assert acc[CountAccumulator].value == 3
+    assert acc[MaxAccumulator].value == 3
+    assert acc[SumAccumulator].value == 6
+    assert acc[SquareSumAccumulator].value == 14
+
+
+def test_accumulate_empty():
+    acc = accumulate(np.empty(0), np.empty(0), ACCUMULATORS)
+    assert acc[CountAccumulator].value == 0
+    assert math.isnan(acc[MaxAccumulator].value)
+    assert acc[SumAccumulator].value == 0
+
+
+def test_accumulator_merge():
+    rng = np.random.default_rng(1)
+    y = rng.normal(0, 1000, 10000)
+    x = np.arange(10000.0)
+    whole = accumulate(x, y, ACCUMULATORS, block_size=64)
+    first = accumulate(x[:6400], y[:6400], ACCUMULATORS, block_size=64)
+    second = accumulate(x[6400:], y[6400:], ACCUMULATORS, block_size=64)
+    for cls in ACCUMULATORS:
+        second[cls].merge(first[cls])
+        assert second[cls].value == whole[cls].value
+
+
+def test_exact_sum():
+    acc = SumAccumulator()
+    for value in (1e16, 1.0, -1.0):
+        acc.update(DeviationBlock(np.array([value])))
+    assert acc.value == 1e16 + 2  # naive summation yields 1e16
+
+
+def test_required_accumulators():
+    required = required_accumulators([AvgDeviation, SquareDeviationAvg])
+    assert required == [SumAccumulator, CountAccumulator, SquareSumAccumulator]
+
+
+def test_calculate_measures():
+    track = Track([1, 1, 2], [1, 2, 2])
+    line = Line(Vector(1, 1), Vector(2, 2))
+    measures = [MaxDeviation, AvgDeviation, SquareDeviationAvg]
+    results = calculate_measures(track, line, measures, resample=False)
+    for measure in measures:
+        assert results[measure] == measure(track, line, False).calculate()
+
+
+def test_evaluate_segments():
+    segments = [Track([1, 1.5], [1, 1.2]), Track([1.6, 1.8], [1.7, 1.5]),
+                Track([], [])]
+    other = Track([2, 2.5, 3], [2, 2.1, 2.9])
+    line = Line(Vector(1, 1), Vector(3, 3))
+    measures = [MaxDeviation, AvgDeviation, SquareDeviationAvg]
+    results = evaluate_segments([segments, [other]], line, measures,
+                                spacing=100, workers=2)
+
+    for track, track_results in zip([segments, [other]], results.segments):
+        for segment, result in zip(track, track_results):
+            if len(segment):
+                assert result == calculate_measures(segment, line, measures,
+                                                    spacing=100)
+    assert math.isnan(results.segments[0][2][AvgDeviation])
+    assert results.tracks[1] == results.segments[1][0]
+
+    # combined results aggregate the segments without the gaps between them
+    max_ = [r[MaxDeviation] for r in results.segments[0][:2]]
+    assert results.tracks[0][MaxDeviation] == max(max_)
+    assert results.total[MaxDeviation] == max(max_ + [
+        results.tracks[1][MaxDeviation]])
+    grid = [Measure(t, line, spacing=100) for t in segments[:2] + [other]]
+    acc = [g.accumulate([SumAccumulator, CountAccumulator]) for g in grid]
+    total = sum(a[SumAccumulator].value for a in acc)
+    count = sum(a[CountAccumulator].value for a in acc)
+    assert math.isclose(results.total[AvgDeviation], total/count)
+
+
+class _NegativeCount(Accumulator):
+    def __init__(self):
+        self.count = 0
+
+    def update(self, block):
+        self.count += int(np.sum(block.y < 0))
+
+    def merge(self, other):
+        self.count += other.count
+
+    @property
+    def value(self):
+        return self.count
+
+
+class _LeftShare(Measure):
+    accumulators = (_NegativeCount, CountAccumulator)
+
+    @classmethod
+    def from_accumulators(cls, acc):
+        return acc[_NegativeCount].value/acc[CountAccumulator].value
+
+
+def test_custom_measure():
+    track = Track([1, 1, 2, 1.5], [1, 2, 2, 1.5])
+    line = Line(Vector(1, 1), Vector(2, 2))
+    results = calculate_measures(track, line, [_LeftShare, MaxDeviation],
+                                 resample=False)
+    assert results[_LeftShare] == _LeftShare(track, line, False).calculate()
+    assert 0 < results[_LeftShare] < 1
+
+
+def test_accumulate_resampled():
+    x = np.array([0, 2.5, 1.2, 4])
+    y = np.array([0, 2.5, -1.2, 0])
+    for block_size in (1, 2, 100):
+        acc = accumulate(x, y, ACCUMULATORS, spacing=1, block_size=block_size)
+        assert acc[CountAccumulator].value == 6
+        assert acc[MaxAccumulator].value == 2.5  # from the recorded points
+        assert abs(acc[SumAccumulator].value - 5.3626374) < 1e-6
+
+
+class _SmallSketch(QuantileSketch):
+    exact_limit = 100
+    relative_accuracy = 0.01
+
+
+class _SketchedP95(QuantileDeviation):
+    quantile = 0.95
+    accumulators = (_SmallSketch,)
+
+
+def _sketch(cls, *blocks):
+    sketch = cls()
+    for y in blocks:
+        sketch.update(DeviationBlock(np.asarray(y, dtype=float)))
+    return sketch
+
+
+def test_quantile_sketch_exact():
+    sketch = _sketch(QuantileSketch, [3, -1, 2], [-5, 4])
+    assert sketch.quantile(0) == 1
+    assert sketch.quantile(0.5) == sketch.value == 3
+    assert sketch.quantile(0.9) == 4
+    assert sketch.quantile(1) == 5
+    edges, counts = sketch.histogram(2)
+    assert edges.tolist() == [0, 2, 4]
+    assert counts.tolist() == [1, 2, 2]
+    assert math.isnan(QuantileSketch().quantile(0.5))
+    with pytest.raises(ValueError):
+        sketch.quantile(1.5)
+    with pytest.raises(ValueError):
+        sketch.histogram(0)
+
+
+def test_quantile_sketch_accuracy():
+    rng = np.random.default_rng(0)
+    y = np.concatenate((rng.lognormal(0, 2, 20000), np.zeros(1000)))
+    sketch = _sketch(_SmallSketch, *np.array_split(y, 7))
+    values = np.sort(y)
+    for q in (0, 0.01, 0.05, 0.5, 0.9, 0.99, 1):
+        exact = values[math.floor(q*(len(y) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.01*exact
+    # bounded number of buckets
+    assert len(sketch._buckets) < math.log(values[-1]/1e-4)/0.02 + 1
+    edges, counts = sketch.histogram(1)
+    assert counts.sum() == len(y)
+    assert edges[0] == 0 and counts[0] >= 1000
+
+
+def test_quantile_sketch_merge():
+    rng = np.random.default_rng(1)
+    parts = [rng.normal(0, 3, n) for n in (30, 90, 500, 10)]
+    serial = _sketch(_SmallSketch, *parts)
+    for order in ([0, 1, 2, 3], [3, 2, 1, 0], [1, 3, 0, 2]):
+        merged = _SmallSketch()
+        for i in order:
+            merged.merge(_sketch(_SmallSketch, parts[i]))
+        for q in (0.1, 0.5, 0.95):
+            assert merged.quantile(q) == serial.quantile(q)
+    # exact below the limit, regardless of merging
+    a, b = _sketch(_SmallSketch, parts[0]), _sketch(_SmallSketch, parts[3])
+    a.merge(b)
+    assert a.quantile(0.5) == np.sort(np.abs(
+        np.concatenate((parts[0], parts[3]))))[19]
+
+
+def test_quantile_measures():
+    lon = 10 + np.linspace(0, 0.1, 1000)
+    lat = 50 + 1e-5*np.sin(np.linspace(0, 30, 1000))
+    track, line = Track(lon, lat), Line(Vector(10, 50), Vector(10.1, 50))
+    results = calculate_measures(
+        track, line, [MaxDeviation, MedianDeviation, P99Deviation,
+                      _SketchedP95])
+    assert 0 < results[MedianDeviation] < results[_SketchedP95] \
+        < results[P99Deviation] <= results[MaxDeviation]
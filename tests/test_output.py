@@ -0,0 +1,38 @@
+import io
+import json
+
+from linesman import output
+
+
+def test_writers():
+    columns = ['name', 'value', 'error']
+    rows = [{'name': 'a', 'value': 1.5, 'error': None},
+            {'name': 'b', 'value': float('nan')},
+            {'name': 'c', 'error': 'broken'}]
+
+    out = io.StringIO()
+    writer = output.writers['csv'](out, columns)
+    for row in rows:
+        writer.write(row)
+    assert out.getvalue().splitlines() == ['name,value,error', 'a,1.5,',
+                                           'b,nan,', 'c,,broken']
+
+    out = io.StringIO()
+    writer = output.writers['jsonl'](out, columns)
+    for row in rows:
+        writer.write(row)
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+        {'name': 'a', 'value': 1.5, 'error': None},
+        {'name': 'b', 'value': None},
+        {'name': 'c', 'error': 'broken'},
+    ]
+
+
+def test_warnings_on_stderr(capsys):
+    output.warn('first')
+    with output.warnings_on_stderr():
+        output.warn('second')
+    output.warn('third')
+    captured = capsys.readouterr()
+    assert captured.out == 'Warning: first\nWarning: third\n'
+    assert captured.err == 'Warning: second\n'
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from linesman.geometry import Line, Vector
+from linesman.measure import BLOCK_SIZE, available_measures, \
+    calculate_measures
+from linesman import parallel
+from linesman.parallel import chunk_bounds, parallel_measures
+from linesman.track import Track
+
+
+def test_chunk_bounds():
+    assert chunk_bounds(10, 3, block_size=4) == [(0, 4), (4, 8), (8, 10)]
+    assert chunk_bounds(10, 2, block_size=4) == [(0, 8), (8, 10)]
+    assert chunk_bounds(3, 8, block_size=4) == [(0, 3)]
+    assert chunk_bounds(0, 2) == []
+
+
+@pytest.mark.parametrize('engine', ['exact', 'fast'])
+@pytest.mark.parametrize('resample', [True, False])
+def test_parallel_measures(engine, resample):
+    n = 2*BLOCK_SIZE + 1000
+    rng = np.random.default_rng(0)
+    track = Track(np.linspace(10, 10.5, n) + rng.normal(0, 1e-5, n),
+                  50 + rng.normal(0, 1e-5, n))
+    line = Line(Vector(10, 50), Vector(10.5, 50.001))
+    measures = list(available_measures.values())
+
+    serial = calculate_measures(track, line, measures, resample,
+                                engine=engine)
+    parallel = parallel_measures(track, line, measures, resample,
+                                 engine=engine, workers=2)
+    assert parallel == serial  # exactly
+
+
+def test_parallel_measures_small():
+    track = Track([10, 10.001, 10.002], [50, 50.001, 50])
+    line = Line(Vector(10, 50), Vector(10.002, 50))
+    measures = list(available_measures.values())
+    assert parallel_measures(track, line, measures, workers=3) == \
+        calculate_measures(track, line, measures)
+
+
+def test_parallel_measures_without_shared_memory(monkeypatch):
+    # python < 3.8
+    monkeypatch.setattr(parallel, 'shared_memory', None)
+    n = BLOCK_SIZE + 1000
+    track = Track(np.linspace(10, 10.5, n),
+                  50 + 1e-3*np.sin(np.linspace(0, 20, n)))
+    line = Line(Vector(10, 50), Vector(10.5, 51))
+    measures = list(available_measures.values())
+    assert parallel_measures(track, line, measures, workers=2) == \
+        calculate_measures(track, line, measures)
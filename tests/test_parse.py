@@ -1,13 +1,24 @@
 import argparse
+import bz2
+from datetime import datetime, timezone
+import gzip
+import lzma
+import math
 import os
 import tempfile
 import uuid
 
+import numpy as np
 import pytest
-from gpxpy.gpx import GPX, GPXTrackPoint, GPXXMLSyntaxException
+from gpxpy.gpx import GPX, GPXTrack, GPXTrackPoint, GPXTrackSegment, \
+    GPXXMLSyntaxException
 
 from linesman.geometry import Vector
-from linesman.parse import latlon_str, latlon_pair_str, gpx_file, gpx_extract_points
+from linesman import gpx
+from linesman.gpx import gpx_file, gpx_extract_points, \
+    gpx_extract_segments, gpx_iter_chunks, gpx_read_segments, gpx_read_track
+from linesman.parse import latlon_str, latlon_pair_str, nmea_fix, \
+    nmea_position, read_decompressed
 
 
 @pytest.fixture
@@ -77,4 +88,158 @@ def test_gpx_extract_points(gpx_obj):
     segment.points.append(GPXTrackPoint(2, 2))
 
     points = gpx_extract_points(gpx_obj)
-    assert points == [Vector(1, 1), Vector(1, 2), Vector(2, 2)]
+    assert list(points) == [Vector(1, 1), Vector(1, 2), Vector(2, 2)]
+    assert points.lon.dtype == np.float64
+    assert points.ele is None and points.time is None
+
+
+def test_gpx_extract_points_ele_time(gpx_obj):
+    segment = gpx_obj.tracks[0].segments[0]
+    time = datetime(2021, 1, 1, 12, tzinfo=timezone.utc)
+    segment.points.append(GPXTrackPoint(1, 1, elevation=100, time=time))
+    segment.points.append(GPXTrackPoint(2, 1))
+
+    points = gpx_extract_points(gpx_obj)
+    assert points.ele[0] == 100 and np.isnan(points.ele[1])
+    assert points.time[0] == time.timestamp() and np.isnan(points.time[1])
+
+
+@pytest.fixture
+def gpx_xml(gpx_obj):
+    segment = gpx_obj.tracks[0].segments[0]
+    time = datetime(2021, 1, 1, 12, tzinfo=timezone.utc)
+    segment.points.append(GPXTrackPoint(1, 1, elevation=10, time=time))
+    segment.points.append(GPXTrackPoint(2, 1))
+    second = GPXTrackSegment()
+    second.points.append(GPXTrackPoint(2, 2, elevation=12))
+    gpx_obj.tracks[0].segments.append(second)
+    return gpx_obj.to_xml()
+
+
+@pytest.mark.filterwarnings('error::ResourceWarning',
+                            'error::pytest.PytestUnraisableExceptionWarning')
+@pytest.mark.parametrize('opener', [open, gzip.open, bz2.open, lzma.open])
+def test_gpx_read_track(gpx_xml, gpx_obj, temp_file_path, opener):
+    with opener(temp_file_path, 'wb') as f:
+        f.write(gpx_xml.encode('utf-8'))
+
+    track = gpx_read_track(temp_file_path)
+    expected = gpx_extract_points(gpx_obj)
+    assert list(track) == list(expected)
+    np.testing.assert_array_equal(track.ele, expected.ele)
+    np.testing.assert_array_equal(track.time, expected.time)
+
+    assert list(gpx_file(temp_file_path).tracks[0].segments[1].points)
+
+
+@pytest.mark.parametrize('opener', [gzip.open, bz2.open, lzma.open])
+def test_gpx_read_track_corrupt_archive(gpx_xml, temp_file_path, opener):
+    with opener(temp_file_path, 'wb') as f:
+        f.write(gpx_xml.encode('utf-8'))
+    with open(temp_file_path, 'rb') as f:
+        data = f.read()
+    with open(temp_file_path, 'wb') as f:
+        f.write(data[:len(data)//2])
+
+    with pytest.raises(ValueError, match='Corrupt compressed file'):
+        gpx_read_track(temp_file_path)
+    with pytest.raises(ValueError, match='Corrupt compressed file'):
+        gpx_read_track(data[:len(data)//2])
+
+
+def test_read_decompressed(gpx_xml):
+    data = gpx_xml.encode()
+    assert read_decompressed(data, len(data)) == data
+    assert read_decompressed(gzip.compress(data), len(data)) == data
+    for compressed in (gzip.compress(data), bz2.compress(b' ' * 10**6)):
+        with pytest.raises(ValueError):
+            read_decompressed(compressed, len(data) - 1)
+    with pytest.raises(ValueError):
+        read_decompressed(gzip.compress(gzip.compress(data)), 10**6)
+
+
+def test_gpx_iter_chunks(gpx_xml, temp_file_path):
+    with open(temp_file_path, 'w') as f:
+        f.write(gpx_xml)
+
+    chunks = list(gpx_iter_chunks(temp_file_path, chunk_size=2))
+    assert [len(c) for c in chunks] == [2, 1]
+    assert chunks[0].time[0] == datetime(2021, 1, 1, 12,
+                                         tzinfo=timezone.utc).timestamp()
+    assert np.isnan(chunks[0].time[1])
+
+
+def test_gpx_read_track_multiple_tracks(gpx_xml, gpx_obj, temp_file_path,
+                                        capsys):
+    second = GPXTrack()
+    second.segments.append(GPXTrackSegment())
+    second.segments[0].points.append(GPXTrackPoint(5, 5))
+    gpx_obj.tracks.append(second)
+    with open(temp_file_path, 'w') as f:
+        f.write(gpx_obj.to_xml())
+
+    track = gpx_read_track(temp_file_path)
+    assert len(track) == 3
+    assert 'multiple tracks, defaulting to first one' in capsys.readouterr().out
+
+
+def test_gpx_read_segments(gpx_xml, gpx_obj, temp_file_path):
+    second = GPXTrack()
+    second.segments.append(GPXTrackSegment())
+    second.segments.append(GPXTrackSegment())
+    second.segments[1].points.append(GPXTrackPoint(5, 5))
+    gpx_obj.tracks.append(second)
+    with open(temp_file_path, 'w') as f:
+        f.write(gpx_obj.to_xml())
+
+    tracks = gpx_read_segments(temp_file_path, chunk_size=1)
+    assert [[len(s) for s in track] for track in tracks] == [[2, 1], [0, 1]]
+    assert list(tracks[1][1]) == [Vector(5, 5)]
+    assert tracks[0][1].ele[0] == 12 and tracks[0][1].time is None
+    assert tracks[1][1].ele is None
+
+    expected = gpx_extract_segments(gpx_obj)
+    for track, expected_track in zip(tracks, expected):
+        assert [list(s) for s in track] == [list(s) for s in expected_track]
+
+
+def test_gpx_read_track_no_tracks(temp_file_path):
+    with open(temp_file_path, 'w') as f:
+        f.write(GPX().to_xml())
+
+    with pytest.raises(ValueError, match='.*?at least one track.*'):
+        gpx_read_track(temp_file_path)
+
+
+def test_gpx_read_track_invalid_syntax(temp_file_path):
+    with pytest.raises(GPXXMLSyntaxException):
+        gpx_read_track(temp_file_path)
+
+
+def test_nmea_position():
+    gga = '$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47'
+    assert nmea_position(gga) == Vector(11 + 31/60, 48 + 7.038/60)
+    rmc = '$GNRMC,123519,A,4807.038,S,01131.000,W,022.4,084.4,230394,003.1,W'
+    assert nmea_position(rmc) == Vector(-11 - 31/60, -48 - 7.038/60)
+
+    assert nmea_fix(gga[1:-3].split(','))[2:] == (545.4, '')
+    lon, lat, altitude, date = nmea_fix(rmc[1:].split(','))
+    assert math.isnan(altitude) and date == '230394'
+
+
+def test_nmea_position_invalid():
+    # wrong checksum
+    assert nmea_position('$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,'
+                         'M,46.9,M,,*48') is None
+    # no fix
+    assert nmea_position('$GPGGA,123519,,,,,0,00,,,M,,M,,') is None
+    assert nmea_position('$GPRMC,123519,V,4807.038,N,01131.000,E,,,,,') is None
+    assert nmea_position('$GPGSV,2,1,08,01,40,083,46') is None
+    assert nmea_position('no sentence') is None
+
+
+def test_gpx_functions_available_from_parse():
+    from linesman import parse
+    assert parse.gpx_read_track is gpx.gpx_read_track
+    with pytest.raises(AttributeError):
+        parse.no_such_function
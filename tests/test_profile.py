@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+import math
+
+import numpy as np
+import pytest
+from gpxpy.gpx import GPXTrackPoint
+
+from linesman import profile
+from linesman.profile import deviation_profile, rolling_max, worst_windows
+
+
+@pytest.mark.filterwarnings('ignore:All-NaN slice')
+def test_rolling_max():
+    values = np.random.default_rng(0).normal(size=200)
+    values[[3, 4, 5]] = np.nan
+    for window in (1, 2, 7, 200):
+        expected = [np.nanmax(values[i:i + window])
+                    for i in range(len(values) - window + 1)]
+        np.testing.assert_array_equal(rolling_max(values, window), expected)
+    assert np.isnan(rolling_max(values, 3)[3])
+
+
+def test_deviation_profile():
+    x = np.array([0, 5, 12, 18, 25, 31, 39.])
+    y = np.array([1, -2, 3, -1, 4, 0, 2.])
+    p = deviation_profile(x, y, 20, 10, spacing=None)
+
+    np.testing.assert_array_equal(p.start, [0, 10, 20])
+    np.testing.assert_array_equal(p.end, [20, 30, 40])
+    np.testing.assert_array_equal(p.max, [3, 4, 4])
+    np.testing.assert_array_equal(p.count, [4, 3, 3])
+    assert p.mean[0] == pytest.approx((1 + 2 + 3 + 1)/4)
+    assert p.rms[1] == pytest.approx(math.sqrt((9 + 1 + 16)/3))
+    assert worst_windows(p) == {'max': 1, 'mean': 1, 'rms': 1}
+
+
+def test_deviation_profile_resampled():
+    x = np.array([0, 10, 20, 30.])
+    y = np.array([0, 10, 0, 10.])
+    p = deviation_profile(x, y, 10, spacing=1)
+    # windows are half-open, the last point starts a window of its own
+    np.testing.assert_array_equal(p.count, [10, 10, 10, 0])
+    np.testing.assert_allclose(p.mean, [4.5, 5.5, 4.5, np.nan])
+    # the maximum includes recorded points the resampled track doesn't
+    np.testing.assert_array_equal(p.max, [9, 10, 9, 10])
+
+
+def test_deviation_profile_backwards():
+    x = np.array([0, 15, 5, 25.])
+    y = np.array([1, 7, -9, 2.])
+    p = deviation_profile(x, y, 10, spacing=None)
+    np.testing.assert_array_equal(p.max, [9, 7, 2])
+    np.testing.assert_array_equal(p.count, [2, 1, 1])
+
+
+def test_deviation_profile_short_track():
+    p = deviation_profile(np.array([0, 3.]), np.array([1, 2.]), 1000, 100,
+                          spacing=None)
+    assert list(p.start) == [0] and list(p.end) == [100]
+    assert p.max[0] == 2
+
+
+def test_deviation_profile_edges():
+    # positions off a bin edge by rounding are counted in the bin starting
+    # there
+    x = np.array([-1e-9, 250, 500 - 1e-7, 750, 1000.])
+    p = deviation_profile(x, np.ones(5), 500, spacing=None)
+    np.testing.assert_array_equal(p.start, [0, 500, 1000])
+    np.testing.assert_array_equal(p.count, [2, 2, 1])
+
+
+def test_run_track_starting_on_line(gpx_obj, tmp_path):
+    # the first point is projected to slightly before the start of the line
+    segment = gpx_obj.tracks[0].segments[0]
+    for lat, lon in ((-17.68606310546155, -8.06716074979326),
+                     (-17.67, -8.07),
+                     (-17.661211727765675, -8.084631880172745)):
+        segment.points.append(GPXTrackPoint(lat, lon))
+    path = tmp_path / 'track.gpx'
+    path.write_text(gpx_obj.to_xml())
+    out = io.StringIO()
+    profile.run([str(path), '--window', '500', '--no-resample'], out=out)
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert float(rows[0]['start']) == 0 and rows[0]['count'] == '1'
+
+
+@pytest.mark.parametrize('window, step', [(0, None), (10, -1), (10, 3),
+                                          (10, 20)])
+def test_deviation_profile_invalid_window(window, step):
+    with pytest.raises(ValueError):
+        deviation_profile(np.array([0, 1.]), np.array([0, 1.]), window, step)
+
+
+@pytest.fixture
+def gpx_path(gpx_obj, tmp_path):
+    segment = gpx_obj.tracks[0].segments[0]
+    for lat, lon in ((0, 0), (0.001, 0.01), (0, 0.02), (0, 0.03)):
+        segment.points.append(GPXTrackPoint(lat, lon))
+    path = tmp_path / 'track.gpx'
+    path.write_text(gpx_obj.to_xml())
+    return str(path)
+
+
+def test_run_csv(gpx_path, capsys):
+    out = io.StringIO()
+    assert profile.run([gpx_path, '--window', '1000', '--step', '500'],
+                       out=out) == 0
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert len(rows) == 6
+    assert float(rows[0]['start']) == 0 and float(rows[0]['end']) == 1000
+    worst = max(rows, key=lambda row: float(row['max']))
+    assert float(worst['max']) == pytest.approx(110.6, abs=0.5)
+    assert 'Worst window by max' in capsys.readouterr().err
+
+
+def test_run_jsonl(gpx_path):
+    out = io.StringIO()
+    profile.run([gpx_path, '--window', '5000', '--format', 'jsonl',
+                 '--no-resample'], out=out)
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert set(rows[0]) == {'start', 'end', 'max', 'mean', 'rms', 'count'}
+    assert sum(row['count'] for row in rows) == 4
@@ -1,6 +1,11 @@
+import threading
+
 from geographiclib.geodesic import Geodesic
+import numpy as np
+import pytest
 
-from linesman.geo import mercator_project
+from linesman.geo import mercator_project, mercator_project_arrays, \
+    mercator_unproject, TransformerCache, CacheInfo
 from linesman.geometry import Vector, Line
 
 
@@ -14,3 +19,93 @@ def test_mercator_project():
 
     res = list(mercator_project(start, azimuth, points, ellps='clrk66'))
     assert abs(res[0].y - v) < 10e-8
+
+
+def test_mercator_project_arrays():
+    start = Vector(-77.7610558, 36.0)
+    azimuth = 14.3394883
+    lon = np.array([-76.8707953, -77.7610558])
+    lat = np.array([38.8092128, 36.0])
+    v = -2356.2521612049804
+
+    x, y = mercator_project_arrays(start, azimuth, lon, lat, ellps='clrk66')
+    assert x.dtype == np.float64 and y.dtype == np.float64
+    assert abs(y[0] - v) < 10e-8
+    assert abs(x[1]) < 10e-8 and abs(y[1]) < 10e-8
+
+
+def test_mercator_project_matches_arrays():
+    start = Vector(10, 50)
+    points = [Vector(10.1, 50.2), Vector(10.3, 50.1), Vector(9.8, 49.9)]
+    lon = np.array([p.x for p in points])
+    lat = np.array([p.y for p in points])
+
+    x, y = mercator_project_arrays(start, 30, lon, lat)
+    res = list(mercator_project(start, 30, points))
+    assert [p.x for p in res] == list(x)
+    assert [p.y for p in res] == list(y)
+
+
+@pytest.mark.parametrize('azimuth', [30, 135, 200, -100])
+def test_mercator_project_arrays_azimuth(azimuth):
+    """Points on the geodesic have y = 0 and x = distance from the origin."""
+    line = Geodesic.WGS84.DirectLine(50, 10, azimuth, 1e5)
+    points = [line.Position(s) for s in (-2e4, 3e4, 1e5)]
+    lon = np.array([p['lon2'] for p in points])
+    lat = np.array([p['lat2'] for p in points])
+
+    x, y = mercator_project_arrays(Vector(10, 50), azimuth, lon, lat)
+    assert np.all(np.abs(y) < 1e-3)
+    assert x == pytest.approx([-2e4, 3e4, 1e5], abs=1e-2)
+
+
+@pytest.mark.parametrize('azimuth', [30, 135, -100])
+def test_mercator_unproject(azimuth):
+    origin = Vector(10, 50)
+    lon, lat = np.array([10.2, 9.7]), np.array([50.3, 49.8])
+    x, y = mercator_project_arrays(origin, azimuth, lon, lat)
+    lon2, lat2 = mercator_unproject(origin, azimuth, x, y)
+    assert lon2 == pytest.approx(lon, abs=1e-9)
+    assert lat2 == pytest.approx(lat, abs=1e-9)
+
+
+def test_mercator_project_arrays_shape_mismatch():
+    with pytest.raises(ValueError, match='.*same shape.*'):
+        mercator_project_arrays(Vector(0, 0), 45, [1, 2], [1])
+
+
+def test_transformer_cache():
+    cache = TransformerCache(maxsize=2)
+    a, b, c = Vector(0, 0), Vector(1, 1), Vector(2, 2)
+
+    t = cache.get(a, 10)
+    assert cache.get(a, 10) is t
+    assert cache.get(a, 10, ellps='clrk66') is not t
+    assert cache.info() == CacheInfo(hits=1, misses=2, maxsize=2, currsize=2)
+
+    # least recently used entry (a, 10, clrk66) is evicted
+    cache.get(a, 10)
+    cache.get(b, 10)
+    assert cache.get(a, 10) is t
+    cache.get(a, 10, ellps='clrk66')
+    assert cache.info().misses == 4
+
+    cache.clear()
+    assert cache.info() == CacheInfo(hits=0, misses=0, maxsize=2, currsize=0)
+    assert cache.get(a, 10) is not t
+
+
+def test_transformer_cache_per_thread():
+    cache = TransformerCache()
+    origin = Vector(10, 50)
+    main = cache.get(origin, 30)
+    other = []
+    thread = threading.Thread(
+        target=lambda: other.extend([cache.get(origin, 30),
+                                     cache.get(origin, 30)]))
+    thread.start()
+    thread.join()
+
+    assert other[0] is other[1]
+    assert other[0] is not main
+    assert cache.info().hits == 1 and cache.info().misses == 2
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from linesman.resample import resample
+
+
+def test_resample_forward():
+    xs, ys = resample([0, 2.5], [0, 5], spacing=1)
+    np.testing.assert_array_equal(xs, [0, 1, 2])
+    np.testing.assert_allclose(ys, [0, 2, 4])
+
+
+def test_resample_offset_grid():
+    # samples are taken at multiples of spacing, not relative to the start
+    xs, ys = resample([-0.5, 1.5], [1, 1], spacing=1)
+    np.testing.assert_array_equal(xs, [0, 1])
+
+
+def test_resample_backtracking():
+    xs, ys = resample([0, 2.5, 1.2, 4], [0, 2.5, 1.2, 0], spacing=1)
+    # every pass over x = 2 is sampled
+    np.testing.assert_array_equal(xs, [0, 1, 2, 2, 2, 3])
+    np.testing.assert_allclose(ys[:4], [0, 1, 2, 2])
+    np.testing.assert_allclose(ys[4:], [1.2 - 0.8/2.8*1.2, 1.2 - 1.8/2.8*1.2])
+
+
+def test_resample_turning_point_on_grid():
+    # the turning point x = 2 is sampled once
+    xs, ys = resample([0, 2, 0], [0, 1, 0], spacing=1)
+    np.testing.assert_array_equal(xs, [0, 1, 2, 1])
+
+
+def test_resample_vertical_segment():
+    xs, ys = resample([1, 1, 1], [0, 1, 2], spacing=1)
+    assert len(xs) == len(ys) == 0
+
+
+def test_resample_invalid_spacing():
+    with pytest.raises(ValueError, match='.*must be positive.*'):
+        resample([0, 1], [0, 0], spacing=0)
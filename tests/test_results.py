@@ -0,0 +1,127 @@
+from concurrent.futures import ProcessPoolExecutor
+import math
+import sqlite3
+import time
+
+import pytest
+
+from linesman.geometry import Line, Vector
+from linesman.results import ResultStore, normalized_line, settings_key, run
+
+
+@pytest.fixture
+def track_file(tmp_path):
+    path = tmp_path / 'track.gpx'
+    path.write_text('stand-in for a gpx file')
+    return str(path)
+
+
+def _computation(results):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return dict(results)
+    return compute, calls
+
+
+@pytest.mark.parametrize('key', ['content', 'stat'])
+def test_store_evaluate(tmp_path, track_file, key):
+    store = ResultStore(str(tmp_path / 'store' / 'results.sqlite'), key)
+    compute, calls = _computation({'MAX': 2.5, 'AVG': float('nan')})
+
+    results = store.evaluate(track_file, None, ['MAX', 'AVG'], compute)
+    assert results['MAX'] == 2.5 and math.isnan(results['AVG'])
+    results = store.evaluate(track_file, None, ['AVG'], compute)
+    assert list(results) == ['AVG'] and math.isnan(results['AVG'])
+    assert len(calls) == 1
+
+    # other settings, lines and measures are computed again
+    store.evaluate(track_file, None, ['MAX'], compute, spacing=2)
+    store.evaluate(track_file, Line(Vector(1, 2), Vector(3, 4)), ['MAX'],
+                   compute)
+    with pytest.raises(KeyError):
+        store.evaluate(track_file, None, ['SQ-AVG'], compute)
+    assert len(calls) == 4
+
+    stats = store.stats()
+    assert (stats.entries, stats.files, stats.versions) == (6, 1, 1)
+    assert (stats.hits, stats.misses) == (1, 5)
+    assert stats.size > 0
+
+
+def test_store_file_changes(tmp_path, track_file):
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    compute, calls = _computation({'MAX': 1.0})
+    store.evaluate(track_file, None, ['MAX'], compute)
+    with open(track_file, 'a') as f:
+        f.write('changed')
+    store.evaluate(track_file, None, ['MAX'], compute)
+    assert len(calls) == 2
+
+
+def test_keys():
+    line = Line(Vector(13.1234567891, 52.5), Vector(13.2, 52.6))
+    assert normalized_line(line) == \
+        '52.500000000,13.123456789;52.600000000,13.200000000'
+    assert normalized_line(None) == ''
+    assert settings_key(True, 1) == settings_key(True, 1.0, 'exact', None)
+    assert settings_key(False, 1) == settings_key(False, 2)
+    assert settings_key(True, 1) != settings_key(True, 2)
+    assert settings_key(True, 1, 'fast') != settings_key(True, 1)
+    assert settings_key(True, 1, simplify=0.1) != settings_key(True, 1)
+    with pytest.raises(ValueError):
+        ResultStore('results.sqlite', key='name')
+
+
+def _write(path, file, n):
+    store = ResultStore(path)
+    for i in range(n):
+        store.put(file, '', settings_key(), {f'M{i}': float(i)})
+        store.get(file, '', settings_key(), [f'M{i}'])
+    return True
+
+
+def test_concurrent_writers(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    with ProcessPoolExecutor(4) as pool:
+        assert all(pool.map(_write, [path]*4, 'abcd', [25]*4))
+    stats = ResultStore(path).stats()
+    assert (stats.entries, stats.files, stats.hits) == (100, 4, 100)
+
+
+def test_prune(tmp_path, track_file):
+    path = str(tmp_path / 'results.sqlite')
+    store = ResultStore(path)
+    store.put('old', '', 'settings', {'MAX': 1.0})
+    store._db().execute('UPDATE results SET used = ?', (time.time() - 86400,))
+    store.put('new', '', 'settings', {'MAX': 1.0})
+    store._db().execute("INSERT INTO results VALUES "
+                        "('new', '', 'MAX', 'settings', '0.0.1', 1, 0, ?)",
+                        (time.time(),))
+    assert store.prune(older_than=3600) == 1
+    assert store.prune(other_versions=True) == 1
+    assert store.stats().files == 1
+    with sqlite3.connect(path) as db:
+        assert db.execute('SELECT file FROM results').fetchall() == [('new',)]
+
+
+def test_run(tmp_path, track_file, capsys):
+    path = str(tmp_path / 'results.sqlite')
+    store = ResultStore(path)
+    compute, _ = _computation({'MAX': 1.0})
+    store.evaluate(track_file, None, ['MAX'], compute)
+    store.evaluate(track_file, None, ['MAX'], compute)
+    store.close()
+
+    assert run(['stats', '--store', path]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == 'Results: 1 (1 files, 1 versions)'
+    assert lines[1] == 'Lookups: 1 hits, 1 misses, hit rate 50.0%'
+
+    assert run(['prune', '--store', path, '--older-than', '1']) == 0
+    assert capsys.readouterr().out == 'Removed 0 results.\n'
+    with pytest.raises(SystemExit):
+        run(['prune', '--store', path])
+    with pytest.raises(SystemExit):
+        run(['stats', '--store', str(tmp_path / 'missing.sqlite')])
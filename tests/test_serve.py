@@ -0,0 +1,178 @@
+import asyncio
+import gzip
+import json
+
+from gpxpy.gpx import GPXTrackPoint
+import pytest
+
+from linesman.api import evaluate
+from linesman import serve
+from linesman.serve import EvaluationServer, _evaluate_task, _parameters
+
+LON = [10.0, 10.001, 10.002, 10.004]
+LAT = [50.0, 50.001, 50.0, 50.0005]
+
+
+async def _request(open_connection, method, target, body=b'',
+                   content_type='application/gpx+xml'):
+    """:return: tuple (status, parsed JSON response)"""
+    reader, writer = await open_connection()
+    head = f'{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n' \
+           f'Content-Type: {content_type}\r\n\r\n'
+    writer.write(head.encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(data)
+
+
+def _serve(requests, unix=None, **kwargs):
+    """
+    Start a server, send the requests one after another and stop it.
+    :param requests: list of argument tuples for _request()
+    :return: list of (status, response) tuples
+    """
+    async def main():
+        server = EvaluationServer(workers=1, **kwargs)
+        listener = await server.start(port=0, unix=unix)
+        if unix:
+            def open_connection():
+                return asyncio.open_unix_connection(unix)
+        else:
+            port = listener.sockets[0].getsockname()[1]
+
+            def open_connection():
+                return asyncio.open_connection('127.0.0.1', port)
+        try:
+            return [await _request(open_connection, *r) for r in requests]
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def gpx_bytes(gpx_obj):
+    segment = gpx_obj.tracks[0].segments[0]
+    for lon, lat in zip(LON, LAT):
+        segment.points.append(GPXTrackPoint(lat, lon))
+    return gpx_obj.to_xml().encode()
+
+
+def test_evaluate_gpx(gpx_bytes):
+    query = '/evaluate?measure=MAX&measure=AVG&line=50,10;50,10.004'
+    responses = _serve([('POST', query, gpx_bytes),
+                        ('POST', query, gzip.compress(gpx_bytes))])
+    expected = evaluate(LON, LAT, '50,10;50,10.004', ['MAX', 'AVG'])
+    assert responses == [(200, expected)] * 2
+
+
+def test_evaluate_json(tmp_path):
+    body = json.dumps({'lon': LON, 'lat': LAT}).encode()
+    responses = _serve([
+        ('POST', '/evaluate?engine=fast&resample=false', body,
+         'application/json'),
+        ('GET', '/health'),
+    ], unix=str(tmp_path / 'linesman.sock'))
+    assert responses[0] == (200, evaluate(LON, LAT, resample=False,
+                                          engine='fast'))
+    assert responses[1] == (200, {'status': 'ok', 'workers': 1,
+                                  'pending': 0})
+
+
+def test_errors(gpx_bytes):
+    coordinates = json.dumps({'lon': LON, 'lat': LAT}).encode()
+    statuses = [status for status, _ in _serve([
+        ('POST', '/evaluate', b'<gpx'),
+        ('POST', '/evaluate?measure=NONE', coordinates, 'application/json'),
+        ('POST', '/evaluate', b'{"lon": [1]}', 'application/json'),
+        ('POST', '/evaluate?line=50,10', coordinates, 'application/json'),
+        ('POST', '/evaluate', b'{"lon": [10, 10.1], "lat": [50, 95]}',
+         'application/json'),
+        ('POST', '/evaluate', gzip.compress(gpx_bytes)[:100]),
+        ('GET', '/evaluate'),
+        ('GET', '/other'),
+        ('POST', '/evaluate', gpx_bytes),
+    ], max_body=len(gpx_bytes) - 1)]
+    assert statuses == [400, 400, 400, 400, 400, 400, 405, 404, 413]
+
+
+def test_internal_errors(gpx_bytes, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('broken')
+
+    monkeypatch.setattr(serve, '_parameters', fail)
+    assert _serve([('POST', '/evaluate')]) == [(500, {'error': 'broken'})]
+
+    monkeypatch.setattr(serve, 'evaluate', fail)
+    assert _evaluate_task(gpx_bytes, '', {}) == \
+        ({}, 500, 'Evaluation failed: broken')
+
+
+def test_concurrency_limit(gpx_bytes):
+    async def main():
+        server = EvaluationServer(workers=1, max_pending=1)
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+
+        def open_connection():
+            return asyncio.open_connection('127.0.0.1', port)
+        try:
+            server.pending = 1  # an evaluation is running
+            status, response = await _request(open_connection, 'POST',
+                                              '/evaluate', gpx_bytes)
+            assert status == 503
+            server.pending = 0
+            status, _ = await _request(open_connection, 'POST', '/evaluate',
+                                       gpx_bytes)
+            assert status == 200
+        finally:
+            await server.close()
+    asyncio.run(main())
+
+
+def test_decompressed_limit(gpx_bytes):
+    statuses = [status for status, _ in _serve([
+        ('POST', '/evaluate', gzip.compress(gpx_bytes)),
+        ('POST', '/evaluate', gzip.compress(b' ' * 10**6)),
+    ], max_decompressed=len(gpx_bytes))]
+    assert statuses == [200, 400]
+
+
+def test_body_timeout(gpx_bytes, monkeypatch):
+    monkeypatch.setattr(serve, 'BODY_TIMEOUT', 0.1)
+
+    async def main():
+        server = EvaluationServer(workers=1, max_pending=1)
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+
+        def open_connection():
+            return asyncio.open_connection('127.0.0.1', port)
+        try:
+            reader, writer = await open_connection()
+            writer.write(b'POST /evaluate HTTP/1.1\r\nContent-Length: 100'
+                         b'\r\n\r\n')  # the body never arrives
+            await writer.drain()
+            # the slow upload does not count as pending evaluation
+            status, _ = await _request(open_connection, 'POST', '/evaluate',
+                                       gpx_bytes)
+            assert status == 200
+            response = await reader.read()
+            writer.close()
+            assert int(response.split()[1]) == 408
+        finally:
+            await server.close()
+    asyncio.run(main())
+
+
+def test_parameters():
+    kwargs = _parameters('measure=MAX&spacing=2&resample=false')
+    assert kwargs == {'measures': ['MAX'], 'spacing': 2.0, 'resample': False,
+                      'engine': 'exact'}
+    assert _parameters('line=1,2;3,4')['line'] is \
+        _parameters('line=1,2;3,4')['line']
+    for query in ('spacing=x', 'resample=maybe', 'unknown=1',
+                  'engine=fast&engine=exact'):
+        with pytest.raises(ValueError):
+            _parameters(query)
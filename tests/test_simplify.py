@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from linesman.geometry import Line, Vector
+from linesman.measure import accumulate, calculate_measures, Measure, \
+    MaxDeviation, AvgDeviation, SquareDeviationAvg, CountAccumulator, \
+    MaxAccumulator, SumAccumulator, SquareSumAccumulator
+from linesman.simplify import simplify
+from linesman.track import Track
+
+ACCUMULATORS = (CountAccumulator, MaxAccumulator, SumAccumulator,
+                SquareSumAccumulator)
+
+
+def _noisy_track(n=20000, seed=0):
+    """:return: (x, y) of a jittery track turning back twice"""
+    rng = np.random.default_rng(seed)
+    x = np.cumsum(rng.normal(0.15, 0.08, n))
+    x[n//3:n//2] -= np.linspace(0, 200, n//2 - n//3)
+    y = np.cumsum(rng.normal(0, 0.02, n)) + 3*np.sin(x/100)
+    return x, y
+
+
+def _measures(x, y):
+    acc = accumulate(x, y, ACCUMULATORS, spacing=1.0)
+    count = acc[CountAccumulator].value
+    return (acc[MaxAccumulator].value, acc[SumAccumulator].value/count,
+            acc[SquareSumAccumulator].value/count, count)
+
+
+def test_simplify_collinear():
+    x = np.arange(10.0)
+    assert simplify(x, 2*x, 0).tolist() == [0, 9]
+    # the maximum deviation and turning points are kept
+    x = np.array([0, 1, 2, 3, 2, 1, 2, 3, 4.])
+    y = np.array([0, 0, 5, 0, 0, 0, 0, 0, 0.])
+    assert simplify(x, y, 1).tolist() == [0, 1, 2, 3, 5, 8]
+
+
+@pytest.mark.parametrize('tolerance', [0.01, 0.1, 1])
+def test_simplify_bounds(tolerance):
+    x, y = _noisy_track()
+    keep = simplify(x, y, tolerance)
+    assert len(keep) < len(x)
+    full = _measures(x, y)
+    simplified = _measures(x[keep], y[keep])
+    assert simplified[0] == full[0]
+    assert abs(simplified[1] - full[1]) <= tolerance
+    assert abs(simplified[2] - full[2]) <= tolerance*(2*full[1] + tolerance)
+    assert simplified[3] == full[3]
+
+
+def test_simplify_errors():
+    assert simplify(np.zeros(2), np.zeros(2), 1).tolist() == [0, 1]
+    with pytest.raises(ValueError):
+        simplify(np.zeros(3), np.zeros(3), -1)
+
+
+def test_measure_simplify():
+    lon = 10 + np.linspace(0, 0.1, 5000)
+    lat = 50 + 1e-5*np.sin(np.linspace(0, 30, 5000))
+    track, line = Track(lon, lat), Line(Vector(10, 50), Vector(10.1, 50))
+    measures = [MaxDeviation, AvgDeviation, SquareDeviationAvg]
+    full = calculate_measures(track, line, measures)
+    simplified = calculate_measures(track, line, measures, simplify=0.05)
+    assert simplified[MaxDeviation] == full[MaxDeviation]
+    assert simplified[AvgDeviation] == pytest.approx(full[AvgDeviation],
+                                                     abs=0.05)
+
+    grid = Measure(track, line, simplify=0.05)
+    assert grid.simplified.points == 5000
+    assert grid.simplified.kept == len(grid.x) < 5000
+    with pytest.raises(ValueError):
+        Measure(track, line, resample=False, simplify=0.05)
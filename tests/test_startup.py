@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+import pytest
+
+import linesman
+from linesman.measure import available_measures
+
+HEAVY_MODULES = ('numpy', 'pyproj', 'geographiclib', 'gpxpy')
+
+# run the command line interface and print the heavy modules imported by it
+SCRIPT = f'''
+import sys
+from linesman import run
+sys.argv = ['linesman'] + sys.argv[1:]
+try:
+    run()
+except SystemExit:
+    pass
+print([m for m in {HEAVY_MODULES!r} if m in sys.modules], file=sys.stderr)
+'''
+
+
+def _imported_modules(*args):
+    res = subprocess.run([sys.executable, '-c', SCRIPT] + list(args),
+                         capture_output=True, text=True, check=True)
+    return res.stdout, res.stderr.strip().splitlines()[-1]
+
+
+@pytest.mark.parametrize('args', [
+    ['--version'], ['--help'], ['file.gpx', 'NO-MEASURE'],
+])
+def test_startup_without_heavy_imports(args):
+    out, modules = _imported_modules(*args)
+    assert modules == '[]'
+
+
+def test_startup_version():
+    out, _ = _imported_modules('--version')
+    assert out.strip() == linesman.__version__
+
+
+def test_measure_names():
+    assert linesman.MEASURE_NAMES == tuple(available_measures.keys())
+    assert linesman.available_measures is available_measures
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+import pytest
+
+from linesman import timing
+from linesman.geometry import Line, Vector
+from linesman.measure import calculate_measures, MaxDeviation
+from linesman.timing import Recorder, stage
+from linesman.track import Track
+
+
+def test_stage_without_hooks():
+    with stage('nothing', 3) as current:
+        pass
+    assert current.points == 3
+
+
+def test_recorder():
+    with Recorder() as recorder:
+        with stage('first', 10):
+            pass
+        with stage('second') as current:
+            current.points = 5
+    with stage('unrecorded'):
+        pass
+
+    assert [t.stage for t in recorder.timings] == ['first', 'second']
+    assert [t.points for t in recorder.timings] == [10, 5]
+    assert all(t.wall_s >= 0 and t.cpu_s >= 0 for t in recorder.timings)
+    assert timing.hooks == []
+
+
+def test_failed_stage_not_reported():
+    with Recorder() as recorder:
+        with pytest.raises(ValueError):
+            with stage('failing'):
+                raise ValueError()
+    assert recorder.timings == []
+
+
+def test_peak_memory_increase(monkeypatch):
+    peaks = iter([100, 150, 150, 150])
+    monkeypatch.setattr(timing, '_peak_memory', lambda: next(peaks))
+    with Recorder() as recorder:
+        with stage('growing'):
+            pass
+        with stage('below peak'):
+            pass
+    assert [t.peak_increase_bytes for t in recorder.timings] == [50, 0]
+
+
+def test_pipeline_stages():
+    track = Track(np.linspace(5, 6, 100), np.linspace(5, 6.01, 100))
+    line = Line(Vector(5, 5), Vector(6, 6))
+    timings = []
+    timing.add_hook(timings.append)
+    try:
+        calculate_measures(track, line, [MaxDeviation])
+    finally:
+        timing.remove_hook(timings.append)
+
+    stages = {t.stage: t for t in timings}
+    assert stages['projection'].points == 100
+    assert stages['accumulate'].points == 100
+
+
+def test_recorder_output():
+    recorder = Recorder()
+    recorder(timing.StageTiming('parse', 1.5, 1.25, 100, 2**20))
+    recorder(timing.StageTiming('transformer', 0.5, 0.5, None, None))
+
+    rows = json.loads(recorder.as_json())
+    assert rows[0] == {'stage': 'parse', 'wall_s': 1.5, 'cpu_s': 1.25,
+                       'points': 100, 'peak_increase_bytes': 2**20}
+    lines = recorder.as_text().splitlines()
+    assert len(lines) == 3
+    assert lines[1].split() == ['parse', '1.5000', '1.2500', '100', '1.0']
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from linesman.geometry import Vector
+from linesman.track import Track, as_track
+
+
+def test_track_from_points():
+    track = Track.from_points([Vector(1, 2), Vector(3, 4)])
+    assert list(track.lon) == [1, 3]
+    assert list(track.lat) == [2, 4]
+    assert track.lon.flags['C_CONTIGUOUS']
+
+
+def test_track_length_mismatch():
+    with pytest.raises(ValueError, match='.*same length.*'):
+        Track([1, 2], [1])
+    with pytest.raises(ValueError, match='.*same length.*'):
+        Track([1, 2], [1, 2], ele=[5])
+
+
+def test_track_getitem():
+    track = Track([1, 2, 3], [4, 5, 6], time=[10, 11, 12])
+    assert track[0] == Vector(1, 4)
+    assert track[-1] == Vector(3, 6)
+
+    part = track[1:]
+    assert isinstance(part, Track)
+    assert list(part) == [Vector(2, 5), Vector(3, 6)]
+    assert list(part.time) == [11, 12]
+    assert part.ele is None
+
+
+def test_as_track():
+    track = Track(np.zeros(2), np.ones(2))
+    assert as_track(track) is track
+    assert list(as_track([Vector(0, 1)])) == [Vector(0, 1)]
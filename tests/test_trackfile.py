@@ -0,0 +1,81 @@
+import sys
+
+import numpy as np
+import pytest
+from gpxpy.gpx import GPXTrackPoint
+
+from linesman import run
+from linesman.parse import read_track
+from linesman.track import Track
+from linesman.trackfile import (
+    HEADER_SIZE, is_track_file, read_track_file, write_track_file
+)
+
+
+@pytest.mark.parametrize('ele, time', [
+    (None, None), ([5, 6, np.nan], None), (None, [7, 8, 9]),
+    ([5, 6, 7], [7, 8, 9]),
+])
+def test_roundtrip(tmp_path, ele, time):
+    path = str(tmp_path / 'track.lmt')
+    track = Track([1, 2, 3], [4, 5, 6], ele, time)
+    write_track_file(track, path)
+
+    assert is_track_file(path)
+    read = read_track_file(path)
+    assert isinstance(read.lon.base, np.memmap) or \
+        isinstance(read.lon, np.memmap)
+    np.testing.assert_array_equal(read.lon, track.lon)
+    np.testing.assert_array_equal(read.lat, track.lat)
+    for column in ('ele', 'time'):
+        if getattr(track, column) is None:
+            assert getattr(read, column) is None
+        else:
+            np.testing.assert_array_equal(getattr(read, column),
+                                          getattr(track, column))
+
+
+def test_empty(tmp_path):
+    path = str(tmp_path / 'track.lmt')
+    write_track_file(Track([], []), path)
+    assert len(read_track_file(path)) == 0
+
+
+def test_invalid(tmp_path):
+    path = tmp_path / 'track.lmt'
+    path.write_bytes(b'<?xml version="1.0"?>')
+    assert not is_track_file(str(path))
+    with pytest.raises(ValueError):
+        read_track_file(str(path))
+
+    write_track_file(Track([1, 2, 3], [4, 5, 6]), str(path))
+    path.write_bytes(path.read_bytes()[:HEADER_SIZE + 8])
+    with pytest.raises(ValueError, match='truncated'):
+        read_track_file(str(path))
+
+
+def test_convert(gpx_obj, tmp_path, capsys):
+    segment = gpx_obj.tracks[0].segments[0]
+    segment.points.append(GPXTrackPoint(1, 1, elevation=10))
+    segment.points.append(GPXTrackPoint(2, 1, elevation=20))
+    segment.points.append(GPXTrackPoint(2, 2, elevation=30))
+    gpx_path = tmp_path / 'track.gpx'
+    gpx_path.write_text(gpx_obj.to_xml())
+    lmt_path = str(tmp_path / 'track.lmt')
+
+    sys.argv = ['linesman', 'convert', str(gpx_path), lmt_path]
+    with pytest.raises(SystemExit) as e:
+        run()
+    assert e.value.code == 0
+    converted = read_track(lmt_path)
+    original = read_track(str(gpx_path))
+    np.testing.assert_array_equal(converted.lon, original.lon)
+    np.testing.assert_array_equal(converted.ele, [10, 20, 30])
+
+    capsys.readouterr()
+    results = []
+    for path in (str(gpx_path), lmt_path):
+        sys.argv = ['linesman', path, 'ALL']
+        run()
+        results.append(capsys.readouterr().out)
+    assert results[0] == results[1]